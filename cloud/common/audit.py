@@ -0,0 +1,488 @@
+"""
+审计日志异步写入
+
+管理操作的审计事件先进入内存队列，由后台线程以多行INSERT批量写入MySQL audit_logs表，
+不再占用请求事务。
+
+投递语义为至少一次：
+- 一批事件在INSERT提交后才从队列移除，失败的批次放回队列重试
+- 配置了溢出文件时，MySQL不可用或队列已满的事件追加写入本地文件（JSON Lines），
+  MySQL恢复后自动回放并删除文件
+- 回放按批流式读取，中断时记录读取位置；写入出错后回放按指数退避推迟
+  （最长 max_replay_backoff 秒），MySQL不可用期间不会反复读写整个溢出文件
+- 进程退出时close()刷新剩余事件，仍无法写入的事件写入溢出文件
+- 进程崩溃时尚在内存队列中的事件会丢失
+
+多个进程可以共用一个溢出文件：追加和回放前的改名持有文件锁（<溢出文件>.lock），
+同一时间只有一个进程回放（<溢出文件>.replay.lock），不会重复写入。
+
+整批因数据错误（超长、约束冲突等）失败时逐条写入，只有无法写入的事件留待重试；
+同一事件失败 max_attempts 次后丢弃并记录错误，不会永远阻塞队列。
+
+用法:
+    from common.audit import audit_log
+
+    audit_log("rule.deploy", user_id=user.id, resource_type="rule_version",
+              resource_id=str(version.id), details={"vins": len(vins)},
+              ip_address=request.remote_addr)
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import exc, text
+
+from . import database
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = [
+    "user_id",
+    "action",
+    "resource_type",
+    "resource_id",
+    "details",
+    "ip_address",
+    "user_agent",
+    "created_at",
+]
+
+INSERT_AUDIT_SQL = text(
+    f"INSERT INTO audit_logs ({', '.join(AUDIT_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + column for column in AUDIT_COLUMNS)})"
+)
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 事件已失败次数（只出现在溢出文件和重试队列中，不写入数据库）
+ATTEMPTS_FIELD = "_attempts"
+
+
+def _is_data_error(error: Exception) -> bool:
+    """是否为事件本身的数据错误（重试也不会成功），连接错误等返回False"""
+    if isinstance(error, (exc.DataError, exc.IntegrityError)):
+        return True
+    return isinstance(error, (exc.StatementError, TypeError, ValueError)) and not isinstance(
+        error, exc.DBAPIError
+    )
+
+
+@contextmanager
+def _file_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """
+    进程间文件锁（flock）
+
+    Args:
+        path: 锁文件路径
+        blocking: 是否等待，False时锁被占用立即返回
+
+    Yields:
+        是否获得锁
+    """
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+class AuditWriter:
+    """
+    线程安全的审计日志批量写入器
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], Any] = None,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 100000,
+        spill_path: Optional[str] = None,
+        max_attempts: int = 3,
+        max_replay_backoff: float = 60,
+    ):
+        """
+        初始化写入器
+
+        Args:
+            engine_factory: 返回SQLAlchemy Engine的函数，默认database.get_engine
+            batch_size: 单条INSERT的最大行数
+            flush_interval: 最长刷新间隔（秒）
+            max_queue: 内存队列上限，超出后事件写入溢出文件（未配置时丢弃并记录错误）
+            spill_path: 溢出文件路径，None表示不溢出
+            max_attempts: 单个事件因数据错误写入失败的最大次数，达到后丢弃
+            max_replay_backoff: 写入出错后推迟回放溢出文件的最长时间（秒）
+        """
+        self.engine_factory = engine_factory or database.get_engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.max_attempts = max_attempts
+        self.max_replay_backoff = max_replay_backoff
+
+        self._replay_backoff = 0.0
+        self._replay_after = 0.0
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.stats = {
+            "written": 0,
+            "batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "dropped": 0,
+            "flush_errors": 0,
+        }
+
+    @property
+    def queued(self) -> int:
+        """队列中的事件数"""
+        return len(self._queue)
+
+    def start(self):
+        """启动后台线程（幂等）"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def log(
+        self,
+        action: str,
+        user_id: Optional[int] = None,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        details: Any = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ):
+        """
+        记录审计事件（不阻塞）
+
+        Args:
+            action: 操作类型
+            user_id: 用户ID
+            resource_type: 资源类型
+            resource_id: 资源ID
+            details: 详细信息（可JSON序列化）
+            ip_address: IP地址
+            user_agent: User Agent
+        """
+        if details is not None:
+            details = json.dumps(details, ensure_ascii=False, default=str)
+        event = {
+            "user_id": user_id,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "details": details,
+            "ip_address": ip_address,
+            "user_agent": user_agent[:255] if user_agent else None,
+            "created_at": datetime.now().strftime(_TIME_FORMAT),
+        }
+
+        self.start()
+        with self._cond:
+            if len(self._queue) < self.max_queue:
+                self._queue.append(event)
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+                return
+
+        if not self._spill([event]):
+            self.stats["dropped"] += 1
+            logger.error(f"Audit queue full, dropped event: {action}")
+
+    def _insert(self, events: List[Dict[str, Any]]):
+        """多行INSERT写入一批事件"""
+        rows = [{column: event.get(column) for column in AUDIT_COLUMNS} for event in events]
+        with self.engine_factory().begin() as conn:
+            conn.execute(INSERT_AUDIT_SQL, rows)
+
+    def _write(
+        self, events: List[Dict[str, Any]]
+    ) -> Tuple[int, List[Dict[str, Any]], Optional[Exception]]:
+        """
+        写入一批事件
+
+        整批因数据错误失败时逐条写入：失败的事件尝试次数加一，达到max_attempts的丢弃。
+
+        Returns:
+            (写入的事件数, 需要重试的事件, 连接错误等非数据错误)
+        """
+        try:
+            self._insert(events)
+            return len(events), [], None
+        except Exception as e:
+            if not _is_data_error(e):
+                return 0, events, e
+
+        written = 0
+        failed = []
+        for index, event in enumerate(events):
+            try:
+                self._insert([event])
+                written += 1
+            except Exception as e:
+                if not _is_data_error(e):
+                    return written, failed + events[index:], e
+                attempts = event.get(ATTEMPTS_FIELD, 0) + 1
+                if attempts >= self.max_attempts:
+                    self.stats["dropped"] += 1
+                    logger.error(
+                        f"Dropped audit event {event.get('action')} after {attempts} attempts: {e}"
+                    )
+                else:
+                    failed.append(dict(event, **{ATTEMPTS_FIELD: attempts}))
+        return written, failed, None
+
+    def _lock_path(self, suffix: str) -> Path:
+        return self.spill_path.with_suffix(self.spill_path.suffix + suffix)
+
+    def _spill(self, events: List[Dict[str, Any]], count: bool = True) -> bool:
+        """
+        追加写入溢出文件
+
+        Args:
+            events: 事件列表
+            count: 是否计入stats["spilled"]（回放失败写回的事件不重复计数）
+
+        Returns:
+            是否写入成功
+        """
+        if self.spill_path is None or not events:
+            return False
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._spill_lock, _file_lock(self._lock_path(".lock")):
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for event in events:
+                        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            if count:
+                self.stats["spilled"] += len(events)
+            return True
+        except OSError as e:
+            logger.error(f"Audit spill to {self.spill_path} failed: {e}")
+            return False
+
+    def _replay(self):
+        """回放溢出文件；其他进程正在回放时跳过，失败时剩余事件写回溢出文件"""
+        if self.spill_path is None:
+            return
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with _file_lock(self._lock_path(".replay.lock"), blocking=False) as acquired:
+            if acquired:
+                self._replay_locked()
+
+    def _replay_locked(self):
+        """
+        回放溢出文件（调用方持有回放锁）
+
+        按batch_size流式读取；写入出错时失败的事件写回溢出文件，
+        已读取位置记入 <溢出文件>.replaying.offset，下次从该位置继续。
+        """
+        # 上次回放中断遗留的文件优先回放
+        replaying = self._lock_path(".replaying")
+        offset_path = self._lock_path(".replaying.offset")
+        with self._spill_lock, _file_lock(self._lock_path(".lock")):
+            if not replaying.exists() and not self.spill_path.exists():
+                return
+            if not replaying.exists():
+                os.replace(self.spill_path, replaying)
+                offset_path.unlink(missing_ok=True)
+
+        replayed = 0
+        with open(replaying, "rb") as f:
+            f.seek(self._read_offset(offset_path))
+            while True:
+                batch_start = f.tell()
+                batch = self._read_batch(f)
+                if not batch:
+                    break
+                written, failed, error = self._write(batch)
+                self.stats["replayed"] += written
+                replayed += written
+                if failed and not self._spill(failed, count=False):
+                    # 写不回溢出文件时从这一批开始重新回放
+                    self._write_offset(offset_path, batch_start)
+                    raise error or OSError(f"Cannot spill {len(failed)} audit events")
+                if error is not None:
+                    self._write_offset(offset_path, f.tell())
+                    logger.warning(
+                        f"Audit spill replay interrupted after {replayed} events: {error}"
+                    )
+                    raise error
+
+        os.remove(replaying)
+        offset_path.unlink(missing_ok=True)
+        logger.info(f"Replayed {replayed} spilled audit events")
+
+    def _read_batch(self, f: BinaryIO) -> List[Dict[str, Any]]:
+        """从回放文件读取至多batch_size个事件，跳过无法解析的行"""
+        batch = []
+        while len(batch) < self.batch_size:
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                self.stats["dropped"] += 1
+                logger.error(f"Dropped malformed spilled audit event: {line[:200]!r}")
+        return batch
+
+    @staticmethod
+    def _read_offset(path: Path) -> int:
+        try:
+            return int(path.read_text())
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_offset(path: Path, offset: int):
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, path)
+
+    def _defer_replay(self):
+        """写入出错后按指数退避推迟下次回放"""
+        self._replay_backoff = min(
+            max(self._replay_backoff * 2, self.flush_interval), self.max_replay_backoff
+        )
+        self._replay_after = time.monotonic() + self._replay_backoff
+
+    def flush(self):
+        """
+        写入队列中的所有事件
+
+        失败的批次在配置了溢出文件时写入文件，否则放回队列头部等待重试。
+        本次写入没有连接错误且不在退避期内时回放溢出文件。
+        """
+        with self._flush_lock:
+            error_seen = False
+            while True:
+                with self._cond:
+                    batch = [
+                        self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))
+                    ]
+                if not batch:
+                    break
+
+                written, failed, error = self._write(batch)
+                if written:
+                    self.stats["written"] += written
+                    self.stats["batches"] += 1
+                if not failed:
+                    continue
+
+                self.stats["flush_errors"] += 1
+                error_seen = error_seen or error is not None
+                reason = error or "data error"
+                if self._spill(failed):
+                    logger.warning(f"Audit insert failed, spilled {len(failed)} events: {reason}")
+                    continue
+                logger.warning(f"Audit insert failed, will retry {len(failed)} events: {reason}")
+                with self._cond:
+                    self._queue.extendleft(reversed(failed))
+                if error is not None:
+                    raise error
+
+            if error_seen:
+                # MySQL不可用时不回放，避免每个刷新周期都读写整个溢出文件
+                self._defer_replay()
+            elif time.monotonic() >= self._replay_after:
+                try:
+                    self._replay()
+                except Exception:
+                    self._defer_replay()
+                    raise
+                self._replay_backoff = 0.0
+
+    def _run(self):
+        """后台刷新线程"""
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # 错误已记录，等待下个周期重试
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        """停止后台线程，刷新剩余事件；无法写入的事件写入溢出文件"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+
+        try:
+            self.flush()
+        except Exception as e:
+            with self._cond:
+                remaining = list(self._queue)
+                self._queue.clear()
+            if remaining and not self._spill(remaining):
+                self.stats["dropped"] += len(remaining)
+                logger.error(f"Dropped {len(remaining)} audit events on shutdown: {e}")
+
+
+# 进程级写入器
+audit_writer = AuditWriter(
+    batch_size=config.AUDIT_BATCH_SIZE,
+    flush_interval=config.AUDIT_FLUSH_INTERVAL,
+    max_queue=config.AUDIT_MAX_QUEUE,
+    spill_path=config.AUDIT_SPILL_PATH or None,
+    max_attempts=config.AUDIT_MAX_ATTEMPTS,
+    max_replay_backoff=config.AUDIT_REPLAY_MAX_BACKOFF,
+)
+
+
+def audit_log(action: str, **fields):
+    """
+    记录审计事件（见 AuditWriter.log）
+
+    Args:
+        action: 操作类型
+        **fields: user_id, resource_type, resource_id, details, ip_address, user_agent
+    """
+    audit_writer.log(action, **fields)
+
+
+def close_audit_writer():
+    """停止审计写入器并刷新剩余事件"""
+    audit_writer.close()
@@ -0,0 +1,479 @@
+"""
+两级查询缓存
+
+热点MySQL查询（规则版本查询、按VIN查询车辆）的缓存层：
+- L1：进程内LRU，带TTL
+- L2：Redis，键为 cache:<表名>:<键>，多进程共享
+- 同一键的并发未命中合并为一次加载（进程内single-flight + Redis加载锁）
+- 数据变更时通过Redis pub/sub广播失效消息，所有进程清除L1
+- 每个命名空间在Redis中有失效代数，加载期间发生失效时不回写L2（避免慢加载写回旧值）
+
+缓存值需可JSON序列化（加载函数应返回字典等基本类型，而不是ORM对象）。
+
+用法:
+    from common.cache import query_cache, TABLE_RULE_VERSIONS
+
+    latest = query_cache.get_or_load(
+        TABLE_RULE_VERSIONS, f"latest:{rule_type}", lambda: load_latest(rule_type)
+    )
+
+    # 发布规则后
+    query_cache.invalidate(TABLE_RULE_VERSIONS)
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+
+from . import database
+from .config import config
+from .redis_scripts import scripts
+
+logger = logging.getLogger(__name__)
+
+# 缓存命名空间（表名）
+TABLE_RULE_VERSIONS = "rule_versions"
+TABLE_VEHICLES = "vehicles"
+
+CACHE_KEY_PREFIX = "cache:"
+LOAD_LOCK_PREFIX = "cache:lock:"
+GENERATION_KEY_PREFIX = "cache:gen:"
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# 表示"未命中"的哨兵（缓存值本身可以是None）
+_MISS = object()
+
+# 命名空间失效代数未变化时写入缓存值，返回是否写入
+# KEYS[1]=代数键  KEYS[2]=缓存键  ARGV[1]=加载前的代数  ARGV[2]=值  ARGV[3]=过期时间（秒）
+SET_IF_GENERATION_SCRIPT = """
+local current = redis.call('GET', KEYS[1]) or '0'
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+scripts.register("cache_set_if_generation", SET_IF_GENERATION_SCRIPT)
+
+
+class LocalCache:
+    """进程内LRU缓存，带TTL"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """查询缓存，未命中返回_MISS"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """写入缓存"""
+        expires_at = time.monotonic() + min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        """删除单个键"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        """删除指定前缀的所有键"""
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class QueryCache:
+    """
+    两级查询缓存
+
+    L1命中不产生网络请求；L1未命中时查询Redis；两级都未命中时调用加载函数，
+    同一键同一时刻在所有进程中只有一个加载在执行。
+    """
+
+    def __init__(
+        self,
+        local_size: int = 10000,
+        local_ttl: float = 60,
+        redis_ttl: int = 300,
+        lock_timeout: float = 5,
+    ):
+        """
+        初始化缓存
+
+        Args:
+            local_size: L1最大条目数
+            local_ttl: L1条目最长存活时间（秒），也是失效广播丢失时的最大过期延迟
+            redis_ttl: L2默认过期时间（秒）
+            lock_timeout: 加载锁超时时间（秒），等待其他进程加载的最长时间
+        """
+        self.local = LocalCache(local_size, local_ttl)
+        self.redis_ttl = redis_ttl
+        self.lock_timeout = lock_timeout
+
+        self._inflight: Dict[str, threading.Event] = {}
+        # 每个命名空间的本地失效计数，加载期间发生失效时不回填L1
+        self._generations: Dict[str, int] = {}
+        self._inflight_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        self.stats = {"local_hits": 0, "redis_hits": 0, "loads": 0, "errors": 0}
+
+    @staticmethod
+    def make_key(table: str, key: str) -> str:
+        """生成带命名空间的缓存键"""
+        return f"{CACHE_KEY_PREFIX}{table}:{key}"
+
+    @staticmethod
+    def _table_of(cache_key: str) -> str:
+        """从缓存键解析命名空间"""
+        return cache_key[len(CACHE_KEY_PREFIX) :].split(":", 1)[0]
+
+    @staticmethod
+    def _redis() -> Optional[redis.Redis]:
+        """获取Redis客户端，不可用时返回None（缓存降级为仅L1）"""
+        try:
+            return database.get_redis_client()
+        except database.BackendUnavailableError:
+            return None
+
+    def _redis_get(self, client: redis.Redis, cache_key: str) -> Any:
+        """查询L2，未命中或出错返回_MISS"""
+        try:
+            raw = client.get(cache_key)
+        except redis.RedisError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Query cache read failed: {e}")
+            return _MISS
+        if raw is None:
+            return _MISS
+        return json.loads(raw)["v"]
+
+    def get(self, table: str, key: str) -> Any:
+        """
+        查询缓存（不加载）
+
+        Args:
+            table: 表名（命名空间）
+            key: 键
+
+        Returns:
+            缓存值，未命中返回None
+        """
+        value = self._get(self.make_key(table, key))
+        return None if value is _MISS else value
+
+    def _get(self, cache_key: str) -> Any:
+        """依次查询L1和L2，L2命中时回填L1"""
+        self._ensure_listener()
+
+        value = self.local.get(cache_key)
+        if value is not _MISS:
+            self.stats["local_hits"] += 1
+            return value
+
+        client = self._redis()
+        if client is None:
+            return _MISS
+
+        value = self._redis_get(client, cache_key)
+        if value is not _MISS:
+            self.stats["redis_hits"] += 1
+            self.local.set(cache_key, value)
+        return value
+
+    def set(self, table: str, key: str, value: Any, ttl: Optional[int] = None):
+        """
+        写入缓存
+
+        Args:
+            table: 表名（命名空间）
+            key: 键
+            value: 可JSON序列化的值
+            ttl: L2过期时间（秒），默认使用redis_ttl
+        """
+        self._set(self.make_key(table, key), value, ttl)
+
+    def _set(self, cache_key: str, value: Any, ttl: Optional[int] = None):
+        """写入L1和L2"""
+        ttl = ttl or self.redis_ttl
+        self.local.set(cache_key, value, ttl)
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.set(cache_key, json.dumps({"v": value}, default=str), ex=ttl)
+        except redis.RedisError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Query cache write failed: {e}")
+
+    def get_or_load(
+        self, table: str, key: str, loader: Callable[[], Any], ttl: Optional[int] = None
+    ) -> Any:
+        """
+        查询缓存，未命中时调用加载函数并写入缓存
+
+        Args:
+            table: 表名（命名空间）
+            key: 键
+            loader: 加载函数，返回可JSON序列化的值
+            ttl: L2过期时间（秒）
+
+        Returns:
+            缓存值或加载结果
+        """
+        cache_key = self.make_key(table, key)
+
+        value = self._get(cache_key)
+        if value is not _MISS:
+            return value
+
+        # 进程内single-flight：同一键只有一个线程执行加载
+        with self._inflight_lock:
+            event = self._inflight.get(cache_key)
+            leader = event is None
+            if leader:
+                event = self._inflight[cache_key] = threading.Event()
+
+        if not leader:
+            event.wait(self.lock_timeout)
+            value = self.local.get(cache_key)
+            if value is not _MISS:
+                return value
+            return self._load(cache_key, loader, ttl)
+
+        try:
+            return self._load_collapsed(cache_key, loader, ttl)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+            event.set()
+
+    def _load(self, cache_key: str, loader: Callable[[], Any], ttl: Optional[int]) -> Any:
+        """
+        调用加载函数并写入缓存
+
+        加载前记录本地和Redis中的失效代数，加载期间任一进程使该命名空间失效时，
+        加载结果只返回给调用方，不写入缓存。
+        """
+        table = self._table_of(cache_key)
+        generation = self._generations.get(table, 0)
+        client = self._redis()
+        redis_generation = None
+        if client is not None:
+            try:
+                redis_generation = int(client.get(f"{GENERATION_KEY_PREFIX}{table}") or 0)
+            except redis.RedisError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Query cache read failed: {e}")
+
+        self.stats["loads"] += 1
+        value = loader()
+
+        if self._generations.get(table, 0) != generation:
+            return value
+        ttl = ttl or self.redis_ttl
+        if redis_generation is not None:
+            try:
+                written = scripts.call(
+                    "cache_set_if_generation",
+                    keys=[f"{GENERATION_KEY_PREFIX}{table}", cache_key],
+                    args=[redis_generation, json.dumps({"v": value}, default=str), ttl],
+                    client=client,
+                )
+            except redis.RedisError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Query cache write failed: {e}")
+            else:
+                if not written:
+                    return value
+        self.local.set(cache_key, value, ttl)
+        return value
+
+    def _load_collapsed(self, cache_key: str, loader: Callable[[], Any], ttl: Optional[int]) -> Any:
+        """跨进程合并加载：取得Redis加载锁的进程加载，其他进程轮询L2等待结果"""
+        client = self._redis()
+        if client is None:
+            return self._load(cache_key, loader, ttl)
+
+        lock_key = f"{LOAD_LOCK_PREFIX}{cache_key}"
+        try:
+            acquired = client.set(lock_key, "1", nx=True, px=int(self.lock_timeout * 1000))
+        except redis.RedisError:
+            acquired = True
+
+        if not acquired:
+            deadline = time.monotonic() + self.lock_timeout
+            delay = 0.01
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
+                value = self._redis_get(client, cache_key)
+                if value is not _MISS:
+                    self.local.set(cache_key, value)
+                    return value
+            # 其他进程加载超时，自行加载
+            return self._load(cache_key, loader, ttl)
+
+        try:
+            return self._load(cache_key, loader, ttl)
+        finally:
+            try:
+                client.delete(lock_key)
+            except redis.RedisError:
+                pass
+
+    def invalidate(self, table: str, key: Optional[str] = None):
+        """
+        使缓存失效并广播给所有进程
+
+        Args:
+            table: 表名（命名空间）
+            key: 键，为None时使整张表的缓存失效
+        """
+        self._invalidate_local(table, key)
+
+        client = self._redis()
+        if client is None:
+            return
+
+        try:
+            # 先递增代数，正在进行的加载不再回写L2
+            client.incr(f"{GENERATION_KEY_PREFIX}{table}")
+            if key is None:
+                keys = list(client.scan_iter(match=f"{CACHE_KEY_PREFIX}{table}:*", count=1000))
+                if keys:
+                    client.delete(*keys)
+            else:
+                client.delete(self.make_key(table, key))
+            client.publish(INVALIDATION_CHANNEL, json.dumps({"table": table, "key": key}))
+        except redis.RedisError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Query cache invalidation failed: {e}")
+
+    def _invalidate_local(self, table: str, key: Optional[str]):
+        """清除本进程L1"""
+        self._generations[table] = self._generations.get(table, 0) + 1
+        if key is None:
+            self.local.delete_prefix(f"{CACHE_KEY_PREFIX}{table}:")
+        else:
+            self.local.delete(self.make_key(table, key))
+
+    def _ensure_listener(self):
+        """首次使用时启动失效广播订阅线程"""
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            if self._redis() is None:
+                return
+            self._stop_event.clear()
+            self._listener = threading.Thread(
+                target=self._listen, name="query-cache-invalidation", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        """订阅失效广播；(重新)订阅时清空L1，避免断线期间遗漏的失效消息"""
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                client = self._redis()
+                if client is None:
+                    return
+                pubsub = client.pubsub()
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        self.local.clear()
+                    elif message["type"] == "message":
+                        data = message["data"]
+                        if isinstance(data, bytes):
+                            data = data.decode()
+                        try:
+                            event = json.loads(data)
+                            self._invalidate_local(event["table"], event.get("key"))
+                        except (ValueError, KeyError, TypeError):
+                            logger.warning(f"Invalid cache invalidation message: {data!r}")
+
+            except redis.RedisError as e:
+                logger.warning(f"Query cache subscription lost: {e}")
+                self._stop_event.wait(self.lock_timeout)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+
+    def stop(self):
+        """停止订阅线程"""
+        self._stop_event.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+        self._listener = None
+
+
+# 进程级查询缓存
+query_cache = QueryCache(
+    local_size=config.QUERY_CACHE_LOCAL_SIZE,
+    local_ttl=config.QUERY_CACHE_LOCAL_TTL,
+    redis_ttl=config.QUERY_CACHE_REDIS_TTL,
+    lock_timeout=config.QUERY_CACHE_LOCK_TIMEOUT,
+)
+
+
+def on_rule_published():
+    """
+    规则发布或回滚后调用：使规则版本查询缓存失效
+
+    "最新版本"类查询跨规则类型，发布频率低，直接使整个命名空间失效。
+    """
+    query_cache.invalidate(TABLE_RULE_VERSIONS)
+
+
+def on_vehicle_changed(vin: str):
+    """
+    车辆状态变更后调用：使该车辆的缓存失效
+
+    Args:
+        vin: 车辆VIN
+    """
+    query_cache.invalidate(TABLE_VEHICLES, vin)
@@ -0,0 +1,359 @@
+"""
+ClickHouse批量写入
+
+按表缓冲日志行，达到行数或时间阈值时以列式数据块一次写入，
+避免逐行INSERT产生过多MergeTree分片。
+缓冲区满时写入方阻塞（背压），超时抛出BufferFullError。
+网络错误和暂时性的服务端错误放回缓冲区重试，其他错误（无法序列化的数据等）
+重试也不会成功，丢弃数据块并记录行数。
+
+用法:
+    from common.database import init_bulk_writer
+
+    writer = init_bulk_writer()
+    writer.write("network_ids_logs", rows)
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Union
+
+from clickhouse_driver import errors
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# 各日志表的写入列（created_date由DEFAULT表达式生成）
+LOG_TABLE_COLUMNS: Dict[str, List[str]] = {
+    "network_ids_logs": [
+        "timestamp",
+        "vin",
+        "event_type",
+        "severity",
+        "src_ip",
+        "src_port",
+        "dest_ip",
+        "dest_port",
+        "protocol",
+        "signature_id",
+        "signature",
+        "category",
+        "payload",
+        "raw_log",
+    ],
+    "firewall_logs": [
+        "timestamp",
+        "vin",
+        "action",
+        "src_ip",
+        "src_port",
+        "dest_ip",
+        "dest_port",
+        "protocol",
+        "interface",
+        "rule_id",
+        "bytes",
+        "packets",
+        "reason",
+    ],
+    "host_ids_logs": [
+        "timestamp",
+        "vin",
+        "log_type",
+        "severity",
+        "event",
+        "file_path",
+        "process_name",
+        "process_id",
+        "user",
+        "command",
+        "details",
+    ],
+    "performance_metrics": [
+        "timestamp",
+        "vin",
+        "cpu_usage",
+        "memory_usage",
+        "disk_usage",
+        "network_rx_bytes",
+        "network_tx_bytes",
+        "iops_read",
+        "iops_write",
+    ],
+}
+
+
+# 可重试的服务端错误码（超时、过载、副本/Keeper暂时不可用等）
+RETRYABLE_SERVER_ERRORS = frozenset(
+    {
+        errors.ErrorCodes.UNEXPECTED_END_OF_FILE,
+        errors.ErrorCodes.TIMEOUT_EXCEEDED,
+        errors.ErrorCodes.READONLY,
+        errors.ErrorCodes.TOO_MANY_SIMULTANEOUS_QUERIES,
+        errors.ErrorCodes.SOCKET_TIMEOUT,
+        errors.ErrorCodes.NETWORK_ERROR,
+        errors.ErrorCodes.NO_ZOOKEEPER,
+        errors.ErrorCodes.ABORTED,
+        errors.ErrorCodes.MEMORY_LIMIT_EXCEEDED,
+        errors.ErrorCodes.TABLE_IS_READ_ONLY,
+        errors.ErrorCodes.TOO_MANY_PARTS,
+        errors.ErrorCodes.ALL_CONNECTION_TRIES_FAILED,
+        errors.ErrorCodes.UNKNOWN_STATUS_OF_INSERT,
+        errors.ErrorCodes.ALL_REPLICAS_ARE_STALE,
+        errors.ErrorCodes.QUERY_WAS_CANCELLED,
+        errors.ErrorCodes.KEEPER_EXCEPTION,
+    }
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    写入错误是否值得重试
+
+    Args:
+        error: 写入时抛出的异常
+
+    Returns:
+        网络错误和暂时性服务端错误返回True；序列化失败（TypeError、ValueError等）
+        和其他服务端错误返回False
+    """
+    if isinstance(error, (errors.NetworkError, errors.SocketTimeoutError, OSError, EOFError)):
+        return True
+    if isinstance(error, errors.ServerException):
+        return error.code in RETRYABLE_SERVER_ERRORS
+    return False
+
+
+class BufferFullError(Exception):
+    """缓冲区已满且等待超时"""
+
+    pass
+
+
+class BulkWriter:
+    """
+    线程安全的ClickHouse批量写入器
+
+    每张表一个列式缓冲区，由后台线程按阈值刷新。
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        max_rows: int = 10000,
+        flush_interval: float = 1.0,
+        max_buffer_rows: int = 200000,
+        block_timeout: float = 5.0,
+        database: Optional[str] = None,
+    ):
+        """
+        初始化批量写入器
+
+        Args:
+            client_factory: 创建clickhouse_driver.Client的函数，写入线程独占该连接
+            max_rows: 单表缓冲达到此行数时立即刷新
+            flush_interval: 最长刷新间隔（秒）
+            max_buffer_rows: 所有表缓冲总行数上限，超出后写入方阻塞
+            block_timeout: 写入方最长阻塞时间（秒）
+            database: 目标数据库，默认使用CLICKHOUSE_DATABASE
+        """
+        self.client_factory = client_factory
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_buffer_rows = max_buffer_rows
+        self.block_timeout = block_timeout
+        self.database = database or config.CLICKHOUSE_DATABASE
+
+        self._buffers: Dict[str, Dict[str, List[Any]]] = {}
+        self._first_row_at: Dict[str, float] = {}
+        self._buffered_rows = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._client = None
+        self._closed = False
+
+        self.stats = {"rows_written": 0, "blocks_written": 0, "flush_errors": 0, "rows_dropped": 0}
+
+        self._thread = threading.Thread(
+            target=self._run, name="clickhouse-bulk-writer", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def buffered_rows(self) -> int:
+        """当前缓冲的总行数"""
+        return self._buffered_rows
+
+    def write(self, table: str, rows: Union[Mapping[str, Any], Iterable[Mapping[str, Any]]]):
+        """
+        写入一行或多行
+
+        Args:
+            table: 表名（LOG_TABLE_COLUMNS中的表）
+            rows: 单行字典或行字典列表
+
+        Raises:
+            ValueError: 未知表或缺少列
+            BufferFullError: 缓冲区已满且等待超时
+            RuntimeError: 写入器已关闭
+        """
+        columns = LOG_TABLE_COLUMNS.get(table)
+        if columns is None:
+            raise ValueError(f"Unknown ClickHouse log table: {table}")
+
+        if isinstance(rows, Mapping):
+            rows = [rows]
+        rows = list(rows)
+        if not rows:
+            return
+
+        for row in rows:
+            missing = [column for column in columns if column not in row]
+            if missing:
+                raise ValueError(f"Missing columns for {table}: {', '.join(missing)}")
+
+        deadline = time.monotonic() + self.block_timeout
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BulkWriter is closed")
+
+            # 背压：等待后台线程腾出缓冲空间
+            while self._buffered_rows + len(rows) > self.max_buffer_rows and self._buffered_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BufferFullError(
+                        f"ClickHouse buffer full ({self._buffered_rows} rows buffered)"
+                    )
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+
+            buffer = self._buffers.get(table)
+            if buffer is None:
+                buffer = self._buffers[table] = {column: [] for column in columns}
+                self._first_row_at[table] = time.monotonic()
+            for row in rows:
+                for column in columns:
+                    buffer[column].append(row[column])
+
+            self._buffered_rows += len(rows)
+            if len(buffer[columns[0]]) >= self.max_rows:
+                self._cond.notify_all()
+
+    def _take(self, force: bool) -> Dict[str, Dict[str, List[Any]]]:
+        """取出需要刷新的缓冲区（调用方需持有条件锁）"""
+        now = time.monotonic()
+        ready = {}
+        for table, buffer in list(self._buffers.items()):
+            size = len(next(iter(buffer.values())))
+            if (
+                force
+                or size >= self.max_rows
+                or now - self._first_row_at[table] >= self.flush_interval
+            ):
+                ready[table] = self._buffers.pop(table)
+                del self._first_row_at[table]
+        return ready
+
+    def _release(self, rows: int):
+        """释放缓冲空间并唤醒等待的写入方"""
+        with self._cond:
+            self._buffered_rows -= rows
+            self._cond.notify_all()
+
+    def _insert(self, table: str, buffer: Dict[str, List[Any]]):
+        """以列式数据块写入一张表"""
+        if self._client is None:
+            self._client = self.client_factory()
+
+        columns = list(buffer.keys())
+        column_list = ", ".join(f"`{column}`" for column in columns)
+        self._client.execute(
+            f"INSERT INTO {self.database}.{table} ({column_list}) VALUES",
+            [buffer[column] for column in columns],
+            columnar=True,
+        )
+
+    def flush(self, force: bool = True):
+        """
+        刷新缓冲区
+
+        网络错误或暂时性服务端错误的数据块放回缓冲区等待下次重试；
+        其他错误（如数据无法序列化）以及关闭时的最终刷新失败则丢弃并记录行数。
+
+        Args:
+            force: 是否忽略阈值刷新所有表
+        """
+        with self._flush_lock:
+            with self._cond:
+                ready = self._take(force)
+
+            for table, buffer in ready.items():
+                size = len(next(iter(buffer.values())))
+                try:
+                    self._insert(table, buffer)
+                    self.stats["rows_written"] += size
+                    self.stats["blocks_written"] += 1
+                    self._release(size)
+                except Exception as e:
+                    self.stats["flush_errors"] += 1
+                    self._reset_client()
+                    if self._closed:
+                        logger.error(f"Dropped {size} rows for {table} on shutdown: {e}")
+                        self.stats["rows_dropped"] += size
+                        self._release(size)
+                    elif not is_retryable(e):
+                        logger.error(
+                            f"Dropped {size} rows for {table}, insert failed permanently: "
+                            f"{type(e).__name__}: {e}"
+                        )
+                        self.stats["rows_dropped"] += size
+                        self._release(size)
+                    else:
+                        logger.warning(f"Flush of {size} rows to {table} failed, will retry: {e}")
+                        self._requeue(table, buffer)
+
+    def _requeue(self, table: str, buffer: Dict[str, List[Any]]):
+        """写入失败的数据放回缓冲区头部（行数已计入，不重复计数）"""
+        with self._cond:
+            current = self._buffers.get(table)
+            if current is not None:
+                for column, values in buffer.items():
+                    values.extend(current[column])
+            self._buffers[table] = buffer
+            self._first_row_at[table] = time.monotonic()
+
+    def _reset_client(self):
+        """出错后丢弃连接，下次写入时重建"""
+        if self._client is not None:
+            try:
+                self._client.disconnect()
+            except Exception:
+                pass
+            self._client = None
+
+    def _run(self):
+        """后台刷新线程"""
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush(force=False)
+            except Exception as e:
+                logger.error(f"ClickHouse bulk writer error: {e}", exc_info=True)
+
+    def close(self):
+        """停止后台线程并刷新剩余数据"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush(force=True)
+        self._reset_client()
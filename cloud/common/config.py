@@ -18,6 +18,8 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     TESTING = os.getenv("TESTING", "False").lower() == "true"
+    # JSON响应的日期时间格式：http（HTTP日期，与Flask默认一致）或 iso（RFC 3339，序列化更快）
+    JSON_DATETIME_FORMAT = os.getenv("JSON_DATETIME_FORMAT", "http")
 
     # MySQL配置
     MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
@@ -34,12 +36,25 @@ class Config:
             f"?charset=utf8mb4"
         )
 
+    # MySQL只读副本（逗号分隔的SQLAlchemy URI，留空表示不启用读写分离）
+    MYSQL_REPLICA_URIS = [
+        uri.strip() for uri in os.getenv("MYSQL_REPLICA_URIS", "").split(",") if uri.strip()
+    ]
+    MYSQL_REPLICA_MAX_LAG = float(os.getenv("MYSQL_REPLICA_MAX_LAG", "5"))  # 秒
+    MYSQL_REPLICA_CHECK_INTERVAL = float(os.getenv("MYSQL_REPLICA_CHECK_INTERVAL", "10"))
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_POOL_SIZE = int(os.getenv("SQLALCHEMY_POOL_SIZE", "10"))
     SQLALCHEMY_POOL_TIMEOUT = int(os.getenv("SQLALCHEMY_POOL_TIMEOUT", "30"))
     SQLALCHEMY_POOL_RECYCLE = int(os.getenv("SQLALCHEMY_POOL_RECYCLE", "3600"))
     SQLALCHEMY_MAX_OVERFLOW = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", "20"))
 
+    # 数据库初始化配置
+    DB_LAZY_INIT = os.getenv("DB_LAZY_INIT", "True").lower() == "true"  # 首次使用时再连接
+    DB_WARMUP = os.getenv("DB_WARMUP", "False").lower() == "true"  # 启动后后台并发预热连接池
+    # 初始化失败后的重试间隔（秒）
+    DB_INIT_RETRY_INTERVAL = float(os.getenv("DB_INIT_RETRY_INTERVAL", "5"))
+
     # ClickHouse配置
     CLICKHOUSE_HOST = os.getenv("CLICKHOUSE_HOST", "localhost")
     CLICKHOUSE_PORT = int(os.getenv("CLICKHOUSE_PORT", "9000"))
@@ -47,12 +62,27 @@ class Config:
     CLICKHOUSE_PASSWORD = os.getenv("CLICKHOUSE_PASSWORD", "")
     CLICKHOUSE_DATABASE = os.getenv("CLICKHOUSE_DATABASE", "idps")
 
+    # ClickHouse连接池配置
+    CLICKHOUSE_POOL_SIZE = int(os.getenv("CLICKHOUSE_POOL_SIZE", "5"))
+    CLICKHOUSE_POOL_MAX_OVERFLOW = int(os.getenv("CLICKHOUSE_POOL_MAX_OVERFLOW", "10"))
+    CLICKHOUSE_POOL_TIMEOUT = float(os.getenv("CLICKHOUSE_POOL_TIMEOUT", "30"))
+    CLICKHOUSE_POOL_PING_INTERVAL = float(os.getenv("CLICKHOUSE_POOL_PING_INTERVAL", "30"))
+
+    # ClickHouse批量写入配置
+    CLICKHOUSE_BULK_MAX_ROWS = int(os.getenv("CLICKHOUSE_BULK_MAX_ROWS", "10000"))
+    CLICKHOUSE_BULK_FLUSH_INTERVAL = float(os.getenv("CLICKHOUSE_BULK_FLUSH_INTERVAL", "1.0"))
+    CLICKHOUSE_BULK_MAX_BUFFER_ROWS = int(os.getenv("CLICKHOUSE_BULK_MAX_BUFFER_ROWS", "200000"))
+    CLICKHOUSE_BULK_BLOCK_TIMEOUT = float(os.getenv("CLICKHOUSE_BULK_BLOCK_TIMEOUT", "5.0"))
+
     # Redis配置
     REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
     REDIS_DB = int(os.getenv("REDIS_DB", "0"))
     REDIS_DECODE_RESPONSES = True
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
 
     @property
     def REDIS_URL(self) -> str:
@@ -60,14 +90,57 @@ class Config:
             return f"redis://:{self.REDIS_PASSWORD}@{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
 
+    # 查询缓存配置（L1进程内LRU，L2 Redis；L1 TTL即失效广播丢失时的最大过期延迟）
+    QUERY_CACHE_LOCAL_SIZE = int(os.getenv("QUERY_CACHE_LOCAL_SIZE", "10000"))
+    QUERY_CACHE_LOCAL_TTL = int(os.getenv("QUERY_CACHE_LOCAL_TTL", "60"))
+    QUERY_CACHE_REDIS_TTL = int(os.getenv("QUERY_CACHE_REDIS_TTL", "300"))
+    QUERY_CACHE_LOCK_TIMEOUT = float(os.getenv("QUERY_CACHE_LOCK_TIMEOUT", "5"))
+
+    # 心跳写入合并配置（刷新间隔即MySQL中心跳时间的最大延迟）
+    HEARTBEAT_FLUSH_INTERVAL = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL", "10"))
+    HEARTBEAT_FLUSH_BATCH_SIZE = int(os.getenv("HEARTBEAT_FLUSH_BATCH_SIZE", "1000"))
+    HEARTBEAT_ONLINE_TIMEOUT = int(os.getenv("HEARTBEAT_ONLINE_TIMEOUT", "300"))
+
+    # 上传日志去重配置（去重覆盖时长 = 窗口长度 * 窗口数）
+    LOG_DEDUP_WINDOW_SECONDS = int(os.getenv("LOG_DEDUP_WINDOW_SECONDS", "21600"))
+    LOG_DEDUP_WINDOWS = int(os.getenv("LOG_DEDUP_WINDOWS", "4"))
+    LOG_DEDUP_EXPECTED_ITEMS = int(os.getenv("LOG_DEDUP_EXPECTED_ITEMS", "5000000"))  # 每窗口
+    LOG_DEDUP_FP_RATE = float(os.getenv("LOG_DEDUP_FP_RATE", "0.001"))
+    LOG_DEDUP_MEMORY_BUDGET_MB = int(os.getenv("LOG_DEDUP_MEMORY_BUDGET_MB", "64"))
+
+    # 日志查询精确总数缓存时间（秒）
+    LOG_COUNT_CACHE_TTL = int(os.getenv("LOG_COUNT_CACHE_TTL", "60"))
+
+    # 审计日志异步写入配置（溢出文件留空表示MySQL不可用时事件留在内存队列重试）
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+    AUDIT_MAX_QUEUE = int(os.getenv("AUDIT_MAX_QUEUE", "100000"))
+    AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "")
+    AUDIT_MAX_ATTEMPTS = int(os.getenv("AUDIT_MAX_ATTEMPTS", "3"))
+    AUDIT_REPLAY_MAX_BACKOFF = float(os.getenv("AUDIT_REPLAY_MAX_BACKOFF", "60"))  # 秒
+
     # JWT配置
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", SECRET_KEY)
-    JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+    JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")  # HS256, ES256, EdDSA
+    # 非对称签名密钥目录（<kid>.pem私钥, <kid>.pub.pem公钥）
+    JWT_KEY_DIR = os.getenv("JWT_KEY_DIR", "/etc/idps/jwt-keys")
+    JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "")
+    JWT_KEY_RELOAD_INTERVAL = int(os.getenv("JWT_KEY_RELOAD_INTERVAL", "60"))
+    # 未知kid触发重新加载密钥目录的最小间隔（秒）
+    JWT_KEY_FORCE_RELOAD_COOLDOWN = float(os.getenv("JWT_KEY_FORCE_RELOAD_COOLDOWN", "5"))
+    # 从HS256切换到非对称算法后，继续接受无kid的HS256 Token直到该时间（Unix时间戳，0表示不接受）
+    JWT_LEGACY_HS256_UNTIL = int(os.getenv("JWT_LEGACY_HS256_UNTIL", "0"))
     JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", "86400"))  # 24小时
     JWT_REFRESH_TOKEN_EXPIRES = int(
         os.getenv("JWT_REFRESH_TOKEN_EXPIRES", "2592000")
     )  # 30天
 
+    # JWT验证缓存配置（进程内LRU，TTL即撤销生效的最大延迟）
+    JWT_CACHE_ENABLED = os.getenv("JWT_CACHE_ENABLED", "True").lower() == "true"
+    JWT_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+    JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "30"))  # 30秒
+    JWT_REVOCATION_RETRY_INTERVAL = int(os.getenv("JWT_REVOCATION_RETRY_INTERVAL", "5"))
+
     # 日志配置
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
@@ -90,6 +163,8 @@ class Config:
     # 规则文件存储配置
     RULE_STORAGE_TYPE = os.getenv("RULE_STORAGE_TYPE", "local")  # local, s3, minio
     RULE_STORAGE_PATH = os.getenv("RULE_STORAGE_PATH", "/var/lib/idps/rules")
+    RULE_SIGNING_KEY = os.getenv("RULE_SIGNING_KEY", "")  # 规则文件HMAC签名密钥，留空不签名
+    RULE_PACKAGE_WORKERS = int(os.getenv("RULE_PACKAGE_WORKERS", "0"))  # 打包进程数，0表示CPU核数
 
     # MinIO/S3配置（可选）
     MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "")
@@ -98,6 +173,17 @@ class Config:
     MINIO_BUCKET = os.getenv("MINIO_BUCKET", "idps-rules")
     MINIO_SECURE = os.getenv("MINIO_SECURE", "True").lower() == "true"
 
+    # 规则增量更新配置（为新版本计算增量的历史版本数；增量超过目标文件该比例时不使用）
+    RULE_DELTA_MAX_BASES = int(os.getenv("RULE_DELTA_MAX_BASES", "5"))
+    RULE_DELTA_MAX_RATIO = float(os.getenv("RULE_DELTA_MAX_RATIO", "0.5"))
+
+    # 规则分批下发配置（下载名额租约即异常断开车辆占用名额的最长时间）
+    RULE_DEPLOY_INSERT_CHUNK = int(os.getenv("RULE_DEPLOY_INSERT_CHUNK", "5000"))
+    RULE_DEPLOY_DOWNLOAD_CONCURRENCY = int(os.getenv("RULE_DEPLOY_DOWNLOAD_CONCURRENCY", "2000"))
+    RULE_DEPLOY_SLOT_TTL = int(os.getenv("RULE_DEPLOY_SLOT_TTL", "300"))
+    RULE_DEPLOY_FLUSH_INTERVAL = float(os.getenv("RULE_DEPLOY_FLUSH_INTERVAL", "2"))
+    RULE_DEPLOY_FLUSH_BATCH_SIZE = int(os.getenv("RULE_DEPLOY_FLUSH_BATCH_SIZE", "1000"))
+
     @classmethod
     def validate(cls):
         """验证配置有效性"""
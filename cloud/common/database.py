@@ -2,15 +2,27 @@
 数据库连接管理
 """
 
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Dict, Generator, List, Optional
 import redis
+import redis.asyncio as redis_asyncio
 from clickhouse_driver import Client
-from sqlalchemy import create_engine
+from clickhouse_driver import errors as clickhouse_errors
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
 
 from .config import config
+from .clickhouse_writer import BulkWriter
+from .redis_scripts import scripts as redis_scripts
+
+logger = logging.getLogger(__name__)
 
 # SQLAlchemy Base
 Base = declarative_base()
@@ -20,19 +32,291 @@ engine = None
 SessionLocal = None
 db_session = None
 
+# MySQL只读副本路由
+replica_router = None
+
 # ClickHouse Client
 clickhouse_client = None
 
-# Redis Client
+# ClickHouse Connection Pool
+clickhouse_pool = None
+
+# ClickHouse Bulk Writer
+bulk_writer = None
+
+# Redis Connection Pool and Client
+redis_pool = None
 redis_client = None
 
+# Redis asyncio Client
+redis_async_client = None
 
-def init_mysql():
-    """初始化MySQL连接"""
-    global engine, SessionLocal, db_session
+# 后端初始化状态（延迟初始化与就绪检查）
+BACKENDS = ("mysql", "clickhouse", "redis")
+_lazy_backends: set = set()
+_backend_state: Dict[str, Dict[str, Any]] = {}
+_backend_locks = {name: threading.Lock() for name in BACKENDS}
+
+
+class PoolTimeoutError(Exception):
+    """连接池获取连接超时"""
+
+    pass
+
+
+class ClickHousePool:
+    """
+    ClickHouse连接池
+
+    clickhouse_driver.Client非线程安全，连接池保证同一连接同一时刻只被一个线程使用。
+    - size: 常驻连接数
+    - max_overflow: 超出size的临时连接数，归还时关闭
+    - timeout: 连接全部被占用时的最长等待时间（秒）
+    - ping_interval: 空闲超过此时间的连接在取出前执行SELECT 1检测，失败则重建
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Client],
+        size: int = 5,
+        max_overflow: int = 10,
+        timeout: float = 30,
+        ping_interval: float = 30,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _ping(self, client: Client) -> bool:
+        """检测连接是否可用"""
+        try:
+            client.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"ClickHouse connection ping failed, reconnecting: {e}")
+            return False
+
+    def _create(self) -> Client:
+        """创建新连接（调用前已占用计数）"""
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def checkout(self) -> Client:
+        """
+        取出连接
+
+        Returns:
+            ClickHouse客户端
+
+        Raises:
+            PoolTimeoutError: 等待超时
+        """
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            try:
+                client, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size + self.max_overflow
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    return self._create()
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"ClickHouse pool exhausted (size={self.size}, "
+                        f"overflow={self.max_overflow}, timeout={self.timeout}s)"
+                    )
+                try:
+                    client, last_used = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            if time.monotonic() - last_used < self.ping_interval or self._ping(client):
+                return client
+
+            # 连接失效：关闭后重建
+            self._close(client)
+            return self._create()
+
+    def checkin(self, client: Client, discard: bool = False):
+        """
+        归还连接
+
+        Args:
+            client: 取出的客户端
+            discard: 是否丢弃该连接（如发生网络错误）
+        """
+        if discard or self._idle.qsize() >= self.size:
+            self._close(client)
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put((client, time.monotonic()))
+
+    @staticmethod
+    def _close(client: Client):
+        """断开连接，忽略错误"""
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+    def dispose(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(client)
+            with self._lock:
+                self._created -= 1
+
+    def status(self) -> Dict[str, Any]:
+        """
+        获取连接池状态
+
+        Returns:
+            包含size, max_overflow, created, idle, in_use的字典
+        """
+        idle = self._idle.qsize()
+        return {
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "created": self._created,
+            "idle": idle,
+            "in_use": self._created - idle,
+        }
+
+
+class ReplicaRouter:
+    """
+    MySQL只读副本路由
 
-    engine = create_engine(
-        config.SQLALCHEMY_DATABASE_URI,
+    在复制延迟不超过max_lag的副本间轮询分配只读会话；
+    副本延迟过大、复制中断或连接失败时回退到主库。
+    延迟检测结果缓存check_interval秒；检测在锁外进行，
+    同一副本同一时刻只有一个线程检测，其他线程沿用上次结果。
+    """
+
+    def __init__(
+        self,
+        primary_factory: sessionmaker,
+        replica_engines: List[Engine],
+        max_lag: float = 5,
+        check_interval: float = 10,
+    ):
+        self.primary_factory = primary_factory
+        self.replica_engines = replica_engines
+        self.replica_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=replica)
+            for replica in replica_engines
+        ]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+        self._lag: List[Optional[float]] = [None] * len(replica_engines)
+        self._checked_at: List[float] = [0.0] * len(replica_engines)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _query_lag(replica: Engine) -> Optional[float]:
+        """查询副本复制延迟（秒），复制未运行时返回None"""
+        with replica.connect() as conn:
+            try:
+                row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                lag_column = "Seconds_Behind_Source"
+            except Exception:
+                # MySQL 8.0.22之前的版本
+                row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+                lag_column = "Seconds_Behind_Master"
+
+        if row is None:
+            # 未配置复制（如直连的只读实例），视为无延迟
+            return 0.0
+        lag = row.get(lag_column)
+        return float(lag) if lag is not None else None
+
+    def _is_healthy(self, index: int) -> bool:
+        """检查副本延迟是否在允许范围内（带缓存）"""
+        now = time.monotonic()
+        with self._lock:
+            probe = now - self._checked_at[index] >= self.check_interval
+            if probe:
+                # 先占用本轮检测，检测期间其他线程不重复检测
+                self._checked_at[index] = now
+            lag = self._lag[index]
+
+        if probe:
+            try:
+                lag = self._query_lag(self.replica_engines[index])
+            except Exception as e:
+                logger.warning(f"MySQL replica {index} lag check failed: {e}")
+                lag = None
+            self._lag[index] = lag
+
+        return lag is not None and lag <= self.max_lag
+
+    def session(self) -> Session:
+        """
+        创建只读会话
+
+        Returns:
+            副本会话；没有可用副本时返回主库会话
+        """
+        count = len(self.replica_factories)
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % count if count else 0
+
+        for offset in range(count):
+            index = (start + offset) % count
+            if self._is_healthy(index):
+                return self.replica_factories[index]()
+
+        return self.primary_factory()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        获取副本状态
+
+        Returns:
+            每个副本的延迟和可用状态
+        """
+        return [
+            {
+                "replica": replica.url.render_as_string(hide_password=True),
+                "lag": self._lag[i],
+                "healthy": self._lag[i] is not None and self._lag[i] <= self.max_lag,
+            }
+            for i, replica in enumerate(self.replica_engines)
+        ]
+
+    def dispose(self):
+        """关闭所有副本连接"""
+        for replica in self.replica_engines:
+            replica.dispose()
+
+
+def _create_mysql_engine(uri: str) -> Engine:
+    """按连接池配置创建MySQL引擎"""
+    return create_engine(
+        uri,
         pool_size=config.SQLALCHEMY_POOL_SIZE,
         pool_timeout=config.SQLALCHEMY_POOL_TIMEOUT,
         pool_recycle=config.SQLALCHEMY_POOL_RECYCLE,
@@ -40,20 +324,32 @@ def init_mysql():
         echo=config.DEBUG,
     )
 
+
+def init_mysql():
+    """初始化MySQL连接（配置了MYSQL_REPLICA_URIS时同时初始化只读副本）"""
+    global engine, SessionLocal, db_session, replica_router
+
+    engine = _create_mysql_engine(config.SQLALCHEMY_DATABASE_URI)
+
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db_session = scoped_session(SessionLocal)
 
+    replica_router = ReplicaRouter(
+        primary_factory=SessionLocal,
+        replica_engines=[_create_mysql_engine(uri) for uri in config.MYSQL_REPLICA_URIS],
+        max_lag=config.MYSQL_REPLICA_MAX_LAG,
+        check_interval=config.MYSQL_REPLICA_CHECK_INTERVAL,
+    )
+
     # Bind base to engine
     Base.metadata.bind = engine
 
     return engine
 
 
-def init_clickhouse():
-    """初始化ClickHouse连接"""
-    global clickhouse_client
-
-    clickhouse_client = Client(
+def create_clickhouse_client() -> Client:
+    """创建新的ClickHouse客户端（clickhouse_driver.Client非线程安全，每个线程独占）"""
+    return Client(
         host=config.CLICKHOUSE_HOST,
         port=config.CLICKHOUSE_PORT,
         user=config.CLICKHOUSE_USER,
@@ -61,59 +357,439 @@ def init_clickhouse():
         database=config.CLICKHOUSE_DATABASE,
     )
 
+
+def init_clickhouse():
+    """
+    初始化ClickHouse连接
+
+    同时创建连接池；多线程环境请使用get_clickhouse()，
+    clickhouse_client仅供单线程脚本使用。
+    """
+    global clickhouse_client, clickhouse_pool
+
+    clickhouse_client = create_clickhouse_client()
+
+    clickhouse_pool = ClickHousePool(
+        factory=create_clickhouse_client,
+        size=config.CLICKHOUSE_POOL_SIZE,
+        max_overflow=config.CLICKHOUSE_POOL_MAX_OVERFLOW,
+        timeout=config.CLICKHOUSE_POOL_TIMEOUT,
+        ping_interval=config.CLICKHOUSE_POOL_PING_INTERVAL,
+    )
+
     return clickhouse_client
 
 
+def init_bulk_writer() -> BulkWriter:
+    """
+    初始化ClickHouse批量写入器（幂等）
+
+    写入器使用独立连接，close_db时刷新剩余数据。
+    """
+    global bulk_writer
+
+    if bulk_writer is None:
+        bulk_writer = BulkWriter(
+            client_factory=create_clickhouse_client,
+            max_rows=config.CLICKHOUSE_BULK_MAX_ROWS,
+            flush_interval=config.CLICKHOUSE_BULK_FLUSH_INTERVAL,
+            max_buffer_rows=config.CLICKHOUSE_BULK_MAX_BUFFER_ROWS,
+            block_timeout=config.CLICKHOUSE_BULK_BLOCK_TIMEOUT,
+        )
+
+    return bulk_writer
+
+
+def _redis_pool_kwargs() -> Dict[str, Any]:
+    """Redis连接池参数（同步与asyncio共用）"""
+    return {
+        "host": config.REDIS_HOST,
+        "port": config.REDIS_PORT,
+        "password": config.REDIS_PASSWORD if config.REDIS_PASSWORD else None,
+        "db": config.REDIS_DB,
+        "decode_responses": config.REDIS_DECODE_RESPONSES,
+        "socket_connect_timeout": 5,
+        "socket_timeout": 5,
+        "retry_on_timeout": True,
+        "health_check_interval": config.REDIS_HEALTH_CHECK_INTERVAL,
+        "max_connections": config.REDIS_MAX_CONNECTIONS,
+        "timeout": config.REDIS_POOL_TIMEOUT,
+    }
+
+
 def init_redis():
-    """初始化Redis连接"""
-    global redis_client
-
-    redis_client = redis.Redis(
-        host=config.REDIS_HOST,
-        port=config.REDIS_PORT,
-        password=config.REDIS_PASSWORD if config.REDIS_PASSWORD else None,
-        db=config.REDIS_DB,
-        decode_responses=config.REDIS_DECODE_RESPONSES,
-        socket_connect_timeout=5,
-        socket_timeout=5,
-        retry_on_timeout=True,
-    )
+    """
+    初始化Redis连接
+
+    使用BlockingConnectionPool：连接数达到REDIS_MAX_CONNECTIONS后等待空闲连接
+    （最长REDIS_POOL_TIMEOUT秒），而不是无限制地新建连接。
+    初始化后预加载所有已注册的Lua脚本。
+    """
+    global redis_pool, redis_client
+
+    pool = redis.BlockingConnectionPool(**_redis_pool_kwargs())
+    client = redis.Redis(connection_pool=pool)
+
+    # Test connection（连接成功后才设置全局客户端）
+    try:
+        client.ping()
+        redis_scripts.load_all(client)
+    except Exception:
+        pool.disconnect()
+        raise
+
+    redis_pool, redis_client = pool, client
+
+    return redis_client
+
+
+class RedisBatch:
+    """
+    Redis流水线命令组
+
+    代理Pipeline的所有命令，退出上下文时一次往返执行，结果保存在results中。
+    """
+
+    def __init__(self, pipeline: "redis.client.Pipeline"):
+        self.pipeline = pipeline
+        self.results: list = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pipeline, name)
+
+    def script(self, name: str, keys=None, args=None) -> "RedisBatch":
+        """在流水线中调用已注册的Lua脚本"""
+        redis_scripts.call(name, keys=keys, args=args, client=self.pipeline)
+        return self
+
+
+@contextmanager
+def redis_pipeline(transaction: bool = False) -> Generator[RedisBatch, None, None]:
+    """
+    Redis流水线上下文管理器
+    用法:
+        with redis_pipeline() as batch:
+            batch.get("a")
+            batch.incr("b")
+            batch.script("rate_limit", keys=["c"], args=[60000])
+        value, counter, count = batch.results
+    """
+    pipe = get_redis_client().pipeline(transaction=transaction)
+    batch = RedisBatch(pipe)
+    try:
+        yield batch
+        batch.results = pipe.execute()
+    finally:
+        pipe.reset()
+
+
+async def init_redis_async():
+    """初始化Redis asyncio连接（用于异步视图）"""
+    global redis_async_client
+
+    pool = redis_asyncio.BlockingConnectionPool(**_redis_pool_kwargs())
+    redis_async_client = redis_asyncio.Redis(connection_pool=pool)
 
     # Test connection
-    redis_client.ping()
+    await redis_async_client.ping()
+
+    return redis_async_client
+
+
+async def close_redis_async():
+    """关闭Redis asyncio连接"""
+    global redis_async_client
+
+    if redis_async_client:
+        await redis_async_client.aclose()
+        redis_async_client = None
+
+
+class BackendUnavailableError(Exception):
+    """后端初始化失败（在重试间隔内不再重复尝试）"""
+
+    pass
+
+
+def _is_initialized(name: str) -> bool:
+    """后端是否已初始化"""
+    if name == "mysql":
+        return SessionLocal is not None
+    if name == "clickhouse":
+        return clickhouse_pool is not None
+    return redis_client is not None
+
+
+def _initialize(name: str):
+    """初始化单个后端并记录状态与耗时"""
+    initializer = {"mysql": init_mysql, "clickhouse": init_clickhouse, "redis": init_redis}[name]
+    start = time.monotonic()
+    try:
+        initializer()
+    except Exception as e:
+        _backend_state[name] = {
+            "state": "error",
+            "error": str(e),
+            "failed_at": time.monotonic(),
+            "init_ms": round((time.monotonic() - start) * 1000, 2),
+        }
+        raise
+    _backend_state[name] = {
+        "state": "ready",
+        "init_ms": round((time.monotonic() - start) * 1000, 2),
+    }
+
+
+def _ensure(name: str) -> bool:
+    """
+    确保后端已初始化（延迟初始化）
 
+    Returns:
+        是否已初始化；未调用init_db且未手动初始化时返回False
+
+    Raises:
+        BackendUnavailableError: 初始化失败
+    """
+    if _is_initialized(name):
+        return True
+    if name not in _lazy_backends:
+        return False
+
+    with _backend_locks[name]:
+        if _is_initialized(name):
+            return True
+
+        # 失败后在重试间隔内直接报错，避免每个请求都等待连接超时
+        state = _backend_state.get(name, {})
+        if state.get("state") == "error":
+            if time.monotonic() - state["failed_at"] < config.DB_INIT_RETRY_INTERVAL:
+                raise BackendUnavailableError(f"{name} unavailable: {state['error']}")
+
+        try:
+            _initialize(name)
+        except Exception as e:
+            logger.error(f"Failed to initialize {name}: {e}")
+            raise BackendUnavailableError(f"{name} unavailable: {e}") from e
+    return True
+
+
+def get_engine() -> Optional[Engine]:
+    """获取MySQL引擎（按需初始化）"""
+    _ensure("mysql")
+    return engine
+
+
+def get_redis_client() -> Optional[redis.Redis]:
+    """
+    获取Redis客户端（按需初始化）
+
+    Returns:
+        Redis客户端；未配置Redis时返回None
+
+    Raises:
+        BackendUnavailableError: Redis初始化失败
+    """
+    _ensure("redis")
     return redis_client
 
 
-def init_db():
-    """初始化所有数据库连接"""
-    init_mysql()
-    init_clickhouse()
-    init_redis()
+def get_clickhouse_pool() -> Optional[ClickHousePool]:
+    """获取ClickHouse连接池（按需初始化）"""
+    _ensure("clickhouse")
+    return clickhouse_pool
+
+
+def _warmup_backend(name: str, executor: ThreadPoolExecutor):
+    """初始化后端并并发预建连接池中的连接"""
+    _ensure(name)
+
+    if name == "mysql":
+        count = config.SQLALCHEMY_POOL_SIZE
+
+        def open_connection():
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            return conn
+
+    elif name == "clickhouse":
+        count = clickhouse_pool.size
+
+        def open_connection():
+            client = clickhouse_pool.checkout()
+            client.execute("SELECT 1")
+            return client
+
+    else:
+        count = min(config.REDIS_MAX_CONNECTIONS, 10)
+
+        def open_connection():
+            connection = redis_pool.get_connection("PING")
+            connection.connect()
+            return connection
+
+    # 同时持有count个连接，保证连接池建立了count个不同的连接
+    opened = [f.result() for f in [executor.submit(open_connection) for _ in range(count)]]
+
+    for item in opened:
+        if name == "mysql":
+            item.close()
+        elif name == "clickhouse":
+            clickhouse_pool.checkin(item)
+        else:
+            redis_pool.release(item)
+
+
+def warmup_db(backends=BACKENDS, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    并发预热后端：初始化连接并预建连接池中的连接
+
+    Args:
+        backends: 需要预热的后端
+        timeout: 最长等待时间（秒），None表示等待全部完成
+
+    Returns:
+        每个后端的预热结果（ok或错误信息）
+    """
+    results: Dict[str, Any] = {}
+    executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="db-warmup")
+    outer = ThreadPoolExecutor(max_workers=len(backends), thread_name_prefix="db-warmup-backend")
+    futures = {outer.submit(_warmup_backend, name, executor): name for name in backends}
+
+    done, _ = wait(futures, timeout=timeout)
+    for future, name in futures.items():
+        if future not in done:
+            results[name] = "timeout"
+        elif future.exception() is not None:
+            results[name] = str(future.exception())
+            logger.warning(f"Warmup of {name} failed: {future.exception()}")
+        else:
+            results[name] = "ok"
+
+    outer.shutdown(wait=False)
+    executor.shutdown(wait=False)
+    return results
+
+
+def init_db(lazy: Optional[bool] = None, warmup: Optional[bool] = None, backends=BACKENDS):
+    """
+    初始化数据库连接
+
+    Args:
+        lazy: 是否延迟到首次使用时再连接，默认使用DB_LAZY_INIT
+        warmup: 是否在后台线程中并发预热连接池，默认使用DB_WARMUP
+        backends: 需要使用的后端，未列出的后端不会被初始化
+    """
+    lazy = config.DB_LAZY_INIT if lazy is None else lazy
+    warmup = config.DB_WARMUP if warmup is None else warmup
+
+    _lazy_backends.update(backends)
+    for name in backends:
+        _backend_state.setdefault(name, {"state": "pending"})
+
+    if warmup:
+        threading.Thread(
+            target=warmup_db, args=(tuple(backends),), name="db-warmup", daemon=True
+        ).start()
+    elif not lazy:
+        # 并发初始化，启动耗时取决于最慢的后端而不是所有后端之和
+        with ThreadPoolExecutor(max_workers=len(backends)) as executor:
+            for future in [executor.submit(_ensure, name) for name in backends]:
+                future.result()
+
+
+def _ping_backend(name: str) -> float:
+    """初始化并探测后端，返回往返耗时（毫秒）"""
+    _ensure(name)
+    start = time.monotonic()
+    if name == "mysql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    elif name == "clickhouse":
+        with get_clickhouse() as client:
+            client.execute("SELECT 1")
+    else:
+        redis_client.ping()
+    return round((time.monotonic() - start) * 1000, 2)
+
+
+def check_readiness(timeout: float = 2.0) -> Dict[str, Any]:
+    """
+    就绪检查：并发探测已配置的后端
+
+    Args:
+        timeout: 所有探测的最长等待时间（秒）
+
+    Returns:
+        {"ready": bool, "backends": {name: {"state", "latency_ms", "error"}}}
+    """
+    names = [name for name in BACKENDS if name in _lazy_backends or _is_initialized(name)]
+    executor = ThreadPoolExecutor(max_workers=max(len(names), 1), thread_name_prefix="db-ready")
+    futures = {executor.submit(_ping_backend, name): name for name in names}
+    done, _ = wait(futures, timeout=timeout)
+
+    backends = {}
+    for future, name in futures.items():
+        if future not in done:
+            backends[name] = {"state": "timeout", "error": f"no response in {timeout}s"}
+        elif future.exception() is not None:
+            backends[name] = {"state": "error", "error": str(future.exception())}
+        else:
+            backends[name] = {"state": "ready", "latency_ms": future.result()}
+
+    executor.shutdown(wait=False)
+    return {
+        "ready": all(item["state"] == "ready" for item in backends.values()),
+        "backends": backends,
+    }
+
+
+def backend_status() -> Dict[str, Dict[str, Any]]:
+    """
+    获取后端初始化状态（不产生网络请求）
+
+    Returns:
+        每个后端的状态（pending, ready, error）及初始化耗时
+    """
+    status = {}
+    for name in BACKENDS:
+        state = {k: v for k, v in _backend_state.get(name, {}).items() if k != "failed_at"}
+        if _is_initialized(name):
+            state["state"] = "ready"
+            state.pop("error", None)
+        if state:
+            status[name] = state
+    return status
 
 
 def create_tables():
     """创建所有数据表"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 
 def drop_tables():
     """删除所有数据表（谨慎使用）"""
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=get_engine())
 
 
 @contextmanager
-def get_db() -> Generator[Session, None, None]:
+def get_db(readonly: bool = False) -> Generator[Session, None, None]:
     """
     获取数据库会话的上下文管理器
     用法:
         with get_db() as db:
             db.query(...)
+
+        # 只读查询，分配到延迟可接受的副本，无可用副本时使用主库
+        with get_db(readonly=True) as db:
+            db.query(...)
     """
-    session = SessionLocal()
+    session = get_db_session(readonly=readonly)
     try:
         yield session
-        session.commit()
+        if readonly:
+            session.rollback()
+        else:
+            session.commit()
     except Exception:
         session.rollback()
         raise
@@ -121,9 +797,36 @@ def get_db() -> Generator[Session, None, None]:
         session.close()
 
 
-def get_db_session() -> Session:
+@contextmanager
+def get_clickhouse() -> Generator[Client, None, None]:
+    """
+    从连接池获取ClickHouse客户端的上下文管理器
+    用法:
+        with get_clickhouse() as client:
+            client.execute(...)
+
+    Raises:
+        BackendUnavailableError: ClickHouse未初始化或初始化失败
+    """
+    pool = get_clickhouse_pool()
+    if pool is None:
+        raise BackendUnavailableError("clickhouse unavailable: not initialized")
+    client = pool.checkout()
+    discard = False
+    try:
+        yield client
+    except (clickhouse_errors.NetworkError, EOFError, OSError):
+        # 网络错误后连接状态不可信，丢弃重建
+        discard = True
+        raise
+    finally:
+        pool.checkin(client, discard=discard)
+
+
+def get_db_session(readonly: bool = False) -> Session:
     """
     获取数据库会话（需要手动关闭）
+    readonly=True时返回只读副本会话（无可用副本时为主库会话）
     用法:
         db = get_db_session()
         try:
@@ -134,19 +837,41 @@ def get_db_session() -> Session:
         finally:
             db.close()
     """
+    _ensure("mysql")
+    if readonly and replica_router is not None:
+        return replica_router.session()
     return SessionLocal()
 
 
 def close_db():
     """关闭数据库连接"""
+    global bulk_writer
+
+    # 先刷新心跳、审计、下发状态与批量写入缓冲区，再关闭连接
+    from .audit import close_audit_writer
+    from .heartbeat import close_heartbeat_aggregator
+    from .rule_deployment import close_status_writer
+
+    close_heartbeat_aggregator()
+    close_audit_writer()
+    close_status_writer()
+    if bulk_writer:
+        bulk_writer.close()
+        bulk_writer = None
     if db_session:
         db_session.remove()
     if engine:
         engine.dispose()
+    if replica_router:
+        replica_router.dispose()
     if clickhouse_client:
         clickhouse_client.disconnect()
+    if clickhouse_pool:
+        clickhouse_pool.dispose()
     if redis_client:
         redis_client.close()
+    if redis_pool:
+        redis_pool.disconnect()
 
 
 # 导出
@@ -154,15 +879,37 @@ __all__ = [
     "Base",
     "engine",
     "db_session",
+    "replica_router",
+    "ReplicaRouter",
     "clickhouse_client",
+    "clickhouse_pool",
+    "bulk_writer",
+    "redis_pool",
     "redis_client",
+    "redis_async_client",
     "init_db",
+    "warmup_db",
+    "check_readiness",
+    "backend_status",
+    "get_engine",
+    "get_redis_client",
+    "get_clickhouse_pool",
+    "BackendUnavailableError",
     "init_mysql",
     "init_clickhouse",
+    "create_clickhouse_client",
+    "init_bulk_writer",
     "init_redis",
+    "redis_pipeline",
+    "RedisBatch",
+    "init_redis_async",
+    "close_redis_async",
     "create_tables",
     "drop_tables",
     "get_db",
+    "get_clickhouse",
+    "ClickHousePool",
+    "PoolTimeoutError",
     "get_db_session",
     "close_db",
 ]
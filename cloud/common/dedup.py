@@ -0,0 +1,250 @@
+"""
+上传日志去重
+
+车辆从离线缓存重传日志，/api/v1/log/upload 需要按车辆生成的日志id返回duplicated_count。
+逐条到ClickHouse查询太慢，这里使用按时间窗口轮换的Bloom过滤器（Redis位图）：
+- 每个窗口一个位图 log:dedup:<窗口序号>，保留最近N个窗口，过期自动删除
+- 一批id的检查在一次EVALSHA中完成（只读），返回重复记录的下标
+- 日志写入ClickHouse成功后再调用commit()把id写入当前窗口，写入失败的日志重传时不会被误判为重复
+- 位图大小由每窗口预计条数和误判率计算，超出内存预算时按预算截断（误判率随之升高）
+
+Bloom过滤器只会误判"重复"，不会漏判；误判率即新日志被误丢弃的概率。
+同一批id在check与commit之间被并发上传时，两次上传都会写入。
+
+用法:
+    from common.dedup import log_deduplicator
+
+    ids = [log["id"] for log in logs]
+    duplicates = log_deduplicator.check(ids, vin=vin, log_type=log_type)
+    accepted = [log_id for i, log_id in enumerate(ids) if i not in set(duplicates)]
+    ...  # 写入ClickHouse
+    log_deduplicator.commit(accepted, vin=vin, log_type=log_type)
+"""
+
+import hashlib
+import logging
+import math
+import time
+from typing import List, Optional, Sequence
+
+import redis
+
+from . import database
+from .config import config
+from .redis_scripts import scripts
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "log:dedup:"
+
+# 批量检查：元素在任一窗口中所有位均为1即视为重复（不写入）
+# KEYS=各窗口  ARGV[1]=哈希函数个数k  ARGV[2..]=每个元素的k个位偏移
+BLOOM_CHECK_SCRIPT = """
+local k = tonumber(ARGV[1])
+local count = (#ARGV - 1) / k
+local duplicates = {}
+for i = 0, count - 1 do
+    local base = 2 + i * k
+    for w = 1, #KEYS do
+        local all = true
+        for j = 0, k - 1 do
+            if redis.call('GETBIT', KEYS[w], ARGV[base + j]) == 0 then
+                all = false
+                break
+            end
+        end
+        if all then
+            table.insert(duplicates, i)
+            break
+        end
+    end
+end
+return duplicates
+"""
+
+# 批量写入当前窗口
+# KEYS[1]=当前窗口  ARGV[1]=过期时间（秒）  ARGV[2..]=位偏移
+BLOOM_ADD_SCRIPT = """
+for i = 2, #ARGV do
+    redis.call('SETBIT', KEYS[1], ARGV[i], 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return #ARGV - 1
+"""
+
+scripts.register("bloom_check", BLOOM_CHECK_SCRIPT)
+scripts.register("bloom_add", BLOOM_ADD_SCRIPT)
+
+
+def bloom_parameters(expected_items: int, fp_rate: float, max_bits: Optional[int] = None):
+    """
+    计算Bloom过滤器参数
+
+    Args:
+        expected_items: 预计元素个数
+        fp_rate: 目标误判率
+        max_bits: 位数上限（内存预算）
+
+    Returns:
+        (位数m, 哈希函数个数k, 实际误判率)
+    """
+    n = max(1, expected_items)
+    bits = math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2))
+    if max_bits is not None:
+        bits = min(bits, max_bits)
+    bits = max(bits, 8)
+
+    hashes = max(1, round(bits / n * math.log(2)))
+    actual_rate = (1 - math.exp(-hashes * n / bits)) ** hashes
+    return bits, hashes, actual_rate
+
+
+class LogDeduplicator:
+    """基于轮换Bloom过滤器的日志id去重"""
+
+    def __init__(
+        self,
+        window_seconds: int = 21600,
+        windows: int = 4,
+        expected_items: int = 5_000_000,
+        fp_rate: float = 0.001,
+        memory_budget: int = 64 * 1024 * 1024,
+        key_prefix: str = KEY_PREFIX,
+    ):
+        """
+        初始化去重器
+
+        Args:
+            window_seconds: 单个窗口长度（秒）
+            windows: 保留窗口数，去重覆盖时长为 window_seconds * windows
+            expected_items: 每个窗口预计日志条数
+            fp_rate: 目标误判率
+            memory_budget: 所有窗口位图的总内存上限（字节）
+            key_prefix: Redis键前缀
+        """
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.key_prefix = key_prefix
+
+        max_bits = memory_budget * 8 // windows
+        self.bits, self.hashes, self.fp_rate = bloom_parameters(expected_items, fp_rate, max_bits)
+        if self.fp_rate > fp_rate * 1.01:
+            logger.warning(
+                f"Log dedup memory budget too small: false-positive rate "
+                f"{self.fp_rate:.4%} instead of {fp_rate:.4%}"
+            )
+
+    def _keys(self, now: Optional[float] = None) -> List[str]:
+        """当前窗口在前，依次为历史窗口"""
+        current = int((time.time() if now is None else now) // self.window_seconds)
+        return [f"{self.key_prefix}{current - i}" for i in range(self.windows)]
+
+    def _offsets(self, item: str) -> List[int]:
+        """双重哈希计算k个位偏移"""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _scoped(self, log_id: str, vin: Optional[str], log_type: Optional[str]) -> str:
+        """id仅在车辆、日志类型内唯一"""
+        return f"{vin or ''}:{log_type or ''}:{log_id}"
+
+    def check(
+        self,
+        ids: Sequence[str],
+        vin: Optional[str] = None,
+        log_type: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> List[int]:
+        """
+        检查一批日志id（只读，不记录）
+
+        同一批内的重复id也会被识别（第一次出现的不算重复）。
+        Redis不可用时不做去重，只识别批内重复。
+
+        Args:
+            ids: 车辆生成的日志id
+            vin: 车辆VIN（id仅在车辆内唯一）
+            log_type: 日志类型
+            now: 当前时间戳，默认为time.time()
+
+        Returns:
+            重复记录的下标（升序）
+        """
+        if not ids:
+            return []
+
+        first = {}
+        duplicates = set()
+        for index, log_id in enumerate(ids):
+            if log_id in first:
+                duplicates.add(index)
+            else:
+                first[log_id] = index
+
+        args: List[int] = [self.hashes]
+        for log_id in first:
+            args.extend(self._offsets(self._scoped(log_id, vin, log_type)))
+
+        try:
+            client = database.get_redis_client()
+            if client is None:
+                return sorted(duplicates)
+            found = scripts.call("bloom_check", keys=self._keys(now), args=args, client=client)
+        except (database.BackendUnavailableError, redis.RedisError) as e:
+            logger.warning(f"Log dedup unavailable, accepting all {len(first)} records: {e}")
+            return sorted(duplicates)
+
+        indexes = list(first.values())
+        duplicates.update(indexes[int(i)] for i in found)
+        return sorted(duplicates)
+
+    def commit(
+        self,
+        ids: Sequence[str],
+        vin: Optional[str] = None,
+        log_type: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> bool:
+        """
+        记录已成功写入的日志id
+
+        在日志写入ClickHouse成功后调用；写入失败时不调用，车辆重传的日志不会被判为重复。
+        Redis不可用时只记录警告（之后的重传不会被去重）。
+
+        Args:
+            ids: 已写入的日志id
+            vin: 车辆VIN
+            log_type: 日志类型
+            now: 当前时间戳，默认为time.time()
+
+        Returns:
+            是否已记录
+        """
+        if not ids:
+            return True
+
+        args: List[int] = [self.window_seconds * self.windows]
+        for log_id in ids:
+            args.extend(self._offsets(self._scoped(log_id, vin, log_type)))
+
+        try:
+            client = database.get_redis_client()
+            if client is None:
+                return False
+            scripts.call("bloom_add", keys=self._keys(now)[:1], args=args, client=client)
+        except (database.BackendUnavailableError, redis.RedisError) as e:
+            logger.warning(f"Failed to record {len(ids)} log ids for dedup: {e}")
+            return False
+        return True
+
+
+# 进程级去重器
+log_deduplicator = LogDeduplicator(
+    window_seconds=config.LOG_DEDUP_WINDOW_SECONDS,
+    windows=config.LOG_DEDUP_WINDOWS,
+    expected_items=config.LOG_DEDUP_EXPECTED_ITEMS,
+    fp_rate=config.LOG_DEDUP_FP_RATE,
+    memory_budget=config.LOG_DEDUP_MEMORY_BUDGET_MB * 1024 * 1024,
+)
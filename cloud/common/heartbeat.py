@@ -0,0 +1,337 @@
+"""
+心跳写入合并
+
+车辆心跳（cmd=30）不再逐条UPDATE vehicles，而是：
+- 每个VIN的最新心跳（时间戳、IP）写入Redis哈希 heartbeat:latest，并把VIN加入脏集合
+- 后台线程定期取出脏VIN，以一条 UPDATE ... CASE 批量写入MySQL
+- 读取在线状态时合并Redis与MySQL中较新的心跳
+
+脏集合用SPOP取出，多进程同时刷新不会重复写入；写入失败的VIN放回脏集合。
+
+用法:
+    from common.heartbeat import record_heartbeat, merge_heartbeats
+
+    record_heartbeat(vin, request.remote_addr)
+    vehicles = merge_heartbeats([vehicle.to_dict() for vehicle in rows])
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis
+from sqlalchemy import text
+
+from . import database
+from .config import config
+from .redis_scripts import scripts
+
+logger = logging.getLogger(__name__)
+
+LATEST_KEY = "heartbeat:latest"
+DIRTY_KEY = "heartbeat:dirty"
+
+# 仅当时间戳更新时写入最新心跳并标记为脏，返回是否写入
+# KEYS[1]=最新心跳哈希  KEYS[2]=脏集合  ARGV[1]=VIN  ARGV[2]=时间戳  ARGV[3]=IP
+RECORD_HEARTBEAT_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if current then
+    local ts = tonumber(string.match(current, '^[^|]+'))
+    if ts and ts >= tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. '|' .. ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[1])
+return 1
+"""
+
+scripts.register("record_heartbeat", RECORD_HEARTBEAT_SCRIPT)
+
+Heartbeat = Tuple[datetime, Optional[str]]
+
+
+def _encode(timestamp: float, ip: Optional[str]) -> Tuple[str, str]:
+    return f"{timestamp:.3f}", ip or ""
+
+
+def _decode(raw: Optional[str]) -> Optional[Heartbeat]:
+    """解析 "<时间戳>|<IP>"，格式错误返回None"""
+    if not raw:
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    timestamp, _, ip = raw.partition("|")
+    try:
+        return datetime.fromtimestamp(float(timestamp)), ip or None
+    except ValueError:
+        return None
+
+
+def _write_mysql(heartbeats: List[Tuple[str, datetime, Optional[str]]]):
+    """
+    以一条UPDATE批量写入心跳
+
+    Args:
+        heartbeats: (vin, 心跳时间, IP) 列表
+    """
+    params: Dict[str, Any] = {}
+    time_cases = []
+    ip_cases = []
+    vins = []
+    for i, (vin, heartbeat_at, ip) in enumerate(heartbeats):
+        params[f"v{i}"] = vin
+        params[f"t{i}"] = heartbeat_at
+        params[f"i{i}"] = ip
+        time_cases.append(f"WHEN :v{i} THEN :t{i}")
+        ip_cases.append(f"WHEN :v{i} THEN :i{i}")
+        vins.append(f":v{i}")
+
+    sql = (
+        "UPDATE vehicles SET "
+        f"last_heartbeat_at = CASE vin {' '.join(time_cases)} ELSE last_heartbeat_at END, "
+        f"last_ip = CASE vin {' '.join(ip_cases)} ELSE last_ip END "
+        f"WHERE vin IN ({', '.join(vins)})"
+    )
+    with database.get_engine().begin() as conn:
+        conn.execute(text(sql), params)
+
+
+class HeartbeatAggregator:
+    """
+    心跳聚合器
+
+    后台线程每隔flush_interval秒把Redis中的脏心跳批量写入MySQL。
+    """
+
+    def __init__(self, flush_interval: float = 10, batch_size: int = 1000):
+        """
+        初始化聚合器
+
+        Args:
+            flush_interval: 刷新间隔（秒），即MySQL中心跳时间的最大延迟
+            batch_size: 单条UPDATE包含的最大VIN数
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {"recorded": 0, "flushed": 0, "batches": 0, "flush_errors": 0}
+
+    def start(self):
+        """启动后台刷新线程（幂等）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="heartbeat-flusher", daemon=True)
+        self._thread.start()
+
+    def record(self, vin: str, ip: Optional[str] = None, timestamp: Optional[float] = None) -> bool:
+        """
+        记录心跳
+
+        Redis不可用时直接写入MySQL。
+
+        Args:
+            vin: 车辆VIN
+            ip: 连接IP
+            timestamp: 心跳时间戳，默认为当前时间
+
+        Returns:
+            是否为更新的心跳（早于已记录心跳的乱序请求返回False）
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        encoded_ts, encoded_ip = _encode(timestamp, ip)
+
+        try:
+            client = database.get_redis_client()
+        except database.BackendUnavailableError:
+            client = None
+
+        if client is not None:
+            try:
+                written = scripts.call(
+                    "record_heartbeat",
+                    keys=[LATEST_KEY, DIRTY_KEY],
+                    args=[vin, encoded_ts, encoded_ip],
+                    client=client,
+                )
+                self.stats["recorded"] += 1
+                return bool(written)
+            except redis.RedisError as e:
+                logger.warning(f"Heartbeat record failed, writing to MySQL directly: {e}")
+
+        _write_mysql([(vin, datetime.fromtimestamp(timestamp), ip)])
+        return True
+
+    def flush(self) -> int:
+        """
+        把脏心跳写入MySQL
+
+        Returns:
+            写入的VIN数
+        """
+        client = database.get_redis_client()
+        if client is None:
+            return 0
+
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                vins = client.spop(DIRTY_KEY, self.batch_size)
+                if not vins:
+                    break
+
+                heartbeats = []
+                for vin, raw in zip(vins, client.hmget(LATEST_KEY, vins), strict=True):
+                    heartbeat = _decode(raw)
+                    if heartbeat is not None:
+                        heartbeats.append((vin, heartbeat[0], heartbeat[1]))
+
+                try:
+                    if heartbeats:
+                        _write_mysql(heartbeats)
+                except Exception:
+                    self.stats["flush_errors"] += 1
+                    client.sadd(DIRTY_KEY, *vins)
+                    raise
+
+                flushed += len(heartbeats)
+                self.stats["flushed"] += len(heartbeats)
+                self.stats["batches"] += 1
+
+                if len(vins) < self.batch_size:
+                    break
+
+        return flushed
+
+    def _run(self):
+        """后台刷新线程"""
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Heartbeat flush failed, will retry: {e}")
+
+    def close(self):
+        """停止后台线程并刷新剩余心跳"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Final heartbeat flush failed: {e}")
+
+
+# 进程级聚合器
+aggregator = HeartbeatAggregator(
+    flush_interval=config.HEARTBEAT_FLUSH_INTERVAL,
+    batch_size=config.HEARTBEAT_FLUSH_BATCH_SIZE,
+)
+
+
+def init_heartbeat_aggregator() -> HeartbeatAggregator:
+    """启动心跳聚合器（幂等），close_db时刷新剩余心跳"""
+    aggregator.start()
+    return aggregator
+
+
+def close_heartbeat_aggregator():
+    """停止心跳聚合器并刷新剩余心跳"""
+    aggregator.close()
+
+
+def record_heartbeat(vin: str, ip: Optional[str] = None, timestamp: Optional[float] = None) -> bool:
+    """
+    记录心跳（见 HeartbeatAggregator.record）
+
+    Args:
+        vin: 车辆VIN
+        ip: 连接IP
+        timestamp: 心跳时间戳，默认为当前时间
+
+    Returns:
+        是否为更新的心跳
+    """
+    aggregator.start()
+    return aggregator.record(vin, ip, timestamp)
+
+
+def get_latest_heartbeats(vins: Iterable[str]) -> Dict[str, Heartbeat]:
+    """
+    查询Redis中的最新心跳（尚未写入MySQL的部分）
+
+    Args:
+        vins: VIN列表
+
+    Returns:
+        {vin: (心跳时间, IP)}，Redis中没有记录或Redis不可用的VIN不包含在内
+    """
+    vins = list(vins)
+    if not vins:
+        return {}
+
+    try:
+        client = database.get_redis_client()
+        if client is None:
+            return {}
+        values = client.hmget(LATEST_KEY, vins)
+    except (database.BackendUnavailableError, redis.RedisError) as e:
+        logger.warning(f"Heartbeat lookup failed, using MySQL values: {e}")
+        return {}
+
+    result = {}
+    for vin, raw in zip(vins, values, strict=True):
+        heartbeat = _decode(raw)
+        if heartbeat is not None:
+            result[vin] = heartbeat
+    return result
+
+
+def merge_heartbeats(vehicles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    用Redis中较新的心跳覆盖车辆字典的last_heartbeat_at和last_ip，并计算online
+
+    Args:
+        vehicles: 车辆字典列表（需包含vin和last_heartbeat_at）
+
+    Returns:
+        原列表（原地修改）
+    """
+    latest = get_latest_heartbeats(vehicle["vin"] for vehicle in vehicles)
+    for vehicle in vehicles:
+        heartbeat = latest.get(vehicle["vin"])
+        current = vehicle.get("last_heartbeat_at")
+        if isinstance(current, str):
+            current = datetime.fromisoformat(current)
+        if heartbeat is not None and (current is None or heartbeat[0] > current):
+            current = heartbeat[0]
+            vehicle["last_heartbeat_at"] = heartbeat[0]
+            vehicle["last_ip"] = heartbeat[1]
+        vehicle["online"] = is_online(current)
+    return vehicles
+
+
+def is_online(last_heartbeat_at: Optional[datetime], timeout: Optional[int] = None) -> bool:
+    """
+    判断车辆是否在线
+
+    Args:
+        last_heartbeat_at: 最后心跳时间
+        timeout: 在线判定超时（秒），默认使用HEARTBEAT_ONLINE_TIMEOUT
+
+    Returns:
+        最后心跳是否在超时时间内
+    """
+    if last_heartbeat_at is None:
+        return False
+    timeout = config.HEARTBEAT_ONLINE_TIMEOUT if timeout is None else timeout
+    return datetime.now() - last_heartbeat_at <= timedelta(seconds=timeout)
@@ -0,0 +1,145 @@
+"""
+日志查询总数
+
+列表页的总数不必每次精确计算：
+- estimate：无过滤条件时取 system.parts 的行数之和；有过滤条件时用
+  EXPLAIN ESTIMATE 按主键索引裁剪后的行数（粒度级上界，不扫描数据）
+- exact：count() 精确计数，按 表+过滤条件+参数 缓存一小段时间（查询缓存，多进程共享，
+  并发请求只计算一次）
+- auto：有缓存的精确值时返回精确值，否则返回估算值
+
+日志表没有定义 SAMPLE BY，无法使用 SAMPLE 采样计数，因此估算基于主键索引。
+
+用法:
+    from common.log_count import count_logs
+    from common.utils.response import paginate_response
+
+    total, approximate = count_logs("network_ids_logs", "vin = %(vin)s", {"vin": vin})
+    return paginate_response(items, total, page, page_size, approximate=approximate)
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from clickhouse_driver import errors
+
+from . import database
+from .cache import query_cache
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# 精确计数的缓存命名空间
+TABLE_LOG_COUNTS = "log_counts"
+
+COUNT_MODES = ("auto", "estimate", "exact")
+
+
+def _cache_key(table: str, where: str, params: Optional[Dict[str, Any]]) -> str:
+    raw = json.dumps([table, where, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _has_filter(where: Optional[str]) -> bool:
+    return bool(where) and where.strip() != "1"
+
+
+def exact_count(table: str, where: str = "1", params: Optional[Dict[str, Any]] = None) -> int:
+    """
+    精确计数（带缓存）
+
+    Args:
+        table: 表名
+        where: WHERE条件
+        params: 查询参数
+
+    Returns:
+        记录数
+    """
+
+    def load() -> int:
+        with database.get_clickhouse() as client:
+            rows = client.execute(
+                f"SELECT count() FROM {config.CLICKHOUSE_DATABASE}.{table} WHERE {where or '1'}",
+                params or {},
+            )
+        return int(rows[0][0])
+
+    return query_cache.get_or_load(
+        TABLE_LOG_COUNTS, _cache_key(table, where, params), load, ttl=config.LOG_COUNT_CACHE_TTL
+    )
+
+
+def estimate_count(table: str, where: str = "1", params: Optional[Dict[str, Any]] = None) -> int:
+    """
+    估算记录数
+
+    Args:
+        table: 表名
+        where: WHERE条件
+        params: 查询参数
+
+    Returns:
+        估算的记录数（有过滤条件时为按索引粒度的上界）
+    """
+    with database.get_clickhouse() as client:
+        if not _has_filter(where):
+            rows = client.execute(
+                "SELECT sum(rows) FROM system.parts "
+                "WHERE database = %(database)s AND table = %(table)s AND active",
+                {"database": config.CLICKHOUSE_DATABASE, "table": table},
+            )
+            return int(rows[0][0] or 0)
+
+        rows = client.execute(
+            f"EXPLAIN ESTIMATE SELECT 1 FROM {config.CLICKHOUSE_DATABASE}.{table} WHERE {where}",
+            params or {},
+            with_column_types=True,
+        )
+    data, columns = rows
+    index = [name for name, _ in columns].index("rows")
+    return sum(int(row[index]) for row in data)
+
+
+def count_logs(
+    table: str,
+    where: str = "1",
+    params: Optional[Dict[str, Any]] = None,
+    mode: str = "auto",
+) -> Tuple[int, bool]:
+    """
+    查询日志总数
+
+    Args:
+        table: 表名
+        where: WHERE条件
+        params: 查询参数
+        mode: auto、estimate 或 exact
+
+    Returns:
+        (总数, 是否为估算值)
+
+    Raises:
+        ValueError: 未知的计数模式
+        BackendUnavailableError: ClickHouse不可用
+    """
+    if mode not in COUNT_MODES:
+        raise ValueError(f"Unknown count mode: {mode}")
+
+    if mode == "exact":
+        return exact_count(table, where, params), False
+
+    if mode == "auto":
+        cached = query_cache.get(TABLE_LOG_COUNTS, _cache_key(table, where, params))
+        if cached is not None:
+            return int(cached), False
+
+    try:
+        return estimate_count(table, where, params), True
+    except errors.ServerException as e:
+        # 旧版本ClickHouse不支持EXPLAIN ESTIMATE时退回精确计数；
+        # 连接错误直接抛出，不在故障期间发起代价更高的count()
+        logger.warning(f"Count estimate for {table} failed, using exact count: {e}")
+        return exact_count(table, where, params), False
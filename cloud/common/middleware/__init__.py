@@ -2,14 +2,41 @@
 中间件模块初始化
 """
 
-from .auth import auth_required, verify_token, create_access_token
+from .auth import (
+    auth_required,
+    verify_token,
+    verify_tokens,
+    create_access_token,
+    get_token_cache_stats,
+    revoke_token,
+    revoke_subject_tokens,
+)
+from .auth_async import (
+    async_auth_required,
+    async_optional_auth,
+    verify_token_async,
+    revoke_token_async,
+    revoke_subject_tokens_async,
+)
+from .revocation import init_revocation, get_revocation_stats
 from .logging import request_logger
 from .error_handler import register_error_handlers
 
 __all__ = [
     "auth_required",
     "verify_token",
+    "verify_tokens",
     "create_access_token",
+    "get_token_cache_stats",
+    "revoke_token",
+    "revoke_subject_tokens",
+    "async_auth_required",
+    "async_optional_auth",
+    "verify_token_async",
+    "revoke_token_async",
+    "revoke_subject_tokens_async",
+    "init_revocation",
+    "get_revocation_stats",
     "request_logger",
     "register_error_handlers",
 ]
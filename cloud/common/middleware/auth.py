@@ -4,13 +4,25 @@ JWT认证中间件
 
 import jwt
 import time
+import uuid
+import threading
+from collections import OrderedDict
 from functools import wraps
 from flask import request, jsonify
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 
 from ..config import config
 from ..utils.response import error_response
-from ..database import redis_client
+from ..utils.crypto import hash_sha256
+from .jwt_keys import ASYMMETRIC_ALGORITHMS, KeyNotFoundError, key_set
+from .revocation import (
+    are_revoked,
+    is_revoked,
+    publish_revocation,
+    publish_subject_revocation,
+    revocation_id,
+    token_revocation_id,
+)
 
 
 class TokenError(Exception):
@@ -31,6 +43,162 @@ class TokenInvalidError(TokenError):
     pass
 
 
+class TokenCache:
+    """
+    已验证Token的进程内缓存（LRU + TTL）
+
+    以Token的SHA256摘要为键缓存解码后的payload，避免重复的
+    jwt.decode。条目有效期取ttl与Token的exp中较早者。
+    命中缓存后仍会进行撤销检查（见revocation模块）。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: int = 30):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最大缓存条目数，超出后淘汰最久未使用的条目
+            ttl: 条目最长缓存时间（秒），即撤销生效的最大延迟
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存
+
+        Args:
+            token: JWT token字符串
+
+        Returns:
+            缓存的payload副本，未命中或已过期返回None
+        """
+        key = hash_sha256(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, payload = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(payload)
+
+    def set(self, token: str, payload: Dict[str, Any]):
+        """
+        写入缓存
+
+        Args:
+            token: JWT token字符串
+            payload: 已验证的payload
+        """
+        expires_at = time.time() + self.ttl
+        exp = payload.get("exp")
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+
+        key = hash_sha256(token)
+        with self._lock:
+            self._entries[key] = (expires_at, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """
+        移除指定Token的缓存条目
+
+        Args:
+            token: JWT token字符串
+        """
+        with self._lock:
+            self._entries.pop(hash_sha256(token), None)
+
+    def clear(self):
+        """清空缓存和统计计数"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            包含size, max_size, ttl, hits, misses, hit_rate的字典
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# 进程级验证缓存
+token_cache = TokenCache(max_size=config.JWT_CACHE_MAX_SIZE, ttl=config.JWT_CACHE_TTL)
+
+
+def get_token_cache_stats() -> Dict[str, Any]:
+    """
+    获取验证缓存统计信息
+
+    Returns:
+        缓存统计字典，附带enabled标记
+    """
+    stats = token_cache.stats()
+    stats["enabled"] = config.JWT_CACHE_ENABLED
+    return stats
+
+
+def _decode_token(token: str, verify_exp: bool = True) -> Dict[str, Any]:
+    """
+    解码并验证JWT签名
+
+    Token头部带kid时按kid选择公钥及其算法；否则使用JWT_SECRET_KEY（HMAC）。
+    使用非对称算法时，无kid的Token只在JWT_LEGACY_HS256_UNTIL之前按HS256验证，
+    从HS256切换算法时已签发的Token不会同时失效。
+
+    Raises:
+        jwt.InvalidTokenError: Token无效
+    """
+    header = jwt.get_unverified_header(token)
+    kid = header.get("kid")
+
+    if kid:
+        try:
+            algorithm, key = key_set.verification_key(kid)
+        except KeyNotFoundError as e:
+            raise jwt.InvalidTokenError(str(e))
+    elif config.JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS:
+        if time.time() >= config.JWT_LEGACY_HS256_UNTIL:
+            raise jwt.InvalidTokenError("Missing key id")
+        algorithm, key = "HS256", config.JWT_SECRET_KEY
+    else:
+        algorithm, key = config.JWT_ALGORITHM, config.JWT_SECRET_KEY
+
+    return jwt.decode(
+        token, key, algorithms=[algorithm], options={"verify_exp": verify_exp}
+    )
+
+
 def create_access_token(
     data: Dict[str, Any], expires_delta: Optional[int] = None
 ) -> str:
@@ -49,13 +217,90 @@ def create_access_token(
     if expires_delta is None:
         expires_delta = config.JWT_ACCESS_TOKEN_EXPIRES
 
-    expire = int(time.time()) + expires_delta
-    to_encode.update({"exp": expire, "iat": int(time.time())})
+    now = int(time.time())
+    to_encode.update({"exp": now + expires_delta, "iat": now})
+    # 唯一ID，用于撤销单个Token
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+
+    if config.JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS:
+        kid, algorithm, key = key_set.signing_key()
+        return jwt.encode(to_encode, key, algorithm=algorithm, headers={"kid": kid})
 
     token = jwt.encode(to_encode, config.JWT_SECRET_KEY, algorithm=config.JWT_ALGORITHM)
     return token
 
 
+def _load_payload(token: str) -> Dict[str, Any]:
+    """
+    从验证缓存获取payload，未命中时解码验证并写入缓存（不含撤销检查）
+
+    Raises:
+        TokenExpiredError: Token已过期
+        TokenInvalidError: Token无效
+    """
+    payload = token_cache.get(token) if config.JWT_CACHE_ENABLED else None
+    if payload is not None:
+        return payload
+    return _verify_payload(token)
+
+
+def _verify_payload(token: str) -> Dict[str, Any]:
+    """
+    解码验证并写入验证缓存（不查询缓存，不含撤销检查）
+
+    Raises:
+        TokenExpiredError: Token已过期
+        TokenInvalidError: Token无效
+    """
+    try:
+        payload = _decode_token(token)
+    except jwt.ExpiredSignatureError:
+        raise TokenExpiredError("Token has expired")
+    except jwt.InvalidTokenError as e:
+        raise TokenInvalidError(f"Invalid token: {str(e)}")
+
+    if config.JWT_CACHE_ENABLED:
+        token_cache.set(token, payload)
+    return payload
+
+
+def _revocation_target(token: str, expires_in: Optional[int] = None) -> Tuple[str, int]:
+    """
+    计算撤销标识和撤销记录保留时间
+
+    Returns:
+        (撤销标识, 保留时间秒数)
+    """
+    try:
+        payload = _decode_token(token, verify_exp=False)
+        rid = token_revocation_id(payload, token)
+        if expires_in is None:
+            expires_in = max(0, payload.get("exp", 0) - int(time.time()))
+    except Exception:
+        rid = revocation_id(token)
+        if expires_in is None:
+            expires_in = config.JWT_ACCESS_TOKEN_EXPIRES
+    return rid, expires_in
+
+
+def parse_bearer_token(auth_header: Optional[str]) -> Optional[str]:
+    """
+    从Authorization请求头解析Bearer token
+
+    Args:
+        auth_header: Authorization请求头
+
+    Returns:
+        token字符串，格式不正确时返回None
+    """
+    if not auth_header:
+        return None
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return None
+    return parts[1]
+
+
 def verify_token(token: str) -> Dict[str, Any]:
     """
     验证JWT令牌
@@ -70,47 +315,115 @@ def verify_token(token: str) -> Dict[str, Any]:
         TokenExpiredError: Token已过期
         TokenInvalidError: Token无效
     """
-    try:
-        # 检查Token是否在黑名单中（已撤销）
-        if redis_client and redis_client.exists(f"token:blacklist:{token}"):
-            raise TokenInvalidError("Token has been revoked")
+    payload = _load_payload(token)
 
-        payload = jwt.decode(
-            token, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM]
-        )
-        return payload
+    # 检查Token是否已撤销（本地集合，无网络请求）
+    if is_revoked(payload, token):
+        raise TokenInvalidError("Token has been revoked")
 
-    except jwt.ExpiredSignatureError:
-        raise TokenExpiredError("Token has expired")
-    except jwt.InvalidTokenError as e:
-        raise TokenInvalidError(f"Invalid token: {str(e)}")
+    return payload
+
+
+def verify_tokens(
+    tokens: List[str],
+) -> List[Tuple[Optional[Dict[str, Any]], Optional[TokenError]]]:
+    """
+    批量验证JWT令牌
+
+    先逐个解码（命中缓存的跳过解码），再将所有撤销检查合并为一次查询，
+    网关批量鉴权N个请求只需一次Redis往返（撤销集合就绪时无网络请求）。
+    批次中重复的Token只验证一次。
+
+    Args:
+        tokens: JWT token字符串列表
+
+    Returns:
+        与tokens一一对应的 (payload, error) 列表，
+        验证成功时error为None，失败时payload为None
+    """
+    decoded: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[TokenError]]] = {}
+
+    for token in tokens:
+        if token in decoded:
+            continue
+        try:
+            decoded[token] = (_load_payload(token), None)
+        except TokenError as e:
+            decoded[token] = (None, e)
+
+    valid = [token for token, (payload, _) in decoded.items() if payload is not None]
+    revoked = are_revoked([(decoded[token][0], token) for token in valid])
+    for token, is_token_revoked in zip(valid, revoked, strict=True):
+        if is_token_revoked:
+            decoded[token] = (None, TokenInvalidError("Token has been revoked"))
+
+    return [decoded[token] for token in tokens]
 
 
 def revoke_token(token: str, expires_in: int = None):
     """
-    撤销Token（加入黑名单）
+    撤销Token（按jti加入黑名单并广播给所有进程）
 
     Args:
         token: 要撤销的token
         expires_in: 黑名单过期时间（秒），默认使用token的剩余有效时间
     """
-    if not redis_client:
-        return
+    token_cache.invalidate(token)
+    rid, expires_in = _revocation_target(token, expires_in)
+    publish_revocation(rid, expires_in)
 
-    if expires_in is None:
-        try:
-            payload = jwt.decode(
-                token,
-                config.JWT_SECRET_KEY,
-                algorithms=[config.JWT_ALGORITHM],
-                options={"verify_exp": False},
-            )
-            exp = payload.get("exp", 0)
-            expires_in = max(0, exp - int(time.time()))
-        except Exception:
-            expires_in = config.JWT_ACCESS_TOKEN_EXPIRES
 
-    redis_client.setex(f"token:blacklist:{token}", expires_in, "1")
+def _subject_revocations(
+    vin: Optional[str], device_fingerprint: Optional[str], not_before: Optional[int]
+) -> List[Tuple[str, str, int, int]]:
+    """
+    生成主体撤销参数列表
+
+    Returns:
+        (字段名, 字段值, not-before, 保留时间) 列表
+
+    Raises:
+        ValueError: vin和device_fingerprint均未提供
+    """
+    if not vin and not device_fingerprint:
+        raise ValueError("vin or device_fingerprint is required")
+
+    if not_before is None:
+        not_before = int(time.time())
+
+    # 保留时间覆盖最长的Token有效期
+    expires_in = max(config.JWT_ACCESS_TOKEN_EXPIRES, config.JWT_REFRESH_TOKEN_EXPIRES)
+
+    subjects = []
+    if vin:
+        subjects.append(("vin", vin, not_before, expires_in))
+    if device_fingerprint:
+        subjects.append(("device_fingerprint", device_fingerprint, not_before, expires_in))
+    return subjects
+
+
+def revoke_subject_tokens(
+    vin: Optional[str] = None,
+    device_fingerprint: Optional[str] = None,
+    not_before: Optional[int] = None,
+):
+    """
+    撤销车辆或设备的所有Token
+
+    写入主体的not-before时间戳，签发时间不晚于该时间戳的Token全部失效，
+    无论已签发多少Token都只占用一个Redis键。iat精度为秒，与撤销同一秒
+    签发的Token同样失效，撤销后重新签发的Token需晚于not-before。
+
+    Args:
+        vin: 车辆VIN
+        device_fingerprint: 设备指纹
+        not_before: not-before时间戳，默认为当前时间
+
+    Raises:
+        ValueError: vin和device_fingerprint均未提供
+    """
+    for claim, value, nbf, ttl in _subject_revocations(vin, device_fingerprint, not_before):
+        publish_subject_revocation(claim, value, nbf, ttl)
 
 
 def auth_required(f):
@@ -135,12 +448,10 @@ def auth_required(f):
             return error_response(code=401, message="Missing authorization header"), 401
 
         # 解析Bearer token
-        parts = auth_header.split()
-        if len(parts) != 2 or parts[0].lower() != "bearer":
+        token = parse_bearer_token(auth_header)
+        if token is None:
             return error_response(code=401, message="Invalid authorization header"), 401
 
-        token = parts[1]
-
         try:
             # 验证token
             payload = verify_token(token)
@@ -182,19 +493,16 @@ def optional_auth(f):
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get("Authorization")
-
-        if auth_header:
-            parts = auth_header.split()
-            if len(parts) == 2 and parts[0].lower() == "bearer":
-                token = parts[1]
-                try:
-                    payload = verify_token(token)
-                    request.token_payload = payload
-                    request.vin = payload.get("vin")
-                    request.device_fingerprint = payload.get("device_fingerprint")
-                except (TokenExpiredError, TokenInvalidError):
-                    pass  # 忽略错误，继续执行
+        token = parse_bearer_token(request.headers.get("Authorization"))
+
+        if token:
+            try:
+                payload = verify_token(token)
+                request.token_payload = payload
+                request.vin = payload.get("vin")
+                request.device_fingerprint = payload.get("device_fingerprint")
+            except (TokenExpiredError, TokenInvalidError):
+                pass  # 忽略错误，继续执行
 
         return f(*args, **kwargs)
 
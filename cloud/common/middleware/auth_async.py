@@ -0,0 +1,157 @@
+"""
+JWT认证中间件（asyncio版本）
+
+用于Flask异步视图，撤销检查的回退查询和撤销写入使用redis.asyncio客户端
+（需先调用 database.init_redis_async()），不会阻塞事件循环。
+解码验证、验证缓存、本地撤销集合与同步版本共用；未命中验证缓存时的签名验证
+（可能重新扫描密钥目录）在线程池中执行。
+
+redis.asyncio的连接绑定创建时的事件循环，适合在单事件循环的ASGI部署
+（如 asgiref WsgiToAsgi + uvicorn）中使用，应在该事件循环内初始化客户端。
+"""
+
+import asyncio
+from functools import wraps
+from flask import request
+from typing import Optional, Dict, Any
+
+from ..config import config
+from ..utils.response import error_response
+from .auth import (
+    TokenExpiredError,
+    TokenInvalidError,
+    _revocation_target,
+    _subject_revocations,
+    _verify_payload,
+    parse_bearer_token,
+    token_cache,
+)
+from .revocation import (
+    are_revoked_async,
+    publish_revocation_async,
+    publish_subject_revocation_async,
+)
+
+
+async def verify_token_async(token: str) -> Dict[str, Any]:
+    """
+    验证JWT令牌（asyncio版本）
+
+    Args:
+        token: JWT token字符串
+
+    Returns:
+        解码后的数据字典
+
+    Raises:
+        TokenExpiredError: Token已过期
+        TokenInvalidError: Token无效
+    """
+    # 缓存命中直接在事件循环中返回，未命中时只在线程池中解码，不重复查询缓存
+    payload = token_cache.get(token) if config.JWT_CACHE_ENABLED else None
+    if payload is None:
+        payload = await asyncio.to_thread(_verify_payload, token)
+
+    revoked = await are_revoked_async([(payload, token)])
+    if revoked[0]:
+        raise TokenInvalidError("Token has been revoked")
+
+    return payload
+
+
+async def revoke_token_async(token: str, expires_in: int = None):
+    """
+    撤销Token（asyncio版本）
+
+    Args:
+        token: 要撤销的token
+        expires_in: 黑名单过期时间（秒），默认使用token的剩余有效时间
+    """
+    token_cache.invalidate(token)
+    rid, expires_in = await asyncio.to_thread(_revocation_target, token, expires_in)
+    await publish_revocation_async(rid, expires_in)
+
+
+async def revoke_subject_tokens_async(
+    vin: Optional[str] = None,
+    device_fingerprint: Optional[str] = None,
+    not_before: Optional[int] = None,
+):
+    """
+    撤销车辆或设备的所有Token（asyncio版本）
+
+    Args:
+        vin: 车辆VIN
+        device_fingerprint: 设备指纹
+        not_before: not-before时间戳，默认为当前时间
+
+    Raises:
+        ValueError: vin和device_fingerprint均未提供
+    """
+    for claim, value, nbf, ttl in _subject_revocations(vin, device_fingerprint, not_before):
+        await publish_subject_revocation_async(claim, value, nbf, ttl)
+
+
+def async_auth_required(f):
+    """
+    认证装饰器（异步视图）
+
+    用法:
+        @app.route('/api/v1/vehicle/heartbeat', methods=['POST'])
+        @async_auth_required
+        async def heartbeat():
+            vin = request.vin
+            return {'message': 'success'}
+    """
+
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        auth_header = request.headers.get("Authorization")
+
+        if not auth_header:
+            return error_response(code=401, message="Missing authorization header"), 401
+
+        token = parse_bearer_token(auth_header)
+        if token is None:
+            return error_response(code=401, message="Invalid authorization header"), 401
+
+        try:
+            payload = await verify_token_async(token)
+        except TokenExpiredError:
+            return error_response(code=401, message="Token has expired"), 401
+        except TokenInvalidError as e:
+            return error_response(code=401, message=str(e)), 401
+        except Exception as e:
+            return error_response(code=500, message=f"Authentication error: {str(e)}"), 500
+
+        request.token_payload = payload
+        request.vin = payload.get("vin")
+        request.device_fingerprint = payload.get("device_fingerprint")
+
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+
+def async_optional_auth(f):
+    """
+    可选认证装饰器（异步视图）
+    如果提供了有效token则验证，否则继续执行
+    """
+
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        token = parse_bearer_token(request.headers.get("Authorization"))
+
+        if token:
+            try:
+                payload = await verify_token_async(token)
+                request.token_payload = payload
+                request.vin = payload.get("vin")
+                request.device_fingerprint = payload.get("device_fingerprint")
+            except (TokenExpiredError, TokenInvalidError):
+                pass  # 忽略错误，继续执行
+
+        return await f(*args, **kwargs)
+
+    return decorated_function
@@ -0,0 +1,257 @@
+"""
+JWT签名密钥管理
+
+支持ES256(ECDSA P-256)和EdDSA(Ed25519)非对称签名，密钥按kid存放在
+JWT_KEY_DIR目录下：
+- <kid>.pem      私钥（仅签发服务需要）
+- <kid>.pub.pem  公钥（验证服务只需要公钥）
+
+签发使用JWT_ACTIVE_KID对应的私钥，并在Token头部写入kid；验证时按kid
+选择公钥。轮换密钥时只需放入新密钥文件并切换JWT_ACTIVE_KID，旧kid的
+公钥保留到旧Token过期即可，无需重启服务。
+
+从HS256切换到非对称算法时，设置JWT_LEGACY_HS256_UNTIL为旧Token的最晚过期时间，
+过渡期内无kid的HS256 Token仍按JWT_SECRET_KEY验证。
+
+解析后的密钥对象按(路径, 修改时间)缓存，验证过程不会重复解析PEM。
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# 支持的非对称算法
+ASYMMETRIC_ALGORITHMS = ("ES256", "EdDSA")
+
+PRIVATE_KEY_SUFFIX = ".pem"
+PUBLIC_KEY_SUFFIX = ".pub.pem"
+
+
+class KeyNotFoundError(Exception):
+    """找不到kid对应的密钥"""
+
+    pass
+
+
+def key_algorithm(key: Any) -> str:
+    """
+    根据密钥类型确定JWT算法
+
+    Args:
+        key: cryptography密钥对象（公钥或私钥）
+
+    Returns:
+        JWT算法名称
+
+    Raises:
+        ValueError: 不支持的密钥类型
+    """
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        if not isinstance(key.curve, ec.SECP256R1):
+            raise ValueError(f"Unsupported EC curve: {key.curve.name}")
+        return "ES256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Unsupported key type: {type(key).__name__}")
+
+
+class KeySet:
+    """
+    本地缓存的JWT密钥集合
+
+    按reload_interval检查密钥目录变化并重新加载，未变化的文件直接复用
+    已解析的密钥对象。遇到未知kid时提前重新加载，但两次加载至少间隔
+    force_reload_cooldown，伪造kid的请求不会导致每次都扫描目录。
+    """
+
+    def __init__(self, key_dir: str, reload_interval: int = 60, force_reload_cooldown: float = 5.0):
+        """
+        初始化密钥集合
+
+        Args:
+            key_dir: 密钥目录
+            reload_interval: 检查目录变化的最小间隔（秒）
+            force_reload_cooldown: 未知kid触发重新加载的最小间隔（秒）
+        """
+        self.key_dir = Path(key_dir)
+        self.reload_interval = reload_interval
+        self.force_reload_cooldown = force_reload_cooldown
+        self._private_keys: Dict[str, Tuple[str, Any]] = {}
+        self._public_keys: Dict[str, Tuple[str, Any]] = {}
+        self._parsed: Dict[Tuple[str, float], Any] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _load_file(self, path: Path, private: bool) -> Any:
+        """加载PEM文件，按(路径, 修改时间)缓存解析结果"""
+        cache_key = (str(path), path.stat().st_mtime)
+        key = self._parsed.get(cache_key)
+        if key is None:
+            data = path.read_bytes()
+            if private:
+                key = serialization.load_pem_private_key(data, password=None)
+            else:
+                key = serialization.load_pem_public_key(data)
+            self._parsed[cache_key] = key
+        return key
+
+    def reload(self):
+        """重新扫描密钥目录"""
+        private_keys: Dict[str, Tuple[str, Any]] = {}
+        public_keys: Dict[str, Tuple[str, Any]] = {}
+        parsed: Dict[Tuple[str, float], Any] = {}
+
+        if self.key_dir.is_dir():
+            for path in sorted(self.key_dir.iterdir()):
+                name = path.name
+                try:
+                    if name.endswith(PUBLIC_KEY_SUFFIX):
+                        kid = name[: -len(PUBLIC_KEY_SUFFIX)]
+                        key = self._load_file(path, private=False)
+                        public_keys[kid] = (key_algorithm(key), key)
+                    elif name.endswith(PRIVATE_KEY_SUFFIX):
+                        kid = name[: -len(PRIVATE_KEY_SUFFIX)]
+                        key = self._load_file(path, private=True)
+                        private_keys[kid] = (key_algorithm(key), key)
+                        # 没有单独公钥文件时从私钥派生
+                        public_keys.setdefault(kid, (key_algorithm(key), key.public_key()))
+                    else:
+                        continue
+                    parsed[(str(path), path.stat().st_mtime)] = key
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Failed to load JWT key {path}: {e}")
+
+        self._private_keys = private_keys
+        self._public_keys = public_keys
+        self._parsed = parsed
+        self._last_check = time.time()
+
+    def _maybe_reload(self, force: bool = False):
+        """超过检查间隔时重新加载；force=True时间隔缩短为force_reload_cooldown"""
+        interval = self.force_reload_cooldown if force else self.reload_interval
+        if time.time() - self._last_check < interval:
+            return
+        with self._lock:
+            if time.time() - self._last_check >= interval:
+                self.reload()
+
+    def signing_key(self, kid: Optional[str] = None) -> Tuple[str, str, Any]:
+        """
+        获取签名私钥
+
+        Args:
+            kid: 密钥ID，默认使用JWT_ACTIVE_KID
+
+        Returns:
+            (kid, 算法, 私钥对象)
+
+        Raises:
+            KeyNotFoundError: 找不到私钥
+        """
+        kid = kid or config.JWT_ACTIVE_KID
+        self._maybe_reload()
+        entry = self._private_keys.get(kid)
+        if entry is None:
+            self._maybe_reload(force=True)
+            entry = self._private_keys.get(kid)
+        if entry is None:
+            raise KeyNotFoundError(f"Signing key not found: {kid}")
+        return kid, entry[0], entry[1]
+
+    def verification_key(self, kid: str) -> Tuple[str, Any]:
+        """
+        获取验证公钥
+
+        遇到未知kid时重新加载一次（受force_reload_cooldown限制），以便新密钥
+        无需等待检查间隔；冷却期内直接视为未知kid。
+
+        Args:
+            kid: 密钥ID
+
+        Returns:
+            (算法, 公钥对象)
+
+        Raises:
+            KeyNotFoundError: 找不到公钥
+        """
+        self._maybe_reload()
+        entry = self._public_keys.get(kid)
+        if entry is None:
+            self._maybe_reload(force=True)
+            entry = self._public_keys.get(kid)
+        if entry is None:
+            raise KeyNotFoundError(f"Verification key not found: {kid}")
+        return entry
+
+    def kids(self) -> Dict[str, str]:
+        """
+        获取已加载的公钥列表
+
+        Returns:
+            kid -> 算法 的字典
+        """
+        self._maybe_reload()
+        return {kid: alg for kid, (alg, _) in self._public_keys.items()}
+
+
+def generate_key_pair(key_dir: str, kid: str, algorithm: str = "ES256") -> Path:
+    """
+    生成密钥对并写入密钥目录
+
+    Args:
+        key_dir: 密钥目录
+        kid: 密钥ID
+        algorithm: ES256或EdDSA
+
+    Returns:
+        私钥文件路径
+
+    Raises:
+        ValueError: 不支持的算法
+    """
+    if algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    directory = Path(key_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    private_path = directory / f"{kid}{PRIVATE_KEY_SUFFIX}"
+    public_path = directory / f"{kid}{PUBLIC_KEY_SUFFIX}"
+
+    private_path.write_bytes(
+        private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+    )
+    os.chmod(private_path, 0o600)
+    public_path.write_bytes(
+        private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    return private_path
+
+
+# 进程级密钥集合
+key_set = KeySet(
+    config.JWT_KEY_DIR,
+    reload_interval=config.JWT_KEY_RELOAD_INTERVAL,
+    force_reload_cooldown=config.JWT_KEY_FORCE_RELOAD_COOLDOWN,
+)
@@ -0,0 +1,679 @@
+"""
+Token撤销管理
+
+撤销以两种形式保存：
+- 单个Token：按jti摘要（定长32字符）记录，键为 token:blacklist:<摘要>
+- 整个主体：按VIN或设备指纹记录"not-before"时间戳，键为 token:nbf:<类型>:<值>，
+  签发时间不晚于该时间戳的Token全部失效，撤销一辆车的所有Token只需一个键
+
+每个进程维护一份本地撤销集合：
+- 启动时从Redis全量加载
+- 撤销时通过Redis pub/sub广播，各进程实时更新本地集合
+- 订阅断开期间回退为直接查询Redis，重新订阅后重新全量加载
+
+旧版本按完整Token记录撤销（token:blacklist:<Token>），全量加载时自动改写为摘要键。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+import redis
+
+from .. import database
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# Redis键前缀与广播频道
+REVOKED_KEY_PREFIX = "token:blacklist:"
+NOT_BEFORE_KEY_PREFIX = "token:nbf:"
+REVOCATION_CHANNEL = "token:revocations"
+
+# 支持按主体撤销的payload字段
+SUBJECT_CLAIMS = ("vin", "device_fingerprint")
+
+# 撤销标识长度（16进制字符）
+REVOCATION_ID_LENGTH = 32
+
+
+def revocation_id(value: str) -> str:
+    """
+    计算撤销标识（BLAKE2b-128摘要，定长32字符）
+
+    Args:
+        value: Token的jti；旧Token没有jti时传入完整Token
+
+    Returns:
+        16进制摘要字符串
+    """
+    return hashlib.blake2b(value.encode(), digest_size=REVOCATION_ID_LENGTH // 2).hexdigest()
+
+
+def token_revocation_id(payload: Dict[str, Any], token: Optional[str] = None) -> Optional[str]:
+    """
+    获取Token的撤销标识
+
+    Args:
+        payload: 解码后的payload
+        token: 原始Token（payload中没有jti时使用）
+
+    Returns:
+        撤销标识，无法确定时返回None
+    """
+    jti = payload.get("jti")
+    if jti:
+        return revocation_id(str(jti))
+    if token:
+        return revocation_id(token)
+    return None
+
+
+def legacy_revocation_id(token: str) -> str:
+    """
+    旧版本撤销记录（按完整Token记录）对应的撤销标识
+
+    旧Token不会被重新签发，不校验签名和有效期，只读取jti。
+
+    Args:
+        token: 旧撤销键中的完整Token
+
+    Returns:
+        撤销标识
+    """
+    try:
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return revocation_id(token)
+    return token_revocation_id(payload, token)
+
+
+def migrate_legacy_revocations(client: redis.Redis, legacy: Dict[str, int]) -> int:
+    """
+    将旧版本的撤销键改写为摘要键
+
+    新键保留旧键的剩余时间，已存在时不覆盖；改写后删除旧键。
+
+    Args:
+        client: Redis客户端
+        legacy: {旧撤销键: 剩余时间秒数（-1表示不过期）}
+
+    Returns:
+        改写的键数量
+    """
+    if not legacy:
+        return 0
+    pipe = client.pipeline(transaction=False)
+    for key, ttl in legacy.items():
+        rid = legacy_revocation_id(key[len(REVOKED_KEY_PREFIX) :])
+        expires_in = ttl if ttl > 0 else config.JWT_REFRESH_TOKEN_EXPIRES
+        pipe.set(f"{REVOKED_KEY_PREFIX}{rid}", "1", ex=expires_in, nx=True)
+        pipe.delete(key)
+    pipe.execute()
+    logger.info(f"Migrated {len(legacy)} legacy token revocations")
+    return len(legacy)
+
+
+def subject_key(claim: str, value: str) -> str:
+    """
+    主体撤销的本地键
+
+    Args:
+        claim: payload字段名（vin或device_fingerprint）
+        value: 字段值
+
+    Returns:
+        形如 "vin:LSGBF53T1EW123456" 的键
+    """
+    return f"{claim}:{value}"
+
+
+def payload_subject_keys(payload: Dict[str, Any]) -> List[str]:
+    """
+    获取payload涉及的所有主体键
+
+    Args:
+        payload: 解码后的payload
+
+    Returns:
+        主体键列表
+    """
+    return [
+        subject_key(claim, str(payload[claim])) for claim in SUBJECT_CLAIMS if payload.get(claim)
+    ]
+
+
+class RevocationStore:
+    """
+    本地撤销集合
+
+    保存 撤销标识 -> 过期时间戳，以及 主体键 -> (not-before, 过期时间戳)，
+    过期条目惰性清理。
+    """
+
+    # 过期条目的清理间隔（秒）
+    PURGE_INTERVAL = 60
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._not_before: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[redis.Redis] = None
+        self._last_purge = time.time()
+        self.ready = False
+
+    @property
+    def started(self) -> bool:
+        """订阅线程是否已启动"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def add(self, rid: str, expires_at: float):
+        """
+        添加单个Token撤销条目
+
+        Args:
+            rid: 撤销标识
+            expires_at: 条目过期时间戳（Token本身的过期时间）
+        """
+        with self._lock:
+            self._revoked[rid] = max(expires_at, self._revoked.get(rid, 0))
+            self._maybe_purge()
+
+    def add_subject(self, key: str, not_before: int, expires_at: float):
+        """
+        添加主体撤销条目
+
+        Args:
+            key: 主体键
+            not_before: 签发时间不晚于此时间戳的Token失效
+            expires_at: 条目过期时间戳
+        """
+        with self._lock:
+            current = self._not_before.get(key)
+            if current is None or current[0] <= not_before:
+                self._not_before[key] = (not_before, expires_at)
+            self._maybe_purge()
+
+    def contains(self, rid: str) -> bool:
+        """
+        检查撤销标识是否在本地集合中
+
+        Args:
+            rid: 撤销标识
+
+        Returns:
+            是否已撤销
+        """
+        with self._lock:
+            expires_at = self._revoked.get(rid)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._revoked[rid]
+                return False
+            return True
+
+    def subject_not_before(self, key: str) -> Optional[int]:
+        """
+        获取主体的not-before时间戳
+
+        Args:
+            key: 主体键
+
+        Returns:
+            not-before时间戳，没有记录时返回None
+        """
+        with self._lock:
+            entry = self._not_before.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._not_before[key]
+                return None
+            return entry[0]
+
+    def is_payload_revoked(self, payload: Dict[str, Any], token: Optional[str] = None) -> bool:
+        """
+        根据本地集合判断payload是否已撤销
+
+        Args:
+            payload: 解码后的payload
+            token: 原始Token
+
+        Returns:
+            是否已撤销
+        """
+        rid = token_revocation_id(payload, token)
+        if rid and self.contains(rid):
+            return True
+
+        iat = payload.get("iat", 0)
+        for key in payload_subject_keys(payload):
+            not_before = self.subject_not_before(key)
+            if not_before is not None and iat <= not_before:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._revoked) + len(self._not_before)
+
+    def _maybe_purge(self):
+        """清理过期条目（调用方需持有锁）"""
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+        self._not_before = {k: v for k, v in self._not_before.items() if v[1] > now}
+
+    def load_from_redis(self, client: redis.Redis):
+        """
+        从Redis全量加载撤销集合
+
+        Args:
+            client: Redis客户端
+        """
+        now = time.time()
+
+        revoked = {}
+        legacy = {}
+        keys = list(client.scan_iter(match=f"{REVOKED_KEY_PREFIX}*", count=1000))
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute() if keys else []
+
+        for key, ttl in zip(keys, ttls, strict=True):
+            if isinstance(key, bytes):
+                key = key.decode()
+            if ttl is None or ttl == -2:
+                continue
+            rid = key[len(REVOKED_KEY_PREFIX) :]
+            if len(rid) != REVOCATION_ID_LENGTH:
+                # 旧版本按完整Token记录的撤销
+                legacy[key] = ttl
+                rid = legacy_revocation_id(rid)
+            revoked[rid] = now + ttl if ttl >= 0 else now + config.JWT_REFRESH_TOKEN_EXPIRES
+
+        not_before = {}
+        keys = list(client.scan_iter(match=f"{NOT_BEFORE_KEY_PREFIX}*", count=1000))
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+            pipe.ttl(key)
+        results = pipe.execute() if keys else []
+
+        for i, key in enumerate(keys):
+            if isinstance(key, bytes):
+                key = key.decode()
+            value, ttl = results[2 * i], results[2 * i + 1]
+            if value is None or ttl == -2:
+                continue
+            expires_at = now + ttl if ttl >= 0 else now + config.JWT_REFRESH_TOKEN_EXPIRES
+            not_before[key[len(NOT_BEFORE_KEY_PREFIX) :]] = (int(value), expires_at)
+
+        with self._lock:
+            self._revoked = revoked
+            self._not_before = not_before
+            self._last_purge = now
+
+        try:
+            migrate_legacy_revocations(client, legacy)
+        except redis.RedisError as e:
+            # 旧键仍在，下次全量加载时重试
+            logger.warning(f"Failed to migrate legacy token revocations: {e}")
+
+        logger.info(
+            f"Loaded {len(revoked)} revoked tokens and "
+            f"{len(not_before)} revoked subjects from Redis"
+        )
+
+    def handle_message(self, data: Any):
+        """
+        处理撤销广播消息
+
+        Args:
+            data: 消息内容，JSON格式：
+                {"id": 撤销标识, "exp": 过期时间戳} 或
+                {"subject": 主体键, "nbf": not-before, "exp": 过期时间戳}
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        try:
+            event = json.loads(data)
+            if "subject" in event:
+                self.add_subject(event["subject"], int(event["nbf"]), float(event["exp"]))
+            else:
+                self.add(event["id"], float(event["exp"]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Invalid revocation message: {data!r} ({e})")
+
+    def start(self, client: Optional[redis.Redis] = None) -> bool:
+        """
+        启动订阅线程（幂等）
+
+        Args:
+            client: Redis客户端，默认使用database.get_redis_client()
+
+        Returns:
+            是否已启动
+        """
+        with self._start_lock:
+            if self.started:
+                return True
+
+            if client is None:
+                try:
+                    client = database.get_redis_client()
+                except database.BackendUnavailableError:
+                    return False
+            if client is None:
+                return False
+
+            self._client = client
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._listen, name="token-revocation-listener", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """停止订阅线程"""
+        self._stop_event.set()
+        self.ready = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _listen(self):
+        """订阅线程主循环：断线后自动重连并重新全量加载"""
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self._client.pubsub()
+                pubsub.subscribe(REVOCATION_CHANNEL)
+
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        # 先订阅再加载，避免遗漏加载期间的撤销事件
+                        self.load_from_redis(self._client)
+                        self.ready = True
+                    elif message["type"] == "message":
+                        self.handle_message(message["data"])
+
+            except redis.RedisError as e:
+                self.ready = False
+                logger.warning(f"Revocation subscription lost: {e}")
+                self._stop_event.wait(config.JWT_REVOCATION_RETRY_INTERVAL)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+
+
+# 进程级撤销集合
+revocation_store = RevocationStore()
+
+
+def init_revocation(client: Optional[redis.Redis] = None) -> bool:
+    """
+    初始化撤销订阅
+
+    通常无需显式调用：首次检查撤销状态时会自动启动。
+
+    Args:
+        client: Redis客户端，默认使用database.get_redis_client()
+
+    Returns:
+        是否已启动
+    """
+    return revocation_store.start(client)
+
+
+def is_revoked(payload: Dict[str, Any], token: Optional[str] = None) -> bool:
+    """
+    检查Token是否已撤销
+
+    本地集合就绪时不产生网络请求；否则回退为一次MGET直接查询Redis。
+
+    Args:
+        payload: 解码后的payload
+        token: 原始Token（payload中没有jti时使用）
+
+    Returns:
+        是否已撤销
+    """
+    return are_revoked([(payload, token)])[0]
+
+
+def _check_local(
+    items: List[Tuple[Dict[str, Any], Optional[str]]], start: bool = True
+) -> List[bool]:
+    """按本地集合检查，start=True时订阅线程未启动则顺便启动"""
+    if start and not revocation_store.started:
+        revocation_store.start()
+    return [revocation_store.is_payload_revoked(payload, token) for payload, token in items]
+
+
+def _lookup_keys(
+    items: List[Tuple[Dict[str, Any], Optional[str]]], results: List[bool]
+) -> Tuple[List[str], List[Tuple[int, int, int, int, int]]]:
+    """收集未命中本地集合的Token需要在Redis中查询的键"""
+    keys: List[str] = []
+    pending = []
+    for i, (payload, token) in enumerate(items):
+        if results[i]:
+            continue
+        rid = token_revocation_id(payload, token)
+        subject_keys = [f"{NOT_BEFORE_KEY_PREFIX}{key}" for key in payload_subject_keys(payload)]
+        revoked_keys = [f"{REVOKED_KEY_PREFIX}{rid}"] if rid else []
+        if token and not payload.get("jti"):
+            # 没有jti的旧Token可能还有未改写的旧撤销键
+            revoked_keys.append(f"{REVOKED_KEY_PREFIX}{token}")
+        offset = len(keys)
+        keys.extend(subject_keys)
+        keys.extend(revoked_keys)
+        pending.append((i, offset, len(subject_keys), len(revoked_keys), payload.get("iat", 0)))
+    return keys, pending
+
+
+def _apply_lookup(results: List[bool], pending: list, values: List[Any]):
+    """将MGET结果合并到撤销结果中"""
+    for i, offset, subject_count, revoked_count, iat in pending:
+        revoked_values = values[offset + subject_count : offset + subject_count + revoked_count]
+        if any(value is not None for value in revoked_values):
+            results[i] = True
+            continue
+        results[i] = any(
+            value is not None and iat <= int(value)
+            for value in values[offset : offset + subject_count]
+        )
+
+
+def are_revoked(items: List[Tuple[Dict[str, Any], Optional[str]]]) -> List[bool]:
+    """
+    批量检查Token是否已撤销
+
+    本地集合就绪时不产生网络请求；否则所有Token的撤销记录合并为一次MGET查询。
+    Redis未配置或不可用时与订阅线程一致，只按本地集合判断（记录警告）。
+
+    Args:
+        items: (payload, 原始Token) 列表
+
+    Returns:
+        与items一一对应的撤销结果
+    """
+    results = _check_local(items)
+    if revocation_store.ready:
+        return results
+
+    try:
+        client = database.get_redis_client()
+        if client is None:
+            return results
+
+        keys, pending = _lookup_keys(items, results)
+        if keys:
+            _apply_lookup(results, pending, client.mget(keys))
+    except (database.BackendUnavailableError, redis.RedisError) as e:
+        logger.warning(f"Token revocation lookup failed, using local set only: {e}")
+    return results
+
+
+async def are_revoked_async(items: List[Tuple[Dict[str, Any], Optional[str]]]) -> List[bool]:
+    """
+    批量检查Token是否已撤销（asyncio版本）
+
+    回退查询使用database.redis_async_client；未初始化时在线程池中使用同步客户端，
+    启动订阅线程（可能初始化Redis连接）也在线程池中执行，不阻塞事件循环。
+
+    Args:
+        items: (payload, 原始Token) 列表
+
+    Returns:
+        与items一一对应的撤销结果
+    """
+    if not revocation_store.started:
+        await asyncio.to_thread(revocation_store.start)
+    results = _check_local(items, start=False)
+    if revocation_store.ready:
+        return results
+
+    client = database.redis_async_client
+    if client is None:
+        return await asyncio.to_thread(are_revoked, items)
+
+    keys, pending = _lookup_keys(items, results)
+    if keys:
+        try:
+            _apply_lookup(results, pending, await client.mget(keys))
+        except redis.RedisError as e:
+            logger.warning(f"Token revocation lookup failed, using local set only: {e}")
+    return results
+
+
+def _revocation_record(rid: str, expires_in: int) -> Tuple[str, int, str, str]:
+    """写入本地集合并生成Redis记录 (键, 保留时间, 值, 广播消息)"""
+    expires_in = max(1, int(expires_in))
+    expires_at = int(time.time()) + expires_in
+    revocation_store.add(rid, expires_at)
+    message = json.dumps({"id": rid, "exp": expires_at})
+    return f"{REVOKED_KEY_PREFIX}{rid}", expires_in, "1", message
+
+
+def _subject_revocation_record(
+    claim: str, value: str, not_before: int, expires_in: int
+) -> Tuple[str, int, str, str]:
+    """写入本地集合并生成主体撤销的Redis记录 (键, 保留时间, 值, 广播消息)"""
+    if claim not in SUBJECT_CLAIMS:
+        raise ValueError(f"Unsupported revocation subject: {claim}")
+
+    key = subject_key(claim, value)
+    expires_at = int(time.time()) + expires_in
+    revocation_store.add_subject(key, not_before, expires_at)
+    message = json.dumps({"subject": key, "nbf": not_before, "exp": expires_at})
+    return f"{NOT_BEFORE_KEY_PREFIX}{key}", expires_in, str(not_before), message
+
+
+def _write_record(record: Tuple[str, int, str, str]):
+    """写入撤销记录并广播（同步）"""
+    client = database.get_redis_client()
+    if client is None:
+        return
+
+    key, expires_in, value, message = record
+    with database.redis_pipeline() as batch:
+        batch.setex(key, expires_in, value)
+        batch.publish(REVOCATION_CHANNEL, message)
+
+
+async def _write_record_async(record: Tuple[str, int, str, str]):
+    """写入撤销记录并广播（asyncio）"""
+    client = database.redis_async_client
+    if client is None:
+        _write_record(record)
+        return
+
+    key, expires_in, value, message = record
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.setex(key, expires_in, value)
+        pipe.publish(REVOCATION_CHANNEL, message)
+        await pipe.execute()
+
+
+def publish_revocation(rid: str, expires_in: int):
+    """
+    撤销单个Token：写入Redis并广播给所有进程
+
+    Args:
+        rid: 撤销标识
+        expires_in: 撤销记录保留时间（秒）
+    """
+    _write_record(_revocation_record(rid, expires_in))
+
+
+async def publish_revocation_async(rid: str, expires_in: int):
+    """
+    撤销单个Token（asyncio版本）
+
+    Args:
+        rid: 撤销标识
+        expires_in: 撤销记录保留时间（秒）
+    """
+    await _write_record_async(_revocation_record(rid, expires_in))
+
+
+def publish_subject_revocation(claim: str, value: str, not_before: int, expires_in: int):
+    """
+    撤销主体的所有Token：写入not-before时间戳并广播给所有进程
+
+    Args:
+        claim: payload字段名（vin或device_fingerprint）
+        value: 字段值
+        not_before: 签发时间不晚于此时间戳的Token失效
+        expires_in: 撤销记录保留时间（秒），应不短于Token的最长有效期
+    """
+    _write_record(_subject_revocation_record(claim, value, not_before, expires_in))
+
+
+async def publish_subject_revocation_async(
+    claim: str, value: str, not_before: int, expires_in: int
+):
+    """
+    撤销主体的所有Token（asyncio版本）
+
+    Args:
+        claim: payload字段名（vin或device_fingerprint）
+        value: 字段值
+        not_before: 签发时间不晚于此时间戳的Token失效
+        expires_in: 撤销记录保留时间（秒）
+    """
+    await _write_record_async(_subject_revocation_record(claim, value, not_before, expires_in))
+
+
+def get_revocation_stats() -> Dict[str, Any]:
+    """
+    获取撤销集合状态
+
+    Returns:
+        包含started, ready, size的字典
+    """
+    return {
+        "started": revocation_store.started,
+        "ready": revocation_store.ready,
+        "size": len(revocation_store),
+    }
@@ -0,0 +1,613 @@
+"""
+数据库迁移
+
+替代逐条split(";")执行SQL文件的初始化方式：
+- 迁移文件按文件名前缀排序（如 01-init.sql, 02-skip-indexes.sql），前缀即版本号，
+  按数值比较（9-a.sql 排在 10-b.sql 之前）
+- 每个后端一张迁移台账表（schema_migrations），记录校验和、状态和已完成的语句数
+- 已应用的迁移不再重复执行；已应用迁移的文件被修改时报错（应新增迁移文件）
+- SQL分词器正确处理字符串、反引号标识符和各类注释中的分号
+- 逐条语句记录进度，中断后从下一条语句继续；ClickHouse的ALTER产生的mutation
+  （MATERIALIZE INDEX/PROJECTION、UPDATE、DELETE）等待完成后才记为完成，
+  只等待本次提交的mutation，同一张表上其他来源的mutation不影响迁移；
+  重新执行时若同一mutation仍在进行则继续等待而不是重复提交
+- dry-run只列出将要执行的语句
+
+用法:
+    from common.migrations import Migrator, MySQLBackend, ClickHouseBackend
+
+    migrator = Migrator(ClickHouseBackend(client), "docker/clickhouse/init")
+    migrator.migrate(dry_run=True)
+"""
+
+import hashlib
+import logging
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+from sqlalchemy import text
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+LEDGER_TABLE = "schema_migrations"
+
+# 版本号的数值前缀
+_VERSION_NUMBER = re.compile(r"^\d+")
+
+# 会话级语句（会话变量、预处理语句），中断后继续执行时需要重放
+_SESSION_STATEMENT = re.compile(r"^\s*(SET|USE|PREPARE)\s", re.I)
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class MigrationError(Exception):
+    """迁移失败或台账与迁移文件不一致"""
+
+    pass
+
+
+class SqlSyntaxError(MigrationError):
+    """SQL文件无法分割（未闭合的字符串或注释）"""
+
+    pass
+
+
+def split_sql(sql: str, hash_comments: bool = False) -> List[str]:
+    """
+    把SQL脚本分割为语句
+
+    跳过 -- 行注释、/* */ 块注释（以及MySQL的 # 行注释），
+    字符串('...')、双引号和反引号标识符中的分号不作为分隔符，支持 \\' 与 '' 转义。
+
+    Args:
+        sql: SQL脚本
+        hash_comments: 是否把 # 视为行注释（MySQL）
+
+    Returns:
+        去掉注释后的语句列表（不含结尾分号）
+
+    Raises:
+        SqlSyntaxError: 字符串或块注释未闭合
+    """
+    statements = []
+    buf: List[str] = []
+    i = 0
+    n = len(sql)
+    chunk_start = 0
+
+    def flush_chunk(end: int):
+        if end > chunk_start:
+            buf.append(sql[chunk_start:end])
+
+    while i < n:
+        c = sql[i]
+
+        if c in "'\"`":
+            j = i + 1
+            while j < n:
+                if sql[j] == "\\" and c != "`":
+                    j += 2
+                    continue
+                if sql[j] == c:
+                    if j + 1 < n and sql[j + 1] == c:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            if j >= n:
+                raise SqlSyntaxError(f"Unterminated quoted string at offset {i}")
+            i = j + 1
+            continue
+
+        if (c == "-" and sql.startswith("--", i)) or (c == "#" and hash_comments):
+            flush_chunk(i)
+            j = sql.find("\n", i)
+            i = chunk_start = n if j < 0 else j
+            continue
+
+        if c == "/" and sql.startswith("/*", i):
+            flush_chunk(i)
+            j = sql.find("*/", i + 2)
+            if j < 0:
+                raise SqlSyntaxError(f"Unterminated block comment at offset {i}")
+            buf.append(" ")
+            i = chunk_start = j + 2
+            continue
+
+        if c == ";":
+            flush_chunk(i)
+            statement = "".join(buf).strip()
+            if statement:
+                statements.append(statement)
+            buf = []
+            i = chunk_start = i + 1
+            continue
+
+        i += 1
+
+    flush_chunk(n)
+    statement = "".join(buf).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def version_key(version: str) -> int:
+    """
+    版本号的排序键
+
+    Args:
+        version: 版本号（文件名中第一个 - 之前的部分）
+
+    Returns:
+        版本号的数值
+
+    Raises:
+        MigrationError: 版本号不是数字
+    """
+    match = _VERSION_NUMBER.match(version)
+    if match is None or match.end() != len(version):
+        raise MigrationError(f"Invalid migration version: {version!r}")
+    return int(version)
+
+
+class Migration:
+    """单个迁移文件"""
+
+    def __init__(self, path: Path, hash_comments: bool = False):
+        """
+        Args:
+            path: 迁移文件路径，文件名形如 <版本>-<名称>.sql
+            hash_comments: 是否把 # 视为行注释
+        """
+        self.path = path
+        self.version, _, self.name = path.stem.partition("-")
+        self.order = version_key(self.version)
+        content = path.read_bytes()
+        self.checksum = hashlib.sha256(content).hexdigest()
+        self.statements = split_sql(content.decode("utf-8"), hash_comments=hash_comments)
+
+    def __repr__(self) -> str:
+        return f"<Migration {self.version} {self.name}>"
+
+
+def load_migrations(directory: Union[str, Path], hash_comments: bool = False) -> List[Migration]:
+    """
+    加载目录下的迁移文件
+
+    Args:
+        directory: 迁移目录
+        hash_comments: 是否把 # 视为行注释
+
+    Returns:
+        按版本排序的迁移列表
+
+    Raises:
+        MigrationError: 版本号不是数字或重复（01 与 1 视为同一版本）
+    """
+    migrations = [Migration(path, hash_comments) for path in Path(directory).glob("*.sql")]
+    migrations.sort(key=lambda migration: (migration.order, migration.version))
+    orders = [migration.order for migration in migrations]
+    duplicates = [
+        migration.version for migration in migrations if orders.count(migration.order) > 1
+    ]
+    if duplicates:
+        raise MigrationError(f"Duplicate migration versions: {', '.join(duplicates)}")
+    return migrations
+
+
+class MySQLBackend:
+    """MySQL迁移后端（DDL隐式提交，进度按语句记录）"""
+
+    hash_comments = True
+
+    def __init__(self, engine):
+        """
+        Args:
+            engine: SQLAlchemy Engine
+        """
+        self.engine = engine
+        self._conn = None
+
+    def ensure_ledger(self):
+        """创建台账表"""
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS `{LEDGER_TABLE}` ("
+                "`version` VARCHAR(64) NOT NULL PRIMARY KEY, "
+                "`name` VARCHAR(255) NOT NULL, "
+                "`checksum` CHAR(64) NOT NULL, "
+                "`status` VARCHAR(16) NOT NULL, "
+                "`statements_done` INT UNSIGNED NOT NULL DEFAULT 0, "
+                "`error` TEXT NULL, "
+                "`updated_at` DATETIME NOT NULL"
+                ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数据库迁移台账'"
+            )
+
+    def applied(self) -> Dict[str, Dict[str, Any]]:
+        """查询台账"""
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text(
+                    f"SELECT version, name, checksum, status, statements_done, error "
+                    f"FROM `{LEDGER_TABLE}`"
+                )
+            )
+            rows = result.mappings().all()
+        return {row["version"]: dict(row) for row in rows}
+
+    def record(
+        self, migration: Migration, status: str, statements_done: int, error: Optional[str] = None
+    ):
+        """写入台账"""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"INSERT INTO `{LEDGER_TABLE}` "
+                    "(version, name, checksum, status, statements_done, error, updated_at) "
+                    "VALUES (:version, :name, :checksum, :status, :done, :error, :updated_at) "
+                    "ON DUPLICATE KEY UPDATE name = VALUES(name), checksum = VALUES(checksum), "
+                    "status = VALUES(status), statements_done = VALUES(statements_done), "
+                    "error = VALUES(error), updated_at = VALUES(updated_at)"
+                ),
+                {
+                    "version": migration.version,
+                    "name": migration.name,
+                    "checksum": migration.checksum,
+                    "status": status,
+                    "done": statements_done,
+                    "error": error,
+                    "updated_at": datetime.now(),
+                },
+            )
+
+    def execute(self, statement: str):
+        """
+        执行一条语句
+
+        所有语句在同一个自动提交连接上执行，SET等会话设置对后续语句有效；
+        不做参数替换，语句中的 % 和 : 原样传给服务器。
+        """
+        if self._conn is None:
+            self._conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            self._conn.exec_driver_sql(statement, execution_options={"no_parameters": True})
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        """关闭执行连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ClickHouseBackend:
+    """ClickHouse迁移后端，ALTER产生的mutation在完成后才记为完成"""
+
+    hash_comments = False
+
+    _ALTER_TABLE = re.compile(r"^\s*ALTER\s+TABLE\s+(?:`?(\w+)`?\.)?`?(\w+)`?\s+(.*)$", re.I | re.S)
+    _MATERIALIZE = re.compile(r"MATERIALIZE\s+(INDEX|PROJECTION|COLUMN)\s+`?(\w+)`?", re.I)
+
+    def __init__(
+        self,
+        client,
+        database: Optional[str] = None,
+        poll_interval: float = 5.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            client: clickhouse_driver.Client
+            database: 台账所在数据库，默认使用CLICKHOUSE_DATABASE
+            poll_interval: 等待mutation时的轮询间隔（秒）
+            sleep: 等待函数
+        """
+        self.client = client
+        self.database = database or config.CLICKHOUSE_DATABASE
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+
+    def ensure_ledger(self):
+        """创建台账表（ReplacingMergeTree，按updated_at保留最新记录）"""
+        self.client.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        self.client.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.database}.{LEDGER_TABLE} ("
+            "`version` String, "
+            "`name` String, "
+            "`checksum` String, "
+            "`status` LowCardinality(String), "
+            "`statements_done` UInt32, "
+            "`error` Nullable(String), "
+            "`updated_at` DateTime64(6)"
+            ") ENGINE = ReplacingMergeTree(updated_at) ORDER BY version "
+            "COMMENT '数据库迁移台账'"
+        )
+
+    def applied(self) -> Dict[str, Dict[str, Any]]:
+        """查询台账"""
+        rows, columns = self.client.execute(
+            f"SELECT version, name, checksum, status, statements_done, error "
+            f"FROM {self.database}.{LEDGER_TABLE} FINAL",
+            with_column_types=True,
+        )
+        names = [name for name, _ in columns]
+        return {row[0]: dict(zip(names, row, strict=True)) for row in rows}
+
+    def record(
+        self, migration: Migration, status: str, statements_done: int, error: Optional[str] = None
+    ):
+        """写入台账"""
+        self.client.execute(
+            f"INSERT INTO {self.database}.{LEDGER_TABLE} "
+            "(version, name, checksum, status, statements_done, error, updated_at) VALUES",
+            [
+                (
+                    migration.version,
+                    migration.name,
+                    migration.checksum,
+                    status,
+                    statements_done,
+                    error,
+                    datetime.now(),
+                )
+            ],
+        )
+
+    def _pending_mutations(self, database: str, table: str) -> List[Dict[str, Any]]:
+        rows, columns = self.client.execute(
+            "SELECT mutation_id, command, parts_to_do, latest_fail_reason "
+            "FROM system.mutations "
+            "WHERE database = %(database)s AND table = %(table)s AND NOT is_done",
+            {"database": database, "table": table},
+            with_column_types=True,
+        )
+        names = [name for name, _ in columns]
+        return [dict(zip(names, row, strict=True)) for row in rows]
+
+    def _wait_mutations(self, database: str, table: str, mutation_ids: Set[str]):
+        """等待指定的mutation结束，表上其他mutation不等待也不检查失败"""
+        while mutation_ids:
+            pending = [
+                m
+                for m in self._pending_mutations(database, table)
+                if m["mutation_id"] in mutation_ids
+            ]
+            if not pending:
+                return
+            failed = [m for m in pending if m["latest_fail_reason"]]
+            if failed:
+                raise MigrationError(
+                    f"Mutation {failed[0]['mutation_id']} on {database}.{table} failed: "
+                    f"{failed[0]['latest_fail_reason']}"
+                )
+            parts = sum(m["parts_to_do"] for m in pending)
+            logger.info(
+                f"Waiting for {len(pending)} mutation(s) on {database}.{table}, "
+                f"{parts} parts to do"
+            )
+            self.sleep(self.poll_interval)
+
+    def close(self):
+        """ClickHouse客户端由调用方管理"""
+        pass
+
+    def execute(self, statement: str):
+        """
+        执行一条语句
+
+        ALTER TABLE等待本语句产生的mutation完成（提交前后未完成mutation的差集），
+        已在进行中的相同MATERIALIZE只等待不重复提交。
+        """
+        match = self._ALTER_TABLE.match(statement)
+        if match is None:
+            self.client.execute(statement)
+            return
+
+        database = match.group(1) or self.database
+        table = match.group(2)
+
+        before = self._pending_mutations(database, table)
+        materialize = self._MATERIALIZE.search(match.group(3))
+        if materialize is not None:
+            target = f"MATERIALIZE {materialize.group(1).upper()} {materialize.group(2)}"
+            running = {m["mutation_id"] for m in before if target.lower() in m["command"].lower()}
+            if running:
+                logger.info(f"Resuming wait for {target} on {database}.{table}")
+                self._wait_mutations(database, table, running)
+                return
+
+        self.client.execute(statement, settings={"mutations_sync": 0})
+        existing = {m["mutation_id"] for m in before}
+        submitted = {
+            m["mutation_id"]
+            for m in self._pending_mutations(database, table)
+            if m["mutation_id"] not in existing
+        }
+        self._wait_mutations(database, table, submitted)
+
+
+class Migrator:
+    """按版本顺序应用迁移"""
+
+    def __init__(self, backend, directory: Union[str, Path]):
+        """
+        Args:
+            backend: MySQLBackend 或 ClickHouseBackend
+            directory: 迁移文件目录
+        """
+        self.backend = backend
+        self.directory = Path(directory)
+        self.migrations = load_migrations(self.directory, hash_comments=backend.hash_comments)
+
+    def _applied(self, create: bool = True) -> Dict[str, Dict[str, Any]]:
+        """读取台账；create=False时不创建台账表（只读操作），台账不存在视为空"""
+        if create:
+            self.backend.ensure_ledger()
+            return self.backend.applied()
+        try:
+            return self.backend.applied()
+        except Exception:
+            return {}
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        迁移状态
+
+        Returns:
+            每个迁移的 version、name、status（pending/running/failed/done/changed）、
+            statements_done、statements
+        """
+        applied = self._applied(create=False)
+        result = []
+        for migration in self.migrations:
+            record = applied.get(migration.version)
+            status = "pending"
+            done = 0
+            if record is not None:
+                status = record["status"]
+                done = record["statements_done"]
+                if record["checksum"] != migration.checksum:
+                    status = "changed"
+            result.append(
+                {
+                    "version": migration.version,
+                    "name": migration.name,
+                    "status": status,
+                    "statements_done": done,
+                    "statements": len(migration.statements),
+                }
+            )
+        return result
+
+    def _check(self, applied: Dict[str, Dict[str, Any]]):
+        """已完成迁移的文件不允许修改；未完成迁移修改后只能从头执行"""
+        changed = [
+            migration.version
+            for migration in self.migrations
+            if migration.version in applied
+            and applied[migration.version]["status"] == STATUS_DONE
+            and applied[migration.version]["checksum"] != migration.checksum
+        ]
+        if changed:
+            raise MigrationError(
+                f"Applied migrations were modified: {', '.join(changed)}; "
+                "add a new migration instead"
+            )
+
+    def migrate(self, dry_run: bool = False, target: Optional[str] = None) -> List[str]:
+        """
+        应用未完成的迁移
+
+        Args:
+            dry_run: 只列出将要执行的语句
+            target: 目标版本（含，按数值比较），默认应用全部
+
+        Returns:
+            已应用（dry_run时为将要应用）的迁移版本
+
+        Raises:
+            MigrationError: 迁移失败、已应用迁移被修改或目标版本不是数字
+        """
+        applied = self._applied(create=not dry_run)
+        self._check(applied)
+
+        limit = version_key(target) if target is not None else None
+        versions = []
+        for migration in self.migrations:
+            if limit is not None and migration.order > limit:
+                break
+
+            record = applied.get(migration.version)
+            if record is not None and record["status"] == STATUS_DONE:
+                continue
+
+            start = 0
+            if record is not None and record["checksum"] == migration.checksum:
+                start = record["statements_done"]
+
+            versions.append(migration.version)
+            if dry_run:
+                logger.info(
+                    f"[dry-run] {migration.path.name}: "
+                    f"statements {start + 1}-{len(migration.statements)}"
+                )
+                for statement in migration.statements[start:]:
+                    logger.info(f"[dry-run]   {statement}")
+                continue
+
+            try:
+                self._apply(migration, start)
+            finally:
+                self.backend.close()
+
+        return versions
+
+    def _apply(self, migration: Migration, start: int):
+        """从第start条语句开始执行一个迁移"""
+        if start:
+            logger.info(
+                f"Resuming {migration.path.name} "
+                f"at statement {start + 1}/{len(migration.statements)}"
+            )
+            for statement in migration.statements[:start]:
+                if _SESSION_STATEMENT.match(statement):
+                    self.backend.execute(statement)
+        else:
+            logger.info(f"Applying {migration.path.name} ({len(migration.statements)} statements)")
+
+        self.backend.record(migration, STATUS_RUNNING, start)
+        for index in range(start, len(migration.statements)):
+            statement = migration.statements[index]
+            began = time.monotonic()
+            try:
+                self.backend.execute(statement)
+            except Exception as e:
+                self.backend.record(migration, STATUS_FAILED, index, str(e))
+                raise MigrationError(
+                    f"{migration.path.name} statement {index + 1} failed: {e}\n{statement}"
+                ) from e
+            self.backend.record(migration, STATUS_RUNNING, index + 1)
+            logger.debug(f"  statement {index + 1} done in {time.monotonic() - began:.2f}s")
+
+        self.backend.record(migration, STATUS_DONE, len(migration.statements))
+        logger.info(f"Applied {migration.path.name}")
+
+    def baseline(self, target: str) -> List[str]:
+        """
+        把迁移记为已完成而不执行（用于结构已存在的旧环境首次接入台账）
+
+        只记录到现有结构对应的版本，之后新增的迁移仍需执行。
+
+        Args:
+            target: 现有结构对应的版本（含）
+
+        Returns:
+            记为已完成的迁移版本
+
+        Raises:
+            MigrationError: 目标版本不存在
+        """
+        if target not in {migration.version for migration in self.migrations}:
+            raise MigrationError(f"Unknown baseline version: {target}")
+
+        limit = version_key(target)
+        applied = self._applied()
+        versions = []
+        for migration in self.migrations:
+            if migration.order > limit:
+                break
+            if migration.version in applied:
+                continue
+            self.backend.record(migration, STATUS_DONE, len(migration.statements))
+            versions.append(migration.version)
+        return versions
@@ -0,0 +1,160 @@
+"""
+Redis Lua脚本注册表
+
+热点路径上的多条命令合并为一个Lua脚本，通过EVALSHA一次往返执行。
+脚本在init_redis时预加载（SCRIPT LOAD），Redis重启导致脚本缓存丢失时
+自动重新加载后重试。
+
+用法:
+    from common.redis_scripts import scripts
+
+    count = scripts.call("rate_limit", keys=["ratelimit:vin:xxx"], args=[60000])
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import redis
+from redis.commands.core import Script
+
+
+# 固定窗口计数：第一次计数时设置过期时间，返回当前计数
+# KEYS[1]=计数键  ARGV[1]=窗口长度（毫秒）
+RATE_LIMIT_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+# 批量检查并添加集合成员：返回已存在成员的下标（从0开始），并刷新过期时间
+# KEYS[1]=集合键  ARGV[1]=过期时间（秒）  ARGV[2..]=成员
+CHECK_AND_ADD_SCRIPT = """
+local existing = {}
+for i = 2, #ARGV do
+    if redis.call('SADD', KEYS[1], ARGV[i]) == 0 then
+        table.insert(existing, i - 2)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return existing
+"""
+
+# 仅当新值更大时写入（用于时间戳等单调递增的值），返回是否写入
+# KEYS[1]=键  ARGV[1]=新值  ARGV[2]=过期时间（秒，0表示不过期）
+SET_IF_GREATER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+class ScriptRegistry:
+    """Lua脚本注册表，按名称管理脚本并通过SHA调用"""
+
+    def __init__(self):
+        self._sources: Dict[str, str] = {}
+        self._scripts: Dict[str, Script] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, source: str) -> str:
+        """
+        注册脚本
+
+        Args:
+            name: 脚本名称
+            source: Lua脚本源码
+
+        Returns:
+            脚本SHA1
+        """
+        with self._lock:
+            self._sources[name] = source
+            self._scripts.pop(name, None)
+        return hashlib.sha1(source.encode()).hexdigest()
+
+    def names(self) -> List[str]:
+        """已注册的脚本名称"""
+        return list(self._sources)
+
+    def sha(self, name: str) -> str:
+        """
+        获取脚本SHA1
+
+        Args:
+            name: 脚本名称
+
+        Returns:
+            脚本SHA1
+        """
+        return hashlib.sha1(self._sources[name].encode()).hexdigest()
+
+    def _script(self, name: str, client: redis.Redis) -> Script:
+        """获取脚本对象（绑定的客户端仅作为默认值，调用时可覆盖）"""
+        script = self._scripts.get(name)
+        if script is None:
+            if name not in self._sources:
+                raise KeyError(f"Unknown Redis script: {name}")
+            with self._lock:
+                script = self._scripts.get(name)
+                if script is None:
+                    script = client.register_script(self._sources[name])
+                    self._scripts[name] = script
+        return script
+
+    def load_all(self, client: redis.Redis):
+        """
+        预加载所有脚本到Redis脚本缓存
+
+        Args:
+            client: Redis客户端
+        """
+        for source in list(self._sources.values()):
+            client.script_load(source)
+
+    def call(
+        self,
+        name: str,
+        keys: Optional[Sequence[Any]] = None,
+        args: Optional[Sequence[Any]] = None,
+        client: Optional[Any] = None,
+    ) -> Any:
+        """
+        通过EVALSHA调用脚本
+
+        client可以是Pipeline，此时脚本与流水线中的其他命令一起执行。
+
+        Args:
+            name: 脚本名称
+            keys: KEYS参数
+            args: ARGV参数
+            client: Redis客户端或Pipeline，默认使用database.get_redis_client()
+
+        Returns:
+            脚本返回值（Pipeline中调用时返回Pipeline）
+        """
+        if client is None:
+            from . import database
+
+            client = database.get_redis_client()
+        if client is None:
+            raise RuntimeError("Redis is not initialized")
+
+        script = self._script(name, client)
+        return script(keys=list(keys or []), args=list(args or []), client=client)
+
+
+# 进程级脚本注册表及内置脚本
+scripts = ScriptRegistry()
+scripts.register("rate_limit", RATE_LIMIT_SCRIPT)
+scripts.register("check_and_add", CHECK_AND_ADD_SCRIPT)
+scripts.register("set_if_greater", SET_IF_GREATER_SCRIPT)
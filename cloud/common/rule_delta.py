@@ -0,0 +1,356 @@
+"""
+规则增量更新
+
+规则文件（Suricata规则等）以行为单位，相邻版本通常只改动少数几行。规则版本发布后，
+precompute() 计算该版本与之前 RULE_DELTA_MAX_BASES 个已发布版本之间的行级增量，
+存入规则文件存储（按内容寻址）并登记到 rule_deltas 表。规则查询接口（cmd=20/21）
+发现车辆当前版本有增量时，在响应中附带增量下载地址和目标校验和。
+
+只登记收益明显的增量（增量大小不超过目标文件的 RULE_DELTA_MAX_RATIO），
+没有增量时车辆照常下载完整文件。
+
+增量格式（车辆端按此实现应用逻辑，见 apply_delta）:
+
+    IDPSDELTA/1 <基础版本sha256> <目标版本sha256> <目标文件大小>\\n
+    C <n>\\n              复制基础文件接下来的n行
+    S <n>\\n              跳过基础文件接下来的n行
+    A <字节数>\\n<字节>    追加新内容
+
+行以 \\n 结尾（最后一行可以没有），应用后必须校验目标sha256。
+
+用法:
+    from common.rule_delta import delta_service
+
+    # 发布后（可放到后台任务）
+    delta_service.precompute(version_id)
+
+    # 规则查询
+    data.update(delta_service.delta_fields(rule_type, current_version, latest) or {})
+
+    # GET /api/v1/rule/delta?type=network&from=1.2.2&to=1.2.3
+    response = delta_service.send_delta(rule_type, from_version, to_version)
+"""
+
+import difflib
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+
+from . import database
+from .cache import query_cache
+from .config import config
+from .rule_store import RuleStore, get_rule_store, send_rule_file
+
+logger = logging.getLogger(__name__)
+
+DELTA_MAGIC = b"IDPSDELTA/1"
+
+# 增量查询的缓存命名空间
+TABLE_RULE_DELTAS = "rule_deltas"
+
+DELTA_DOWNLOAD_PATH = "/api/v1/rule/delta"
+
+
+class DeltaError(ValueError):
+    """增量文件格式错误或与基础文件不匹配"""
+
+
+def _lines(data: bytes) -> List[bytes]:
+    """按 \\n 切分并保留行尾"""
+    lines = data.split(b"\n")
+    result = [line + b"\n" for line in lines[:-1]]
+    if lines[-1]:
+        result.append(lines[-1])
+    return result
+
+
+def make_delta(base: bytes, target: bytes) -> bytes:
+    """
+    计算行级增量
+
+    Args:
+        base: 基础版本内容
+        target: 目标版本内容
+
+    Returns:
+        增量文件内容
+    """
+    base_lines = _lines(base)
+    target_lines = _lines(target)
+    header = b"%s %s %s %d\n" % (
+        DELTA_MAGIC,
+        hashlib.sha256(base).hexdigest().encode(),
+        hashlib.sha256(target).hexdigest().encode(),
+        len(target),
+    )
+    parts = [header]
+
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            parts.append(b"C %d\n" % (i2 - i1))
+            continue
+        if i2 > i1:
+            parts.append(b"S %d\n" % (i2 - i1))
+        if j2 > j1:
+            added = b"".join(target_lines[j1:j2])
+            parts.append(b"A %d\n" % len(added))
+            parts.append(added)
+
+    return b"".join(parts)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    应用增量（车辆端逻辑的参考实现）
+
+    Args:
+        base: 基础版本内容
+        delta: 增量文件内容
+
+    Returns:
+        目标版本内容
+
+    Raises:
+        DeltaError: 格式错误、基础版本不匹配或结果校验失败
+    """
+    header_end = delta.find(b"\n")
+    header = delta[:header_end].split(b" ")
+    if header_end < 0 or len(header) != 4 or header[0] != DELTA_MAGIC or not header[3].isdigit():
+        raise DeltaError("Invalid delta header")
+    if hashlib.sha256(base).hexdigest().encode() != header[1]:
+        raise DeltaError("Delta does not apply to this base version")
+
+    base_lines = _lines(base)
+    cursor = 0
+    pos = header_end + 1
+    output = []
+    while pos < len(delta):
+        line_end = delta.find(b"\n", pos)
+        if line_end < 0:
+            raise DeltaError(f"Truncated delta at offset {pos}")
+        op, _, arg = delta[pos:line_end].partition(b" ")
+        if not arg.isdigit():
+            raise DeltaError(f"Invalid delta operation at offset {pos}: {delta[pos:line_end]!r}")
+        count = int(arg)
+        pos = line_end + 1
+        if op in (b"C", b"S"):
+            if cursor + count > len(base_lines):
+                raise DeltaError(f"Delta operation at offset {pos} runs past the end of the base")
+            if op == b"C":
+                output.extend(base_lines[cursor : cursor + count])
+            cursor += count
+        elif op == b"A":
+            if pos + count > len(delta):
+                raise DeltaError(f"Truncated delta at offset {pos}")
+            output.append(delta[pos : pos + count])
+            pos += count
+        else:
+            raise DeltaError(f"Unknown delta operation: {op!r}")
+
+    result = b"".join(output)
+    if len(result) != int(header[3]) or hashlib.sha256(result).hexdigest().encode() != header[2]:
+        raise DeltaError("Delta result checksum mismatch")
+    return result
+
+
+class DeltaService:
+    """
+    增量预计算与查询
+    """
+
+    def __init__(
+        self,
+        store: Optional[RuleStore] = None,
+        max_bases: int = 5,
+        max_ratio: float = 0.5,
+    ):
+        """
+        Args:
+            store: 规则文件存储，默认 get_rule_store()
+            max_bases: 为每个新版本计算增量的历史版本数
+            max_ratio: 增量大小与目标文件大小之比的上限，超过则不登记
+        """
+        self._store = store
+        self.max_bases = max_bases
+        self.max_ratio = max_ratio
+
+    @property
+    def store(self) -> RuleStore:
+        return self._store or get_rule_store()
+
+    def _read(self, checksum: str) -> bytes:
+        with self.store.open(checksum) as f:
+            return f.read()
+
+    def precompute(self, target_version_id: int) -> List[Dict[str, Any]]:
+        """
+        计算目标版本与之前 max_bases 个已发布版本之间的增量（幂等）
+
+        Args:
+            target_version_id: rule_versions.id
+
+        Returns:
+            登记的增量列表 [{"base_version", "delta_checksum", "delta_size"}]
+        """
+        with database.get_engine().connect() as conn:
+            result = conn.execute(
+                text("SELECT id, rule_type, version, checksum FROM rule_versions WHERE id = :id"),
+                {"id": target_version_id},
+            )
+            target = result.mappings().first()
+            if target is None:
+                raise ValueError(f"Rule version {target_version_id} not found")
+            result = conn.execute(
+                text(
+                    "SELECT id, version, checksum FROM rule_versions "
+                    "WHERE rule_type = :rule_type AND id <> :id "
+                    "AND status IN ('published', 'archived') AND published_at IS NOT NULL "
+                    "ORDER BY published_at DESC LIMIT :limit"
+                ),
+                {"rule_type": target["rule_type"], "id": target["id"], "limit": self.max_bases},
+            )
+            bases = result.mappings().all()
+
+        if not bases:
+            return []
+
+        target_data = self._read(target["checksum"])
+        registered = []
+        for base in bases:
+            if base["checksum"] == target["checksum"]:
+                continue
+            try:
+                delta = make_delta(self._read(base["checksum"]), target_data)
+            except FileNotFoundError:
+                logger.warning(f"Rule file of version {base['version']} missing, skip delta")
+                continue
+
+            if len(delta) > len(target_data) * self.max_ratio:
+                logger.info(
+                    f"Delta {base['version']} -> {target['version']} too large "
+                    f"({len(delta)}/{len(target_data)} bytes), skipped"
+                )
+                continue
+
+            stored = self.store.put(delta)
+            registered.append(
+                {
+                    "base_version_id": base["id"],
+                    "base_version": base["version"],
+                    "target_version_id": target["id"],
+                    "delta_checksum": stored.checksum,
+                    "delta_size": stored.size,
+                }
+            )
+
+        if registered:
+            with database.get_engine().begin() as conn:
+                conn.execute(
+                    text(
+                        "INSERT INTO rule_deltas "
+                        "(base_version_id, target_version_id, delta_checksum, delta_size) "
+                        "VALUES (:base_version_id, :target_version_id, "
+                        ":delta_checksum, :delta_size) "
+                        "ON DUPLICATE KEY UPDATE delta_checksum = VALUES(delta_checksum), "
+                        "delta_size = VALUES(delta_size)"
+                    ),
+                    registered,
+                )
+            # 发布到预计算完成之间缓存的"无增量"结果作废
+            query_cache.invalidate(TABLE_RULE_DELTAS)
+            logger.info(
+                f"Registered {len(registered)} deltas for {target['rule_type']} {target['version']}"
+            )
+
+        return [
+            {key: item[key] for key in ("base_version", "delta_checksum", "delta_size")}
+            for item in registered
+        ]
+
+    def find(
+        self, rule_type: str, base_version: str, target_version: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查询两个版本之间的增量（带缓存）
+
+        Args:
+            rule_type: 规则类型
+            base_version: 车辆当前版本号
+            target_version: 目标版本号
+
+        Returns:
+            {"delta_checksum", "delta_size"}，没有增量时返回None
+        """
+
+        def load() -> Optional[Dict[str, Any]]:
+            with database.get_engine().connect() as conn:
+                result = conn.execute(
+                    text(
+                        "SELECT d.delta_checksum, d.delta_size FROM rule_deltas d "
+                        "JOIN rule_versions b ON b.id = d.base_version_id "
+                        "JOIN rule_versions t ON t.id = d.target_version_id "
+                        "WHERE b.rule_type = :rule_type AND b.version = :base "
+                        "AND t.rule_type = :rule_type AND t.version = :target"
+                    ),
+                    {"rule_type": rule_type, "base": base_version, "target": target_version},
+                )
+                row = result.mappings().first()
+            return dict(row) if row else None
+
+        return query_cache.get_or_load(
+            TABLE_RULE_DELTAS, f"{rule_type}:{base_version}:{target_version}", load
+        )
+
+    def delta_fields(
+        self, rule_type: str, current_version: Optional[str], latest: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        规则查询响应中的增量字段
+
+        Args:
+            rule_type: 规则类型
+            current_version: 车辆当前版本号
+            latest: 最新版本（含 version、checksum）
+
+        Returns:
+            {"delta_url", "delta_size", "delta_checksum", "base_version", "target_checksum"}，
+            没有可用增量时返回None
+        """
+        if not current_version or current_version == latest["version"]:
+            return None
+        delta = self.find(rule_type, current_version, latest["version"])
+        if delta is None:
+            return None
+
+        query = urlencode({"type": rule_type, "from": current_version, "to": latest["version"]})
+        return {
+            "delta_url": f"{DELTA_DOWNLOAD_PATH}?{query}",
+            "delta_size": delta["delta_size"],
+            "delta_checksum": f"sha256:{delta['delta_checksum']}",
+            "base_version": current_version,
+            "target_checksum": f"sha256:{latest['checksum']}",
+        }
+
+    def send_delta(self, rule_type: str, base_version: str, target_version: str):
+        """
+        增量文件下载响应（支持Range和条件请求）
+
+        Returns:
+            Flask Response，没有增量时返回None
+        """
+        delta = self.find(rule_type, base_version, target_version)
+        if delta is None:
+            return None
+        return send_rule_file(
+            delta["delta_checksum"], f"{rule_type}_rules_{base_version}_{target_version}.delta"
+        )
+
+
+delta_service = DeltaService(
+    max_bases=config.RULE_DELTA_MAX_BASES,
+    max_ratio=config.RULE_DELTA_MAX_RATIO,
+)
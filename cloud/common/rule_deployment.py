@@ -0,0 +1,621 @@
+"""
+规则分批下发
+
+整车队发布规则时：
+- create_deployments: 分块多行INSERT IGNORE生成 rule_deployments 记录（整车队时用 INSERT ... SELECT
+  按vehicles.id区间分块，VIN不经过应用进程），唯一键 (rule_version_id, vin) 保证重复或并发执行
+  只补齐缺失的记录
+- 分批放量: 发布计划保存在Redis哈希 rule:rollout:<版本ID>，按VIN哈希桶放量百分比，
+  或按车辆分组（Redis集合 rule:cohort:<名称>，如测试车队）放量；百分比只增不减，
+  同一VIN在各次发布中的桶位置固定；放量在Lua脚本中原子更新，并发放量不会互相覆盖
+- 下载并发控制: 正在下载的VIN记录在有序集合 rule:rollout:<版本ID>:downloading
+  （分数为租约到期时间），达到并发上限时拒绝，车辆稍后重试；下载完成或失败时释放，
+  异常断开的在租约到期后回收
+- 状态上报: pending → downloading → success/failed 先进入内存队列，后台线程按
+  (版本, 目标状态, 错误信息) 分组，以 UPDATE ... WHERE vin IN (...) 批量写入，
+  同一VIN在一个批次内只保留最后一次上报；状态时间为写入时间（最大延迟为刷新间隔）
+
+没有发布计划的版本视为已全量放量（兼容未经调度发布的版本）。
+
+用法:
+    from common import rule_deployment
+
+    # 发布
+    rule_deployment.create_deployments(version_id)
+    rule_deployment.start_rollout(version_id, percent=1, cohorts=["canary"], concurrency=500)
+    rule_deployment.release_wave(version_id, percent=10)
+
+    # 规则查询（cmd=20/21），need_update时
+    if rule_deployment.admit_download(version_id, vin) != rule_deployment.ADMITTED:
+        need_update = False  # 未到该批次或并发已满，车辆下次查询时重试
+
+    # 车辆上报下载结果
+    rule_deployment.report_status(version_id, vin, "success")
+"""
+
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis
+from sqlalchemy import text
+
+from . import database
+from .config import config
+from .redis_scripts import scripts
+
+logger = logging.getLogger(__name__)
+
+ROLLOUT_KEY_PREFIX = "rule:rollout:"
+COHORT_KEY_PREFIX = "rule:cohort:"
+
+# 放量百分比精度：万分之一
+BUCKETS = 10000
+
+# admit_download 返回值
+ADMITTED = 1
+NOT_RELEASED = 0
+CONCURRENCY_LIMITED = -1
+
+STATUSES = ("pending", "downloading", "success", "failed")
+
+# 目标状态 -> 允许的当前状态（failed可重新下载）
+TRANSITIONS = {
+    "downloading": ("pending", "failed"),
+    "success": ("pending", "downloading", "failed"),
+    "failed": ("pending", "downloading"),
+}
+
+# 判断VIN是否在已放量批次内，并占用下载并发名额
+# KEYS[1]=发布计划哈希  KEYS[2]=下载中有序集合
+# ARGV[1]=VIN  ARGV[2]=VIN哈希桶  ARGV[3]=当前时间（秒）  ARGV[4]=租约（秒）  ARGV[5]=分组键前缀
+# 返回 1=允许下载  0=未到该批次  -1=并发已满
+ADMIT_DOWNLOAD_SCRIPT = """
+local plan = redis.call('HMGET', KEYS[1], 'percent', 'cohorts', 'concurrency')
+if plan[1] then
+    local released = tonumber(ARGV[2]) < tonumber(plan[1]) * 100
+    if not released and plan[2] then
+        for _, cohort in ipairs(cjson.decode(plan[2])) do
+            if redis.call('SISMEMBER', ARGV[5] .. cohort, ARGV[1]) == 1 then
+                released = true
+                break
+            end
+        end
+    end
+    if not released then
+        return 0
+    end
+end
+
+local now = tonumber(ARGV[3])
+local limit = tonumber(plan[3] or '0')
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if limit > 0 and not redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    if redis.call('ZCARD', KEYS[2]) >= limit then
+        return -1
+    end
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+scripts.register("admit_download", ADMIT_DOWNLOAD_SCRIPT)
+
+# 原子更新发布计划：百分比取较大值，分组追加去重
+# KEYS[1]=发布计划哈希  ARGV[1]=百分比  ARGV[2]=追加分组（JSON数组）  ARGV[3]=并发上限
+# 参数为空字符串表示不修改；返回 0=没有发布计划  1=已更新
+RELEASE_WAVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[1] ~= '' then
+    local current = tonumber(redis.call('HGET', KEYS[1], 'percent') or '0')
+    if tonumber(ARGV[1]) > current then
+        redis.call('HSET', KEYS[1], 'percent', ARGV[1])
+    end
+end
+if ARGV[2] ~= '' then
+    local cohorts = cjson.decode(redis.call('HGET', KEYS[1], 'cohorts') or '[]')
+    local seen = {}
+    for _, cohort in ipairs(cohorts) do
+        seen[cohort] = true
+    end
+    for _, cohort in ipairs(cjson.decode(ARGV[2])) do
+        if not seen[cohort] then
+            table.insert(cohorts, cohort)
+            seen[cohort] = true
+        end
+    end
+    redis.call('HSET', KEYS[1], 'cohorts', cjson.encode(cohorts))
+end
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'concurrency', ARGV[3])
+end
+return 1
+"""
+
+scripts.register("release_wave", RELEASE_WAVE_SCRIPT)
+
+
+def _rollout_key(rule_version_id: int) -> str:
+    return f"{ROLLOUT_KEY_PREFIX}{rule_version_id}"
+
+
+def _downloading_key(rule_version_id: int) -> str:
+    return f"{ROLLOUT_KEY_PREFIX}{rule_version_id}:downloading"
+
+
+def vin_bucket(vin: str) -> int:
+    """VIN所在的放量桶（0 ~ BUCKETS-1），与版本无关"""
+    return zlib.crc32(vin.encode()) % BUCKETS
+
+
+def _placeholders(prefix: str, values: List[Any], params: Dict[str, Any]) -> str:
+    """生成 :p0, :p1 ... 占位符并写入参数"""
+    names = []
+    for i, value in enumerate(values):
+        params[f"{prefix}{i}"] = value
+        names.append(f":{prefix}{i}")
+    return ", ".join(names)
+
+
+# =============================================
+# 下发记录生成
+# =============================================
+
+
+def _insert_vins(rule_version_id: int, vins: List[str]) -> int:
+    """为一块VIN插入pending记录（已存在的由唯一键跳过），返回插入数"""
+    rows = [{"version_id": rule_version_id, "vin": vin} for vin in vins]
+    with database.get_engine().begin() as conn:
+        # executemany，pymysql改写为一条多行INSERT
+        result = conn.execute(
+            text(
+                "INSERT IGNORE INTO rule_deployments (rule_version_id, vin, status) "
+                "VALUES (:version_id, :vin, 'pending')"
+            ),
+            rows,
+        )
+    return result.rowcount
+
+
+def create_deployments(
+    rule_version_id: int,
+    vins: Optional[Iterable[str]] = None,
+    chunk_size: Optional[int] = None,
+) -> int:
+    """
+    生成下发记录（幂等，每块一个短事务）
+
+    Args:
+        rule_version_id: 规则版本ID
+        vins: 目标VIN，None表示所有active车辆
+        chunk_size: 每块行数，默认 RULE_DEPLOY_INSERT_CHUNK
+
+    Returns:
+        新插入的记录数
+    """
+    chunk_size = chunk_size or config.RULE_DEPLOY_INSERT_CHUNK
+    inserted = 0
+
+    if vins is not None:
+        chunk: List[str] = []
+        for vin in dict.fromkeys(vins):
+            chunk.append(vin)
+            if len(chunk) >= chunk_size:
+                inserted += _insert_vins(rule_version_id, chunk)
+                chunk = []
+        if chunk:
+            inserted += _insert_vins(rule_version_id, chunk)
+        logger.info(f"Created {inserted} deployments for rule version {rule_version_id}")
+        return inserted
+
+    with database.get_engine().connect() as conn:
+        bounds = conn.execute(
+            text("SELECT MIN(id), MAX(id) FROM vehicles WHERE status = 'active'")
+        ).first()
+    if bounds is None or bounds[0] is None:
+        return 0
+
+    start, max_id = bounds
+    while start <= max_id:
+        with database.get_engine().begin() as conn:
+            result = conn.execute(
+                text(
+                    "INSERT IGNORE INTO rule_deployments (rule_version_id, vin, status) "
+                    "SELECT :version_id, v.vin, 'pending' FROM vehicles v "
+                    "WHERE v.id >= :start AND v.id < :end AND v.status = 'active'"
+                ),
+                {"version_id": rule_version_id, "start": start, "end": start + chunk_size},
+            )
+            inserted += result.rowcount
+        start += chunk_size
+
+    logger.info(f"Created {inserted} deployments for rule version {rule_version_id}")
+    return inserted
+
+
+# =============================================
+# 分批放量与下载并发
+# =============================================
+
+
+def define_cohort(name: str, vins: Iterable[str], replace: bool = True):
+    """
+    定义车辆分组
+
+    Args:
+        name: 分组名
+        vins: 分组内的VIN
+        replace: 是否替换原有成员
+    """
+    client = database.get_redis_client()
+    key = f"{COHORT_KEY_PREFIX}{name}"
+    vins = list(vins)
+    pipe = client.pipeline(transaction=True)
+    if replace:
+        pipe.delete(key)
+    for i in range(0, len(vins), 1000):
+        pipe.sadd(key, *vins[i : i + 1000])
+    pipe.execute()
+
+
+def start_rollout(
+    rule_version_id: int,
+    percent: float = 0,
+    cohorts: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+):
+    """
+    创建发布计划（覆盖已有计划）
+
+    Args:
+        rule_version_id: 规则版本ID
+        percent: 初始放量百分比（0 ~ 100）
+        cohorts: 放量的车辆分组
+        concurrency: 同时下载的车辆数上限，0表示不限，默认 RULE_DEPLOY_DOWNLOAD_CONCURRENCY
+    """
+    if not 0 <= percent <= 100:
+        raise ValueError(f"Rollout percent must be within 0-100: {percent}")
+    if concurrency is None:
+        concurrency = config.RULE_DEPLOY_DOWNLOAD_CONCURRENCY
+    client = database.get_redis_client()
+    key = _rollout_key(rule_version_id)
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(
+        key,
+        mapping={
+            "percent": percent,
+            "cohorts": json.dumps(cohorts or []),
+            "concurrency": concurrency,
+        },
+    )
+    pipe.execute()
+    logger.info(
+        f"Rollout started for rule version {rule_version_id}: "
+        f"{percent}%, cohorts={cohorts or []}, concurrency={concurrency}"
+    )
+
+
+def release_wave(
+    rule_version_id: int,
+    percent: Optional[float] = None,
+    cohorts: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    放量下一批
+
+    Args:
+        rule_version_id: 规则版本ID
+        percent: 新的放量百分比（小于当前值时忽略）
+        cohorts: 追加放量的车辆分组
+        concurrency: 新的下载并发上限
+
+    Returns:
+        更新后的发布计划
+
+    Raises:
+        ValueError: 百分比超出范围或没有发布计划
+    """
+    if percent is not None and not 0 <= percent <= 100:
+        raise ValueError(f"Rollout percent must be within 0-100: {percent}")
+
+    updated = scripts.call(
+        "release_wave",
+        keys=[_rollout_key(rule_version_id)],
+        args=[
+            "" if percent is None else percent,
+            json.dumps(list(cohorts)) if cohorts else "",
+            "" if concurrency is None else concurrency,
+        ],
+    )
+    if not int(updated):
+        raise ValueError(f"No rollout plan for rule version {rule_version_id}")
+
+    plan = get_rollout(rule_version_id)
+    logger.info(f"Rollout of rule version {rule_version_id} updated: {plan}")
+    return plan
+
+
+def get_rollout(rule_version_id: int) -> Optional[Dict[str, Any]]:
+    """
+    查询发布计划
+
+    Returns:
+        {"percent", "cohorts", "concurrency", "downloading"}，没有计划时返回None
+    """
+    client = database.get_redis_client()
+    raw = client.hgetall(_rollout_key(rule_version_id))
+    if not raw:
+        return None
+    client.zremrangebyscore(_downloading_key(rule_version_id), "-inf", time.time())
+    return {
+        "percent": float(raw.get("percent", 0)),
+        "cohorts": json.loads(raw.get("cohorts") or "[]"),
+        "concurrency": int(raw.get("concurrency", 0)),
+        "downloading": client.zcard(_downloading_key(rule_version_id)),
+    }
+
+
+def admit_download(rule_version_id: int, vin: str) -> int:
+    """
+    判断车辆是否可以开始下载，可以时占用一个下载名额（同一VIN重复调用只续租）
+
+    Redis不可用时拒绝，车辆稍后重试，避免失去并发控制后全车队同时下载。
+
+    Args:
+        rule_version_id: 规则版本ID
+        vin: 车辆VIN
+
+    Returns:
+        ADMITTED / NOT_RELEASED / CONCURRENCY_LIMITED
+    """
+    try:
+        return int(
+            scripts.call(
+                "admit_download",
+                keys=[_rollout_key(rule_version_id), _downloading_key(rule_version_id)],
+                args=[
+                    vin,
+                    vin_bucket(vin),
+                    time.time(),
+                    config.RULE_DEPLOY_SLOT_TTL,
+                    COHORT_KEY_PREFIX,
+                ],
+            )
+        )
+    except (redis.RedisError, database.BackendUnavailableError, RuntimeError) as e:
+        logger.warning(f"Download admission unavailable, deferring {vin}: {e}")
+        return CONCURRENCY_LIMITED
+
+
+def release_download_slot(rule_version_id: int, vin: str):
+    """释放下载名额"""
+    try:
+        database.get_redis_client().zrem(_downloading_key(rule_version_id), vin)
+    except (redis.RedisError, database.BackendUnavailableError) as e:
+        logger.warning(f"Failed to release download slot of {vin}: {e}")
+
+
+def rollout_progress(rule_version_id: int) -> Dict[str, int]:
+    """
+    各状态的下发记录数
+
+    Returns:
+        {"pending": n, "downloading": n, "success": n, "failed": n}
+    """
+    progress = dict.fromkeys(STATUSES, 0)
+    with database.get_engine().connect() as conn:
+        for status, count in conn.execute(
+            text(
+                "SELECT status, COUNT(*) FROM rule_deployments "
+                "WHERE rule_version_id = :version_id GROUP BY status"
+            ),
+            {"version_id": rule_version_id},
+        ):
+            progress[status] = count
+    return progress
+
+
+# =============================================
+# 状态上报批量写入
+# =============================================
+
+
+class DeploymentStatusWriter:
+    """
+    下发状态批量写入器
+
+    后台线程每隔flush_interval秒（或积累batch_size条时）写入MySQL。
+    """
+
+    def __init__(self, flush_interval: float = 2, batch_size: int = 1000):
+        """
+        初始化写入器
+
+        Args:
+            flush_interval: 刷新间隔（秒）
+            batch_size: 单条UPDATE包含的最大VIN数
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # (版本ID, VIN) -> (状态, 错误信息)，同一VIN只保留最后一次上报
+        self._pending: "OrderedDict[Tuple[int, str], Tuple[str, Optional[str]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.stats = {"reported": 0, "updated": 0, "batches": 0, "flush_errors": 0}
+
+    def start(self):
+        """启动后台线程（幂等）"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run, name="deployment-status-writer", daemon=True
+            )
+            self._thread.start()
+
+    def report(
+        self, rule_version_id: int, vin: str, status: str, error_message: Optional[str] = None
+    ):
+        """
+        上报下发状态（不阻塞）
+
+        Args:
+            rule_version_id: 规则版本ID
+            vin: 车辆VIN
+            status: downloading / success / failed
+            error_message: 失败原因
+
+        Raises:
+            ValueError: 无效的目标状态
+        """
+        if status not in TRANSITIONS:
+            raise ValueError(f"Invalid deployment status: {status}")
+
+        self.start()
+        key = (rule_version_id, vin)
+        with self._cond:
+            self._pending.pop(key, None)
+            self._pending[key] = (status, error_message if status == "failed" else None)
+            self.stats["reported"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _write(self, groups: Dict[Tuple[int, str, Optional[str]], List[str]]) -> int:
+        """按 (版本, 状态, 错误信息) 分组批量UPDATE，返回更新行数"""
+        updated = 0
+        now = datetime.now()
+        # 先写downloading，再写终态
+        ordered = sorted(groups.items(), key=lambda item: item[0][1] != "downloading")
+        with database.get_engine().begin() as conn:
+            for (version_id, status, error_message), vins in ordered:
+                for i in range(0, len(vins), self.batch_size):
+                    params: Dict[str, Any] = {
+                        "version_id": version_id,
+                        "status": status,
+                        "now": now,
+                        "error_message": error_message,
+                    }
+                    in_list = _placeholders("v", vins[i : i + self.batch_size], params)
+                    from_list = _placeholders("s", list(TRANSITIONS[status]), params)
+                    if status == "downloading":
+                        assignments = (
+                            "deployed_at = :now, completed_at = NULL, error_message = NULL"
+                        )
+                    else:
+                        assignments = (
+                            "deployed_at = COALESCE(deployed_at, :now), completed_at = :now, "
+                            "error_message = :error_message"
+                        )
+                    result = conn.execute(
+                        text(
+                            f"UPDATE rule_deployments SET status = :status, {assignments} "
+                            f"WHERE rule_version_id = :version_id AND vin IN ({in_list}) "
+                            f"AND status IN ({from_list})"
+                        ),
+                        params,
+                    )
+                    updated += result.rowcount
+        return updated
+
+    def flush(self) -> int:
+        """
+        写入所有待写状态
+
+        Returns:
+            更新的行数
+        """
+        with self._flush_lock:
+            with self._cond:
+                pending = self._pending
+                self._pending = OrderedDict()
+            if not pending:
+                return 0
+
+            groups: Dict[Tuple[int, str, Optional[str]], List[str]] = {}
+            for (version_id, vin), (status, error_message) in pending.items():
+                groups.setdefault((version_id, status, error_message), []).append(vin)
+
+            try:
+                updated = self._write(groups)
+            except Exception:
+                self.stats["flush_errors"] += 1
+                # 放回队列，期间更新的上报优先
+                with self._cond:
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                raise
+
+            self.stats["updated"] += updated
+            self.stats["batches"] += 1
+            return updated
+
+    def _run(self):
+        """后台刷新线程"""
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Deployment status flush failed, will retry: {e}")
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        """停止后台线程并写入剩余状态"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Final deployment status flush failed: {e}")
+
+
+# 进程级写入器
+status_writer = DeploymentStatusWriter(
+    flush_interval=config.RULE_DEPLOY_FLUSH_INTERVAL,
+    batch_size=config.RULE_DEPLOY_FLUSH_BATCH_SIZE,
+)
+
+
+def report_status(rule_version_id: int, vin: str, status: str, error_message: Optional[str] = None):
+    """
+    上报下发状态（见 DeploymentStatusWriter.report），终态时释放下载名额
+
+    Args:
+        rule_version_id: 规则版本ID
+        vin: 车辆VIN
+        status: downloading / success / failed
+        error_message: 失败原因
+    """
+    status_writer.report(rule_version_id, vin, status, error_message)
+    if status in ("success", "failed"):
+        release_download_slot(rule_version_id, vin)
+
+
+def close_status_writer():
+    """停止下发状态写入器并写入剩余状态"""
+    status_writer.close()
@@ -0,0 +1,478 @@
+"""
+规则文件存储
+
+规则文件按内容寻址：对象键由文件内容的SHA-256决定（rule_versions.checksum），
+同一内容只存一份，写入后不可变。rule_versions.file_path 保存 object_key(checksum)。
+
+后端（Config.RULE_STORAGE_TYPE）:
+- local: RULE_STORAGE_PATH 下的本地文件（<root>/ab/cd/<sha256>），下载走 wsgi.file_wrapper，
+  gunicorn 下由 sendfile 零拷贝发送
+- minio / s3: MinIO或S3兼容对象存储（需安装 minio 包），下载由云端代理
+
+下载响应（send_rule_file）:
+- ETag 为 checksum，If-None-Match 命中返回 304，不读取文件
+- 支持 Range / If-Range，断点续传返回 206，越界返回 416
+- X-Checksum / X-Signature 头与规则查询接口的返回一致
+
+用法:
+    from common.rule_store import get_rule_store, send_rule_file
+
+    stored = get_rule_store().put(fileobj)
+    # rule_versions.file_path = stored.key, checksum = stored.checksum, file_size = stored.size
+
+    return send_rule_file(version.checksum, f"{rule_type}_rules_{version.version}.rules",
+                          signature=version.signature)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+from flask import Response, request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import quote_etag
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+_CHECKSUM_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class RuleFileNotFoundError(FileNotFoundError):
+    """规则文件不存在"""
+
+
+class ChecksumMismatchError(ValueError):
+    """写入内容与期望的校验和不一致"""
+
+
+def object_key(checksum: str) -> str:
+    """
+    内容寻址的对象键
+
+    Args:
+        checksum: SHA-256（16进制小写）
+
+    Returns:
+        对象键，如 "ab/cd/abcd..."
+
+    Raises:
+        ValueError: checksum格式错误
+    """
+    checksum = checksum.lower()
+    if checksum.startswith("sha256:"):
+        checksum = checksum[7:]
+    if not _CHECKSUM_RE.match(checksum):
+        raise ValueError(f"Invalid SHA-256 checksum: {checksum!r}")
+    return f"{checksum[:2]}/{checksum[2:4]}/{checksum}"
+
+
+class StoredObject:
+    """已存储的规则文件"""
+
+    def __init__(self, checksum: str, size: int, created: bool):
+        self.checksum = checksum
+        self.size = size
+        self.created = created  # False表示内容已存在（去重）
+
+    @property
+    def key(self) -> str:
+        return object_key(self.checksum)
+
+    def __repr__(self) -> str:
+        return f"StoredObject(checksum={self.checksum!r}, size={self.size}, created={self.created})"
+
+
+def _spool(source: Union[bytes, BinaryIO], directory: Optional[str] = None):
+    """
+    把数据流写入临时文件并计算SHA-256
+
+    Returns:
+        (临时文件路径, checksum, size)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                digest.update(source)
+                tmp.write(source)
+                size = len(source)
+            else:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+class RuleStore:
+    """
+    规则文件存储基类
+    """
+
+    def put(
+        self, source: Union[bytes, BinaryIO], expected_checksum: Optional[str] = None
+    ) -> StoredObject:
+        """
+        写入规则文件（流式，内存占用固定）
+
+        Args:
+            source: 文件内容或二进制文件对象
+            expected_checksum: 期望的SHA-256，不一致时拒绝写入
+
+        Returns:
+            StoredObject
+
+        Raises:
+            ChecksumMismatchError: 内容与expected_checksum不一致
+        """
+        raise NotImplementedError
+
+    def exists(self, checksum: str) -> bool:
+        """文件是否存在"""
+        raise NotImplementedError
+
+    def size(self, checksum: str) -> int:
+        """
+        文件大小
+
+        Raises:
+            RuleFileNotFoundError: 文件不存在
+        """
+        raise NotImplementedError
+
+    def open(self, checksum: str) -> BinaryIO:
+        """
+        打开文件读取（调用方负责关闭）
+
+        Raises:
+            RuleFileNotFoundError: 文件不存在
+        """
+        raise NotImplementedError
+
+    def delete(self, checksum: str):
+        """删除文件（不存在时忽略）"""
+        raise NotImplementedError
+
+    def send(self, checksum: str, download_name: str) -> Response:
+        """
+        构造下载响应（支持Range和条件请求），需在请求上下文中调用
+
+        Raises:
+            RuleFileNotFoundError: 文件不存在
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _check(checksum: str, expected_checksum: Optional[str]):
+        if expected_checksum is None:
+            return
+        expected = expected_checksum.lower()
+        if expected.startswith("sha256:"):
+            expected = expected[7:]
+        if checksum != expected:
+            raise ChecksumMismatchError(f"Checksum mismatch: expected {expected}, got {checksum}")
+
+
+class LocalRuleStore(RuleStore):
+    """
+    本地文件系统存储
+
+    写入先落到同一文件系统的临时文件，校验后 os.replace 到内容地址，读者不会看到半写的文件。
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 存储根目录
+        """
+        self.root = Path(root)
+        self._tmp_dir = self.root / ".tmp"
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, checksum: str) -> Path:
+        """文件的本地路径"""
+        return self.root / object_key(checksum)
+
+    def put(
+        self, source: Union[bytes, BinaryIO], expected_checksum: Optional[str] = None
+    ) -> StoredObject:
+        tmp_path, checksum, size = _spool(source, str(self._tmp_dir))
+        try:
+            self._check(checksum, expected_checksum)
+            target = self.path(checksum)
+            if target.exists():
+                return StoredObject(checksum, size, created=False)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, target)
+            logger.info(f"Stored rule file {checksum} ({size} bytes)")
+            return StoredObject(checksum, size, created=True)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def exists(self, checksum: str) -> bool:
+        return self.path(checksum).is_file()
+
+    def size(self, checksum: str) -> int:
+        try:
+            return self.path(checksum).stat().st_size
+        except FileNotFoundError:
+            raise RuleFileNotFoundError(checksum) from None
+
+    def open(self, checksum: str) -> BinaryIO:
+        try:
+            return open(self.path(checksum), "rb")
+        except FileNotFoundError:
+            raise RuleFileNotFoundError(checksum) from None
+
+    def delete(self, checksum: str):
+        try:
+            self.path(checksum).unlink()
+        except FileNotFoundError:
+            pass
+
+    def send(self, checksum: str, download_name: str) -> Response:
+        path = self.path(checksum)
+        if not path.is_file():
+            raise RuleFileNotFoundError(checksum)
+        # conditional=True: 处理 If-None-Match / If-Range / Range；
+        # 完整下载返回文件对象，由WSGI服务器的 file_wrapper（sendfile）发送
+        return send_file(
+            path,
+            mimetype="application/octet-stream",
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=checksum,
+        )
+
+
+class MinioRuleStore(RuleStore):
+    """
+    MinIO / S3兼容对象存储
+
+    条件请求只用checksum判断，不访问对象存储；Range请求只拉取所需区间。
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        bucket: str,
+        secure: bool = True,
+        prefix: str = "rules/",
+    ):
+        """
+        Args:
+            endpoint: 服务地址（host:port）
+            access_key: Access Key
+            secret_key: Secret Key
+            bucket: 存储桶
+            secure: 是否使用HTTPS
+            prefix: 对象键前缀
+
+        Raises:
+            ImportError: 未安装 minio 包
+        """
+        try:
+            from minio import Minio
+        except ImportError as e:
+            raise ImportError("MinIO rule storage requires the 'minio' package") from e
+
+        self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+        self.bucket = bucket
+        self.prefix = prefix
+        if not self.client.bucket_exists(bucket):
+            self.client.make_bucket(bucket)
+
+    def _name(self, checksum: str) -> str:
+        return self.prefix + object_key(checksum)
+
+    @staticmethod
+    def _is_not_found(error: Exception) -> bool:
+        return getattr(error, "code", None) in ("NoSuchKey", "NoSuchObject", "NotFound")
+
+    def _stat(self, checksum: str):
+        from minio.error import S3Error
+
+        try:
+            return self.client.stat_object(self.bucket, self._name(checksum))
+        except S3Error as e:
+            if self._is_not_found(e):
+                raise RuleFileNotFoundError(checksum) from None
+            raise
+
+    def put(
+        self, source: Union[bytes, BinaryIO], expected_checksum: Optional[str] = None
+    ) -> StoredObject:
+        # 对象键依赖内容哈希，先落临时文件算出checksum再上传
+        tmp_path, checksum, size = _spool(source)
+        try:
+            self._check(checksum, expected_checksum)
+            if self.exists(checksum):
+                return StoredObject(checksum, size, created=False)
+            self.client.fput_object(
+                self.bucket,
+                self._name(checksum),
+                tmp_path,
+                content_type="application/octet-stream",
+                metadata={"x-amz-meta-sha256": checksum},
+            )
+            logger.info(f"Stored rule file {checksum} ({size} bytes) in bucket {self.bucket}")
+            return StoredObject(checksum, size, created=True)
+        finally:
+            os.unlink(tmp_path)
+
+    def exists(self, checksum: str) -> bool:
+        try:
+            self._stat(checksum)
+            return True
+        except RuleFileNotFoundError:
+            return False
+
+    def size(self, checksum: str) -> int:
+        return self._stat(checksum).size
+
+    def open(self, checksum: str) -> BinaryIO:
+        from minio.error import S3Error
+
+        try:
+            return self.client.get_object(self.bucket, self._name(checksum))
+        except S3Error as e:
+            if self._is_not_found(e):
+                raise RuleFileNotFoundError(checksum) from None
+            raise
+
+    def delete(self, checksum: str):
+        self.client.remove_object(self.bucket, self._name(checksum))
+
+    def _stream(self, checksum: str, offset: int, length: int) -> Iterator[bytes]:
+        response = self.client.get_object(
+            self.bucket, self._name(checksum), offset=offset, length=length
+        )
+        try:
+            yield from response.stream(CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def send(self, checksum: str, download_name: str) -> Response:
+        etag = quote_etag(checksum)
+        if request.if_none_match.contains(checksum):
+            response = Response(status=304)
+            response.headers["ETag"] = etag
+            return response
+
+        total = self.size(checksum)
+        start, stop, status = 0, total, 200
+        # If-Range 与当前版本不一致（或只带日期）时忽略Range，返回完整内容
+        if_range = request.if_range
+        if request.range is not None and (
+            (if_range.etag is None and if_range.date is None) or if_range.etag == checksum
+        ):
+            ranges = request.range.range_for_length(total)
+            if ranges is None:
+                raise RequestedRangeNotSatisfiable(length=total)
+            (start, stop), status = ranges, 206
+
+        response = Response(
+            self._stream(checksum, start, stop - start),
+            status=status,
+            mimetype="application/octet-stream",
+            direct_passthrough=True,
+        )
+        response.headers["ETag"] = etag
+        response.headers["Accept-Ranges"] = "bytes"
+        response.content_length = stop - start
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{total}"
+        response.headers.set("Content-Disposition", "attachment", filename=download_name)
+        return response
+
+
+_store: Optional[RuleStore] = None
+_store_lock = threading.Lock()
+
+
+def create_rule_store(storage_type: Optional[str] = None) -> RuleStore:
+    """
+    按配置创建规则文件存储
+
+    Args:
+        storage_type: local / minio / s3，默认 Config.RULE_STORAGE_TYPE
+
+    Returns:
+        RuleStore
+
+    Raises:
+        ValueError: 未知的存储类型
+    """
+    storage_type = (storage_type or config.RULE_STORAGE_TYPE).lower()
+    if storage_type == "local":
+        return LocalRuleStore(config.RULE_STORAGE_PATH)
+    if storage_type in ("minio", "s3"):
+        return MinioRuleStore(
+            config.MINIO_ENDPOINT,
+            config.MINIO_ACCESS_KEY,
+            config.MINIO_SECRET_KEY,
+            config.MINIO_BUCKET,
+            secure=config.MINIO_SECURE,
+        )
+    raise ValueError(f"Unknown rule storage type: {storage_type}")
+
+
+def get_rule_store() -> RuleStore:
+    """获取进程级规则文件存储（首次调用时创建）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_rule_store()
+    return _store
+
+
+def send_rule_file(checksum: str, download_name: str, signature: Optional[str] = None) -> Response:
+    """
+    规则文件下载响应
+
+    Args:
+        checksum: rule_versions.checksum
+        download_name: 下载文件名
+        signature: rule_versions.signature，放入 X-Signature 头
+
+    Returns:
+        Flask Response（200 / 206 / 304）
+
+    Raises:
+        RuleFileNotFoundError: 文件不存在
+        RequestedRangeNotSatisfiable: Range越界（416）
+    """
+    response = get_rule_store().send(checksum, download_name)
+    response.headers["X-Checksum"] = f"sha256:{checksum}"
+    if signature:
+        response.headers["X-Signature"] = signature
+    # 内容由版本唯一确定，客户端每次用ETag重新验证
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,346 @@
+"""
+日志统计查询
+
+统计查询优先读取物化视图汇总表（SummingMergeTree），按时间粒度从粗到细选择：
+时间范围中与汇总粒度对齐的部分读汇总表，两端不足一个粒度的部分依次退到更细的
+汇总表，最后退到原始日志表，各段以 UNION ALL 合并后在一次查询中汇总。
+
+汇总表的未合并分片中同一键可能有多行，查询时总是 sum() + GROUP BY。
+
+用法:
+    from common.stats import StatsQuery
+
+    rows = StatsQuery(
+        "network_ids_logs", "alerts", start, end, group_by=["severity"], filters={"vin": vin}
+    ).execute()
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import database
+from .config import config
+
+# 时间粒度（秒）
+GRANULARITY_SECONDS = {"hour": 3600, "day": 86400}
+
+# 原始表的时间桶表达式
+RAW_BUCKETS = {
+    "hour": "toStartOfHour(timestamp)",
+    "day": "toStartOfDay(timestamp)",
+}
+
+# 原始表可统计的指标
+RAW_METRICS: Dict[str, Dict[str, str]] = {
+    "network_ids_logs": {
+        "events": "count()",
+        "alerts": "countIf(event_type = 'alert')",
+        "high_severity": "countIf(severity >= 3)",
+    },
+    "firewall_logs": {
+        "events": "count()",
+        "bytes": "sum(bytes)",
+        "packets": "sum(packets)",
+    },
+    "host_ids_logs": {
+        "events": "count()",
+        "high_severity": "countIf(severity >= 3)",
+    },
+}
+
+# 原始表可分组/过滤的维度
+RAW_DIMENSIONS: Dict[str, Sequence[str]] = {
+    "network_ids_logs": ("vin", "severity", "event_type", "category", "protocol"),
+    "firewall_logs": ("vin", "action", "protocol", "interface"),
+    "host_ids_logs": ("vin", "log_type", "severity"),
+}
+
+
+class Rollup:
+    """物化视图汇总表描述"""
+
+    def __init__(
+        self,
+        name: str,
+        source: str,
+        granularity: str,
+        time_column: str,
+        dimensions: Sequence[str],
+        metrics: Dict[str, str],
+        source_filters: Optional[Dict[str, Any]] = None,
+        filtered_metrics: Sequence[str] = (),
+    ):
+        """
+        Args:
+            name: 汇总表名
+            source: 原始表名
+            granularity: 时间粒度（hour, day）
+            time_column: 时间列
+            dimensions: 可分组/过滤的维度列
+            metrics: 指标名 -> 汇总列
+            source_filters: 物化视图自身的过滤条件（维度 -> 值），
+                查询需包含相同过滤才能使用（如告警汇总只含event_type='alert'）
+            filtered_metrics: 自身已隐含source_filters的指标，查询这些指标时无需显式过滤
+        """
+        self.name = name
+        self.source = source
+        self.granularity = granularity
+        self.time_column = time_column
+        self.dimensions = set(dimensions)
+        self.metrics = metrics
+        self.source_filters = source_filters or {}
+        self.filtered_metrics = set(filtered_metrics)
+
+    def bucket(self, interval: str) -> str:
+        """时间桶表达式"""
+        if self.granularity == "day":
+            return f"toDateTime({self.time_column})"
+        return self.time_column if interval == "hour" else f"toStartOfDay({self.time_column})"
+
+    def supports(self, metric: str, dimensions: Sequence[str], interval: Optional[str]) -> bool:
+        """能否回答该查询"""
+        if metric not in self.metrics:
+            return False
+        if not set(dimensions) <= self.dimensions:
+            return False
+        if (
+            interval is not None
+            and GRANULARITY_SECONDS[interval] < GRANULARITY_SECONDS[self.granularity]
+        ):
+            return False
+        return True
+
+
+# 汇总表定义（与 docker/clickhouse/init 中 01-init.sql、04-hourly-rollups.sql 的物化视图一致）
+ROLLUPS: List[Rollup] = [
+    Rollup(
+        "network_alerts_hourly",
+        "network_ids_logs",
+        "hour",
+        "hour",
+        ("vin", "severity"),
+        {"alerts": "alert_count", "events": "alert_count"},
+        source_filters={"event_type": "alert"},
+        filtered_metrics=("alerts",),
+    ),
+    Rollup(
+        "vehicle_log_stats_daily",
+        "network_ids_logs",
+        "day",
+        "date",
+        ("vin",),
+        {"events": "total_logs", "high_severity": "high_severity_count"},
+    ),
+    Rollup(
+        "firewall_logs_hourly",
+        "firewall_logs",
+        "hour",
+        "hour",
+        ("vin", "action"),
+        {"events": "event_count", "bytes": "total_bytes", "packets": "total_packets"},
+    ),
+    Rollup(
+        "host_ids_logs_hourly",
+        "host_ids_logs",
+        "hour",
+        "hour",
+        ("vin", "log_type", "severity"),
+        {"events": "event_count"},
+    ),
+]
+
+
+def _floor(value: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil(value: datetime, granularity: str) -> datetime:
+    floored = _floor(value, granularity)
+    if floored == value:
+        return value
+    return floored + timedelta(seconds=GRANULARITY_SECONDS[granularity])
+
+
+def _format_time(value: datetime, time_format: str) -> str:
+    """clickhouse_driver转义datetime时丢弃毫秒，时间参数统一以字符串传入"""
+    text = value.strftime(time_format)
+    return text[:-3] if time_format.endswith("%f") else text
+
+
+class StatsQuery:
+    """
+    统计查询
+
+    结果为按 [时间桶] + group_by 分组的指标值，列名 bucket（指定interval时）、
+    各分组维度和 value。
+    """
+
+    def __init__(
+        self,
+        table: str,
+        metric: str,
+        start: datetime,
+        end: datetime,
+        group_by: Optional[Sequence[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        interval: Optional[str] = None,
+    ):
+        """
+        Args:
+            table: 原始日志表
+            metric: 指标名（见RAW_METRICS）
+            start: 开始时间（含）
+            end: 结束时间（不含）
+            group_by: 分组维度
+            filters: 等值过滤（维度 -> 值）
+            interval: 时间桶（hour, day），None表示不按时间分组
+
+        Raises:
+            ValueError: 未知的表、指标、维度或时间桶
+        """
+        if table not in RAW_METRICS:
+            raise ValueError(f"Unknown stats table: {table}")
+        if metric not in RAW_METRICS[table]:
+            raise ValueError(f"Unknown metric for {table}: {metric}")
+        if interval is not None and interval not in GRANULARITY_SECONDS:
+            raise ValueError(f"Unknown interval: {interval}")
+
+        self.table = table
+        self.metric = metric
+        self.start = start
+        self.end = end
+        self.group_by = list(group_by or [])
+        self.filters = dict(filters or {})
+        self.interval = interval
+
+        unknown = [
+            dim for dim in self.group_by + list(self.filters) if dim not in RAW_DIMENSIONS[table]
+        ]
+        if unknown:
+            raise ValueError(f"Unknown dimensions for {table}: {', '.join(unknown)}")
+
+    def _matches_source_filters(self, rollup: Rollup) -> bool:
+        """
+        汇总表自带的过滤能否表达查询的过滤
+
+        查询对同一维度的过滤值必须与汇总表一致（如 event_type='http' 不能读告警汇总）；
+        查询没有过滤该维度时，只有指标本身隐含该过滤才能使用。
+        """
+        for dim, value in rollup.source_filters.items():
+            if dim in self.filters:
+                if self.filters[dim] != value:
+                    return False
+            elif self.metric not in rollup.filtered_metrics:
+                return False
+        return True
+
+    def candidates(self) -> List[Rollup]:
+        """可用的汇总表，粗粒度在前"""
+        usable = []
+        for rollup in ROLLUPS:
+            if rollup.source != self.table:
+                continue
+            if not self._matches_source_filters(rollup):
+                continue
+            dimensions = self.group_by + [
+                dim for dim in self.filters if dim not in rollup.source_filters
+            ]
+            if rollup.supports(self.metric, dimensions, self.interval):
+                usable.append(rollup)
+        return sorted(usable, key=lambda rollup: -GRANULARITY_SECONDS[rollup.granularity])
+
+    def plan(self) -> List[Tuple[Optional[Rollup], datetime, datetime]]:
+        """
+        把时间范围拆分为 (汇总表或None表示原始表, 开始, 结束) 的若干段
+
+        Returns:
+            按时间排序的分段
+        """
+        return self._plan(self.start, self.end, self.candidates())
+
+    def _plan(self, start: datetime, end: datetime, candidates: List[Rollup]):
+        if start >= end:
+            return []
+        if not candidates:
+            return [(None, start, end)]
+
+        rollup, finer = candidates[0], candidates[1:]
+        aligned_start = _ceil(start, rollup.granularity)
+        aligned_end = _floor(end, rollup.granularity)
+        if aligned_start >= aligned_end:
+            return self._plan(start, end, finer)
+
+        return (
+            self._plan(start, aligned_start, finer)
+            + [(rollup, aligned_start, aligned_end)]
+            + self._plan(aligned_end, end, finer)
+        )
+
+    def build(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        生成SQL
+
+        Returns:
+            (SQL, 参数字典)
+        """
+        db = config.CLICKHOUSE_DATABASE
+        keys = (["bucket"] if self.interval else []) + self.group_by
+        params: Dict[str, Any] = {}
+        segments = []
+
+        for i, (rollup, start, end) in enumerate(self.plan()):
+            filters = dict(self.filters)
+            if rollup is None:
+                source = f"{db}.{self.table}"
+                time_column = "timestamp"
+                bucket = RAW_BUCKETS.get(self.interval)
+                value = RAW_METRICS[self.table][self.metric]
+                time_format = "%Y-%m-%d %H:%M:%S.%f"
+            else:
+                source = f"{db}.{rollup.name}"
+                time_column = rollup.time_column
+                bucket = rollup.bucket(self.interval) if self.interval else None
+                value = f"sum({rollup.metrics[self.metric]})"
+                time_format = "%Y-%m-%d" if rollup.granularity == "day" else "%Y-%m-%d %H:%M:%S"
+                for dim in rollup.source_filters:
+                    filters.pop(dim, None)
+
+            params[f"start_{i}"] = _format_time(start, time_format)
+            params[f"end_{i}"] = _format_time(end, time_format)
+            conditions = [f"{time_column} >= %(start_{i})s", f"{time_column} < %(end_{i})s"]
+            for j, (dim, filter_value) in enumerate(filters.items()):
+                params[f"f_{i}_{j}"] = filter_value
+                conditions.append(f"{dim} = %(f_{i}_{j})s")
+
+            columns = [f"{bucket} AS bucket"] if bucket else []
+            columns += self.group_by + [f"{value} AS value"]
+            segment = f"SELECT {', '.join(columns)} FROM {source} WHERE {' AND '.join(conditions)}"
+            if keys:
+                segment += f" GROUP BY {', '.join(keys)}"
+            segments.append(segment)
+
+        if not segments:
+            empty = [f"NULL AS {key}" for key in keys] + ["0 AS value"]
+            segments.append(f"SELECT {', '.join(empty)} WHERE 0")
+
+        union = " UNION ALL ".join(segments)
+        select = ", ".join(keys + ["sum(value) AS value"])
+        sql = f"SELECT {select} FROM ({union})"
+        if keys:
+            sql += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}"
+        return sql, params
+
+    def execute(self) -> List[Dict[str, Any]]:
+        """
+        执行查询
+
+        Returns:
+            结果行字典列表
+        """
+        sql, params = self.build()
+        with database.get_clickhouse() as client:
+            rows, columns = client.execute(sql, params, with_column_types=True)
+        names = [name for name, _ in columns]
+        return [dict(zip(names, row, strict=True)) for row in rows]
@@ -4,7 +4,16 @@
 
 from .response import success_response, error_response
 from .logger import setup_logger
-from .crypto import AESCipher, hash_sha256, hmac_sha256, generate_random_key
+from .crypto import (
+    AESCipher,
+    hash_sha256,
+    hmac_sha256,
+    hash_sha256_stream,
+    hmac_sha256_stream,
+    digest_file,
+    generate_random_key,
+)
+from .json_provider import FastJSONProvider, init_json_provider
 from .validator import validate_vin, validate_ip, validate_port
 
 __all__ = [
@@ -14,7 +23,12 @@ __all__ = [
     "AESCipher",
     "hash_sha256",
     "hmac_sha256",
+    "hash_sha256_stream",
+    "hmac_sha256_stream",
+    "digest_file",
     "generate_random_key",
+    "FastJSONProvider",
+    "init_json_provider",
     "validate_vin",
     "validate_ip",
     "validate_port",
@@ -6,6 +6,8 @@ import os
 import hashlib
 import hmac
 import base64
+import mmap
+from typing import BinaryIO, Iterator, Optional, Union
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
@@ -24,20 +26,24 @@ def generate_random_key(length: int = 32) -> bytes:
     return os.urandom(length)
 
 
-def hash_sha256(data: str) -> str:
+def _to_bytes(data: Union[str, bytes]) -> bytes:
+    return data.encode() if isinstance(data, str) else data
+
+
+def hash_sha256(data: Union[str, bytes]) -> str:
     """
     SHA256哈希
 
     Args:
-        data: 要哈希的字符串
+        data: 要哈希的字符串或字节串
 
     Returns:
         16进制哈希字符串
     """
-    return hashlib.sha256(data.encode()).hexdigest()
+    return hashlib.sha256(_to_bytes(data)).hexdigest()
 
 
-def hmac_sha256(key: str, data: str) -> str:
+def hmac_sha256(key: Union[str, bytes], data: Union[str, bytes]) -> str:
     """
     HMAC-SHA256签名
 
@@ -48,7 +54,7 @@ def hmac_sha256(key: str, data: str) -> str:
     Returns:
         16进制签名字符串
     """
-    return hmac.new(key.encode(), data.encode(), hashlib.sha256).hexdigest()
+    return hmac.new(_to_bytes(key), _to_bytes(data), hashlib.sha256).hexdigest()
 
 
 def verify_hmac_sha256(key: str, data: str, signature: str) -> bool:
@@ -67,6 +73,164 @@ def verify_hmac_sha256(key: str, data: str, signature: str) -> bool:
     return hmac.compare_digest(expected, signature)
 
 
+# 流式哈希的分块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 可流式处理的数据源：字节串、mmap 或二进制文件对象
+ByteSource = Union[bytes, bytearray, memoryview, mmap.mmap, BinaryIO]
+
+
+def iter_chunks(source: ByteSource, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    """
+    按固定大小分块读取数据源
+
+    字节串和mmap按memoryview切片，不复制；文件对象读入同一个缓冲区，
+    因此每个分块只在下一次迭代前有效。
+
+    Args:
+        source: 字节串、mmap 或二进制文件对象
+        chunk_size: 分块大小（字节）
+
+    Yields:
+        分块的memoryview
+    """
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        view = memoryview(source)
+        try:
+            for start in range(0, len(view), chunk_size):
+                yield view[start : start + chunk_size]
+        finally:
+            view.release()
+        return
+
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    readinto = getattr(source, "readinto", None)
+    while True:
+        if readinto is not None:
+            size = readinto(view)
+            if not size:
+                break
+            yield view[:size]
+        else:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield memoryview(chunk)
+
+
+class StreamDigest:
+    """
+    流式计算文件大小、SHA256和HMAC-SHA256签名（一次读取）
+    """
+
+    def __init__(self, key: Optional[Union[str, bytes]] = None):
+        """
+        Args:
+            key: HMAC密钥，None表示不签名（空密钥同样签名，与hmac_sha256一致）
+        """
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._hmac = hmac.new(_to_bytes(key), digestmod=hashlib.sha256) if key is not None else None
+
+    def update(self, chunk: Union[bytes, memoryview]):
+        """追加数据"""
+        self.size += len(chunk)
+        self._sha256.update(chunk)
+        if self._hmac is not None:
+            self._hmac.update(chunk)
+
+    def consume(self, source: ByteSource, chunk_size: int = CHUNK_SIZE) -> "StreamDigest":
+        """读取整个数据源"""
+        for chunk in iter_chunks(source, chunk_size):
+            self.update(chunk)
+        return self
+
+    @property
+    def checksum(self) -> str:
+        """16进制SHA256"""
+        return self._sha256.hexdigest()
+
+    @property
+    def signature(self) -> Optional[str]:
+        """16进制HMAC-SHA256签名，未提供密钥时为None"""
+        return self._hmac.hexdigest() if self._hmac is not None else None
+
+
+def hash_sha256_stream(source: ByteSource, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    流式SHA256哈希（内存占用固定）
+
+    Args:
+        source: 字节串、mmap 或二进制文件对象
+        chunk_size: 分块大小（字节）
+
+    Returns:
+        16进制哈希字符串
+    """
+    return StreamDigest().consume(source, chunk_size).checksum
+
+
+def hmac_sha256_stream(
+    key: Union[str, bytes], source: ByteSource, chunk_size: int = CHUNK_SIZE
+) -> str:
+    """
+    流式HMAC-SHA256签名（内存占用固定）
+
+    Args:
+        key: 密钥
+        source: 字节串、mmap 或二进制文件对象
+        chunk_size: 分块大小（字节）
+
+    Returns:
+        16进制签名字符串
+    """
+    return StreamDigest(key).consume(source, chunk_size).signature
+
+
+def verify_hmac_sha256_stream(
+    key: Union[str, bytes], source: ByteSource, signature: str, chunk_size: int = CHUNK_SIZE
+) -> bool:
+    """
+    流式验证HMAC-SHA256签名
+
+    Args:
+        key: 密钥
+        source: 字节串、mmap 或二进制文件对象
+        signature: 签名
+        chunk_size: 分块大小（字节）
+
+    Returns:
+        签名是否有效
+    """
+    return hmac.compare_digest(hmac_sha256_stream(key, source, chunk_size), signature)
+
+
+def digest_file(
+    path: Union[str, os.PathLike],
+    key: Optional[Union[str, bytes]] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> StreamDigest:
+    """
+    计算文件的大小、SHA256和签名（mmap映射，不经过Python堆内存）
+
+    Args:
+        path: 文件路径
+        key: HMAC密钥，None表示不签名（空密钥同样签名）
+        chunk_size: 分块大小（字节）
+
+    Returns:
+        StreamDigest（size、checksum、signature）
+    """
+    digest = StreamDigest(key)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest.consume(mapped, chunk_size)
+    return digest
+
+
 class AESCipher:
     """
     AES-256-GCM加密解密类
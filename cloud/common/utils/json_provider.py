@@ -0,0 +1,219 @@
+"""
+快速JSON序列化
+
+替换Flask默认的JSON provider：安装了orjson时用orjson序列化响应和解析请求体，
+否则回退到标准库json。两种实现输出的值一致，且默认与Flask默认实现兼容：
+- datetime / date: HTTP日期（"Sun, 14 Jan 2024 12:00:00 GMT"，与Flask默认相同，精确到秒）
+- time: ISO 8601（"12:00:00.123000"，Flask默认不支持）
+- Decimal: 字符串（不丢精度）
+- IPv4Address / IPv6Address / UUID: 字符串
+- 字典的非字符串键转为字符串
+
+datetime_format = "iso"（Config.JSON_DATETIME_FORMAT=iso）时日期时间输出RFC 3339
+（"2024-01-14T12:00:00.123000+00:00"，无时区的视为UTC，保留微秒），orjson原生序列化，
+日志分页等日期时间较多的响应明显更快；客户端需按ISO 8601解析。
+
+默认不排序键（Flask默认排序，对大响应开销明显），需要时设置 app.json.sort_keys = True。
+
+用法:
+    from common.utils.json_provider import init_json_provider
+
+    app = Flask(__name__)
+    init_json_provider(app)
+"""
+
+import dataclasses
+import decimal
+import ipaddress
+import json
+import logging
+import uuid
+from datetime import date, datetime, time, timezone
+from typing import Any, Callable, Dict, Optional, Union
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider
+
+from ..config import config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于部署环境
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def http_date(o: date) -> str:
+    """
+    HTTP日期（与werkzeug.http.http_date输出相同，无时区的视为UTC）
+
+    直接格式化，不经过email.utils，日志分页中大量日期时间的序列化开销明显更低。
+    """
+    if isinstance(o, datetime):
+        if o.tzinfo is not None:
+            o = o.astimezone(timezone.utc)
+        clock = f"{o.hour:02d}:{o.minute:02d}:{o.second:02d}"
+    else:
+        clock = "00:00:00"
+    return f"{_WEEKDAYS[o.weekday()]}, {o.day:02d} {_MONTHS[o.month]} {o.year:04d} {clock} GMT"
+
+
+def iso_datetime(o: date) -> str:
+    """RFC 3339日期时间（无时区的视为UTC），date输出为 YYYY-MM-DD"""
+    if isinstance(o, datetime) and o.tzinfo is None:
+        return o.isoformat() + "+00:00"
+    return o.isoformat()
+
+
+# 按精确类型查找的转换函数，常见类型不必逐个isinstance判断
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    time: time.isoformat,
+    decimal.Decimal: str,
+    uuid.UUID: str,
+    ipaddress.IPv4Address: str,
+    ipaddress.IPv6Address: str,
+}
+_HTTP_CONVERTERS = {**_CONVERTERS, datetime: http_date, date: http_date}
+_ISO_CONVERTERS = {**_CONVERTERS, datetime: iso_datetime, date: iso_datetime}
+
+
+def _convert(o: Any, date_format: Callable[[date], str]) -> Any:
+    """子类等不在转换表中的类型"""
+    if isinstance(o, date):
+        return date_format(o)
+    if isinstance(o, time):
+        return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID, ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def json_default(o: Any) -> Any:
+    """
+    标准库json无法序列化的类型（日期时间输出HTTP日期）
+
+    Raises:
+        TypeError: 不支持的类型
+    """
+    convert = _HTTP_CONVERTERS.get(type(o))
+    if convert is not None:
+        return convert(o)
+    return _convert(o, http_date)
+
+
+def iso_json_default(o: Any) -> Any:
+    """
+    标准库json无法序列化的类型（日期时间输出RFC 3339）
+
+    Raises:
+        TypeError: 不支持的类型
+    """
+    convert = _ISO_CONVERTERS.get(type(o))
+    if convert is not None:
+        return convert(o)
+    return _convert(o, iso_datetime)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    基于orjson的JSON provider，orjson不可用时等同于标准库实现
+    """
+
+    sort_keys = False
+    ensure_ascii = False
+    # http: HTTP日期（与Flask默认一致）；iso: RFC 3339
+    datetime_format = "http"
+
+    default = staticmethod(json_default)
+
+    def _default_hook(self) -> Callable[[Any], Any]:
+        return iso_json_default if self.datetime_format == "iso" else self.default
+
+    def _options(self, pretty: bool = False) -> int:
+        options = orjson.OPT_NON_STR_KEYS
+        if self.datetime_format == "iso":
+            # orjson原生输出RFC 3339，无时区的按UTC
+            options |= orjson.OPT_NAIVE_UTC
+        else:
+            # 日期时间交给default输出HTTP日期，与标准库回退一致
+            options |= orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if pretty:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def _dumps_bytes(self, obj: Any, pretty: bool = False) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self._default_hook(), option=self._options(pretty))
+            except TypeError:
+                # 超出64位的整数等orjson不支持的值，交给标准库
+                pass
+        return self._stdlib_dumps(obj, indent=2 if pretty else None).encode()
+
+    def _stdlib_dumps(self, obj: Any, **kwargs: Any) -> str:
+        kwargs.setdefault("default", self._default_hook())
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        if kwargs.get("indent") is None:
+            kwargs.setdefault("separators", (",", ":"))
+        return json.dumps(obj, **kwargs)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        序列化为字符串
+
+        带有orjson不支持的参数（cls、separators、indent非2等）时使用标准库。
+        """
+        indent = kwargs.pop("indent", None)
+        if orjson is not None and not kwargs and indent in (None, 2):
+            return self._dumps_bytes(obj, pretty=indent == 2).decode()
+        return self._stdlib_dumps(obj, indent=indent, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        """解析JSON"""
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """构造JSON响应（直接输出字节，不经过str）"""
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            self._dumps_bytes(obj, pretty=pretty), mimetype=self.mimetype
+        )
+
+
+def init_json_provider(app: Flask, datetime_format: Optional[str] = None) -> FastJSONProvider:
+    """
+    为Flask应用启用快速JSON provider
+
+    Args:
+        app: Flask应用
+        datetime_format: http或iso，默认 Config.JSON_DATETIME_FORMAT
+
+    Returns:
+        FastJSONProvider实例
+
+    Raises:
+        ValueError: 未知的日期时间格式
+    """
+    datetime_format = (datetime_format or config.JSON_DATETIME_FORMAT).lower()
+    if datetime_format not in ("http", "iso"):
+        raise ValueError(f"Unknown JSON datetime format: {datetime_format}")
+    app.json = FastJSONProvider(app)
+    app.json.datetime_format = datetime_format
+    if orjson is None:
+        logger.info("orjson not installed, using stdlib json encoder")
+    return app.json
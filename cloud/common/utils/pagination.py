@@ -0,0 +1,239 @@
+"""
+游标（keyset）分页
+
+按排序键定位下一页，WHERE条件直接命中ClickHouse主键索引，
+第N页与第1页代价相同，也不需要COUNT()。
+
+游标是对上一页最后一行排序键值的不透明编码，排序键需与表的 ORDER BY 一致，
+末尾加一个区分同键行的tiebreaker（行哈希）保证全序。
+
+用法:
+    from common.utils.pagination import LOG_PAGINATION, InvalidCursorError
+    from common.utils.response import cursor_paginate_response
+
+    paging = LOG_PAGINATION["network_ids_logs"]
+    where, params = paging.where(request.args.get("cursor"))
+    rows = client.execute(
+        f"SELECT *, {paging.select_columns()} FROM idps.network_ids_logs "
+        f"WHERE vin = %(vin)s AND {where} ORDER BY {paging.order_by()} LIMIT {page_size + 1}",
+        {"vin": vin, **params},
+        with_column_types=True,
+    )
+    items, next_cursor = paging.page(dict_rows, page_size)
+    return cursor_paginate_response(items, page_size, next_cursor)
+"""
+
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+
+class InvalidCursorError(ValueError):
+    """游标格式错误或与当前排序不匹配"""
+
+    pass
+
+
+# 排序列：列名，或 (表达式, 别名)
+SortColumn = Union[str, Tuple[str, str]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def _query_param(value: Any) -> Any:
+    """clickhouse_driver转义datetime时丢弃毫秒，DateTime64列改用字符串比较"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return value
+
+
+def encode_cursor(values: Sequence[Any], scope: str = "") -> str:
+    """
+    编码游标
+
+    Args:
+        values: 排序键值
+        scope: 排序标识，解码时校验，防止游标在不同查询间混用
+
+    Returns:
+        URL安全的游标字符串
+    """
+    payload = json.dumps(
+        {"s": _scope_tag(scope), "k": [_encode_value(value) for value in values]},
+        separators=(",", ":"),
+        default=str,
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, scope: str = "") -> List[Any]:
+    """
+    解码游标
+
+    Args:
+        cursor: 游标字符串
+        scope: 排序标识
+
+    Returns:
+        排序键值
+
+    Raises:
+        InvalidCursorError: 游标格式错误或排序标识不匹配
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != _scope_tag(scope):
+            raise InvalidCursorError("Cursor does not match this query")
+        return [_decode_value(value) for value in payload["k"]]
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}") from e
+
+
+def _scope_tag(scope: str) -> str:
+    return hashlib.sha256(scope.encode()).hexdigest()[:8]
+
+
+class KeysetPagination:
+    """按固定排序键的游标分页"""
+
+    def __init__(self, sort_columns: Sequence[SortColumn], descending: bool = False):
+        """
+        初始化
+
+        Args:
+            sort_columns: 排序列，与表ORDER BY前缀一致；表达式列以 (表达式, 别名) 给出，
+                查询需通过select_columns()选出别名列
+            descending: 是否倒序（最新的在前）
+        """
+        self.columns = [
+            column if isinstance(column, tuple) else (column, column) for column in sort_columns
+        ]
+        self.descending = descending
+        self.scope = ",".join(expr for expr, _ in self.columns) + (" DESC" if descending else "")
+
+    def select_columns(self) -> str:
+        """需要额外选出的表达式列（如tiebreaker），没有则返回空字符串"""
+        return ", ".join(f"{expr} AS {alias}" for expr, alias in self.columns if expr != alias)
+
+    def order_by(self) -> str:
+        """ORDER BY子句内容"""
+        direction = " DESC" if self.descending else ""
+        return ", ".join(f"{expr}{direction}" for expr, _ in self.columns)
+
+    def where(self, cursor: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        """
+        生成游标之后的行的过滤条件
+
+        展开为 c1 > v1 OR (c1 = v1 AND c2 > v2) OR ... 形式，ClickHouse可据此裁剪主键范围。
+
+        Args:
+            cursor: 上一页返回的next_cursor，为空表示第一页
+
+        Returns:
+            (WHERE条件, 参数字典)
+
+        Raises:
+            InvalidCursorError: 游标无效
+        """
+        if not cursor:
+            return "1", {}
+
+        values = decode_cursor(cursor, self.scope)
+        if len(values) != len(self.columns):
+            raise InvalidCursorError("Cursor does not match this query")
+
+        op = "<" if self.descending else ">"
+        params = {f"_cursor_{i}": _query_param(value) for i, value in enumerate(values)}
+        clauses = []
+        for i, (expr, _) in enumerate(self.columns):
+            terms = [f"{prev} = %(_cursor_{j})s" for j, (prev, _) in enumerate(self.columns[:i])]
+            terms.append(f"{expr} {op} %(_cursor_{i})s")
+            clauses.append("(" + " AND ".join(terms) + ")")
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def page(
+        self, rows: List[Dict[str, Any]], page_size: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        截取一页并生成下一页游标
+
+        查询应使用 LIMIT page_size + 1，多出的一行用于判断是否还有下一页。
+        别名列（tiebreaker）会从返回的行中移除。
+
+        Args:
+            rows: 查询结果（字典列表）
+            page_size: 每页记录数
+
+        Returns:
+            (当前页数据, 下一页游标或None)
+        """
+        has_next = len(rows) > page_size
+        items = rows[:page_size]
+
+        next_cursor = None
+        if has_next and items:
+            last = items[-1]
+            next_cursor = encode_cursor([last[alias] for _, alias in self.columns], self.scope)
+
+        hidden = [alias for expr, alias in self.columns if expr != alias]
+        if hidden:
+            items = [
+                {key: value for key, value in row.items() if key not in hidden} for row in items
+            ]
+        return items, next_cursor
+
+
+# 日志表的游标分页（倒序，最新的在前）；tiebreaker为行哈希，区分同一毫秒的同类日志
+LOG_PAGINATION: Dict[str, KeysetPagination] = {
+    "network_ids_logs": KeysetPagination(
+        [
+            "vin",
+            "timestamp",
+            "event_type",
+            ("cityHash64(src_ip, src_port, dest_ip, dest_port, signature_id, raw_log)", "_row_key"),
+        ],
+        descending=True,
+    ),
+    "firewall_logs": KeysetPagination(
+        [
+            "vin",
+            "timestamp",
+            "action",
+            (
+                "cityHash64(src_ip, src_port, dest_ip, dest_port, protocol, rule_id, bytes)",
+                "_row_key",
+            ),
+        ],
+        descending=True,
+    ),
+    "host_ids_logs": KeysetPagination(
+        [
+            "vin",
+            "timestamp",
+            "log_type",
+            ("cityHash64(process_id, process_name, file_path, event, details)", "_row_key"),
+        ],
+        descending=True,
+    ),
+    "performance_metrics": KeysetPagination(["vin", "timestamp"], descending=True),
+}
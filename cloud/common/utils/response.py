@@ -48,6 +48,7 @@ def paginate_response(
     page: int,
     page_size: int,
     message: str = "Success",
+    approximate: bool = False,
 ) -> Dict:
     """
     分页响应格式
@@ -58,6 +59,7 @@ def paginate_response(
         page: 当前页码
         page_size: 每页记录数
         message: 响应消息
+        approximate: total是否为估算值（total_pages、has_next随之为估算）
 
     Returns:
         包含分页信息的响应字典
@@ -74,6 +76,40 @@ def paginate_response(
                 "total_pages": total_pages,
                 "has_next": page < total_pages,
                 "has_prev": page > 1,
+                "approximate": approximate,
+            },
+        },
+        message=message,
+    )
+
+
+def cursor_paginate_response(
+    items: list,
+    page_size: int,
+    next_cursor: Optional[str] = None,
+    message: str = "Success",
+) -> Dict:
+    """
+    游标分页响应格式
+
+    不返回总数和页码，客户端以next_cursor请求下一页。
+
+    Args:
+        items: 当前页的数据列表
+        page_size: 每页记录数
+        next_cursor: 下一页游标，None表示没有下一页
+        message: 响应消息
+
+    Returns:
+        包含游标信息的响应字典
+    """
+    return success_response(
+        data={
+            "items": items,
+            "pagination": {
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None,
             },
         },
         message=message,
@@ -0,0 +1,125 @@
+"""
+审计日志写入测试
+"""
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import StaticPool
+
+from common.audit import AuditWriter, _file_lock
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE audit_logs (id INTEGER PRIMARY KEY, user_id INT, action TEXT NOT NULL, "
+            "resource_type TEXT, resource_id TEXT, details TEXT, ip_address TEXT, "
+            "user_agent TEXT, created_at TEXT)"
+        )
+    return engine
+
+
+def _count(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM audit_logs")).scalar()
+
+
+def _event(action, user_id=1):
+    return {"action": action, "user_id": user_id, "created_at": "2024-01-01 00:00:00"}
+
+
+class TestAuditWriter:
+    def test_poison_event_dropped_after_max_attempts(self, engine, tmp_path):
+        writer = AuditWriter(
+            lambda: engine, spill_path=str(tmp_path / "spill.jsonl"), max_attempts=3
+        )
+        writer._queue.extend([_event("a"), _event(None), _event("b")])
+
+        for _ in range(3):
+            writer.flush()
+
+        assert _count(engine) == 2
+        assert writer.stats["dropped"] == 1
+        assert not (tmp_path / "spill.jsonl").exists()
+
+    def test_poison_event_without_spill_file(self, engine):
+        writer = AuditWriter(lambda: engine, max_attempts=2)
+        writer._queue.extend([_event("a"), _event(None)])
+
+        writer.flush()
+
+        assert _count(engine) == 1
+        assert writer.queued == 0
+        assert writer.stats["dropped"] == 1
+
+    def test_replay_skipped_while_another_process_replays(self, engine, tmp_path):
+        spill = tmp_path / "spill.jsonl"
+        writer = AuditWriter(lambda: engine, spill_path=str(spill))
+        writer._spill([_event("a"), _event("b")])
+
+        with _file_lock(writer._lock_path(".replay.lock")) as acquired:
+            assert acquired
+            writer.flush()
+            assert _count(engine) == 0
+            assert spill.exists()
+
+        writer.flush()
+        assert _count(engine) == 2
+        assert writer.stats["replayed"] == 2
+        assert not spill.exists()
+
+    def test_replay_resumes_after_connection_error(self, engine, tmp_path):
+        spill = tmp_path / "spill.jsonl"
+        calls = []
+
+        def flaky_engine():
+            calls.append(1)
+            if len(calls) == 2:
+                raise exc.OperationalError("INSERT", {}, Exception("connection lost"))
+            return engine
+
+        writer = AuditWriter(flaky_engine, batch_size=2, spill_path=str(spill))
+        writer._spill([_event(str(i)) for i in range(5)])
+
+        with pytest.raises(exc.OperationalError):
+            writer._replay()
+        assert _count(engine) == 2
+        assert writer._lock_path(".replaying.offset").exists()
+        # 失败的一批写回溢出文件，其余事件留在回放文件中
+        assert len(spill.read_text().splitlines()) == 2
+
+        writer._replay()
+        writer._replay()
+        with engine.connect() as conn:
+            actions = conn.execute(text("SELECT action FROM audit_logs ORDER BY action")).scalars()
+            assert list(actions) == ["0", "1", "2", "3", "4"]
+        assert not spill.exists()
+        assert not writer._lock_path(".replaying").exists()
+        assert not writer._lock_path(".replaying.offset").exists()
+
+    def test_replay_backs_off_while_mysql_is_down(self, engine, tmp_path, monkeypatch):
+        def down():
+            raise exc.OperationalError("INSERT", {}, Exception("connection refused"))
+
+        factory = [down]
+        writer = AuditWriter(
+            lambda: factory[0](), spill_path=str(tmp_path / "spill.jsonl"), max_replay_backoff=4
+        )
+        replays = []
+        monkeypatch.setattr(writer, "_replay_locked", lambda: replays.append(1))
+
+        for expected_backoff in (1, 2, 4, 4):
+            writer._queue.append(_event("a"))
+            writer.flush()
+            assert writer._replay_backoff == expected_backoff
+        assert replays == []
+
+        factory[0] = lambda: engine
+        writer._replay_after = 0
+        writer.flush()
+        assert replays == [1]
+        assert writer._replay_backoff == 0
@@ -0,0 +1,81 @@
+"""
+JWT认证测试
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from common.config import config
+from common.middleware import auth, auth_async
+from common.middleware.jwt_keys import KeySet, generate_key_pair
+
+
+@pytest.fixture(autouse=True)
+def no_revocation(monkeypatch):
+    monkeypatch.setattr(config, "JWT_CACHE_ENABLED", False)
+    monkeypatch.setattr(auth, "is_revoked", lambda payload, token=None: False)
+
+
+@pytest.fixture
+def es256(tmp_path, monkeypatch):
+    """切换到ES256签名"""
+    generate_key_pair(str(tmp_path), "k1", "ES256")
+    monkeypatch.setattr(auth, "key_set", KeySet(str(tmp_path)))
+
+    def switch():
+        monkeypatch.setattr(config, "JWT_ALGORITHM", "ES256")
+        monkeypatch.setattr(config, "JWT_ACTIVE_KID", "k1")
+
+    return switch
+
+
+def _hs256_token(monkeypatch):
+    monkeypatch.setattr(config, "JWT_ALGORITHM", "HS256")
+    return auth.create_access_token({"vin": "V1"})
+
+
+class TestAlgorithmMigration:
+    def test_hs256_token_valid_during_transition(self, monkeypatch, es256):
+        token = _hs256_token(monkeypatch)
+        es256()
+        monkeypatch.setattr(config, "JWT_LEGACY_HS256_UNTIL", int(time.time()) + 3600)
+
+        assert auth.verify_token(token)["vin"] == "V1"
+        assert auth.verify_token(auth.create_access_token({"vin": "V2"}))["vin"] == "V2"
+
+    def test_hs256_token_rejected_after_transition(self, monkeypatch, es256):
+        token = _hs256_token(monkeypatch)
+        es256()
+        monkeypatch.setattr(config, "JWT_LEGACY_HS256_UNTIL", int(time.time()) - 1)
+
+        with pytest.raises(auth.TokenInvalidError, match="Missing key id"):
+            auth.verify_token(token)
+
+    def test_transition_does_not_accept_other_hmac_algorithms(self, monkeypatch, es256):
+        monkeypatch.setattr(config, "JWT_ALGORITHM", "HS512")
+        token = auth.create_access_token({"vin": "V1"})
+        es256()
+        monkeypatch.setattr(config, "JWT_LEGACY_HS256_UNTIL", int(time.time()) + 3600)
+
+        with pytest.raises(auth.TokenInvalidError):
+            auth.verify_token(token)
+
+
+class TestAsyncVerify:
+    def test_cache_miss_counted_once(self, monkeypatch):
+        async def not_revoked(items):
+            return [False] * len(items)
+
+        monkeypatch.setattr(config, "JWT_CACHE_ENABLED", True)
+        monkeypatch.setattr(config, "JWT_ALGORITHM", "HS256")
+        monkeypatch.setattr(auth_async, "are_revoked_async", not_revoked)
+        monkeypatch.setattr(auth, "token_cache", auth.TokenCache())
+        monkeypatch.setattr(auth_async, "token_cache", auth.token_cache)
+        token = auth.create_access_token({"vin": "V1"})
+
+        for _ in range(2):
+            assert asyncio.run(auth_async.verify_token_async(token))["vin"] == "V1"
+        stats = auth.token_cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,55 @@
+"""
+查询缓存测试
+"""
+
+import pytest
+
+from common import database
+from common.cache import QueryCache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(database, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def caches():
+    # 模拟两个进程的缓存实例
+    first, second = QueryCache(lock_timeout=0.5), QueryCache(lock_timeout=0.5)
+    yield first, second
+    first.stop()
+    second.stop()
+
+
+class TestQueryCache:
+    def test_load_fills_both_levels(self, redis_client, caches):
+        cache, other = caches
+        assert cache.get_or_load("vehicles", "V1", lambda: {"status": 1}) == {"status": 1}
+        assert other.get("vehicles", "V1") == {"status": 1}
+        assert other.stats["redis_hits"] == 1
+
+    def test_invalidation_during_load_discards_result(self, redis_client, caches):
+        cache, other = caches
+
+        def slow_loader():
+            # 加载期间另一进程更新数据并使缓存失效
+            other.invalidate("vehicles", "V1")
+            return {"status": "stale"}
+
+        assert cache.get_or_load("vehicles", "V1", slow_loader) == {"status": "stale"}
+        assert redis_client.get(cache.make_key("vehicles", "V1")) is None
+        fresh = cache.get_or_load("vehicles", "V1", lambda: {"status": "fresh"})
+        assert fresh == {"status": "fresh"}
+        assert other.get("vehicles", "V1") == {"status": "fresh"}
+
+    def test_table_invalidation_bumps_generation(self, redis_client, caches):
+        cache, _ = caches
+        cache.set("rule_versions", "latest:network", {"version": "1.0.0"})
+        cache.invalidate("rule_versions")
+        assert redis_client.get("cache:gen:rule_versions") == "1"
+        assert cache.get("rule_versions", "latest:network") is None
@@ -0,0 +1,142 @@
+"""
+ClickHouse批量写入测试
+"""
+
+from datetime import datetime
+
+import pytest
+from clickhouse_driver import errors
+
+from common.clickhouse_writer import LOG_TABLE_COLUMNS, BulkWriter, is_retryable
+
+
+class FakeClient:
+    """记录写入的数据块，按预设依次抛出异常"""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.blocks = []
+
+    def execute(self, query, data, columnar=False):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.blocks.append((query, data))
+
+    def disconnect(self):
+        pass
+
+
+def _row(vin="V1"):
+    return {column: 0 for column in LOG_TABLE_COLUMNS["performance_metrics"]} | {
+        "timestamp": datetime(2024, 1, 1),
+        "vin": vin,
+    }
+
+
+@pytest.fixture
+def make_writer():
+    writers = []
+
+    def factory(client):
+        # flush_interval很长，只由测试显式刷新
+        writer = BulkWriter(lambda: client, flush_interval=3600, database="idps")
+        writers.append(writer)
+        return writer
+
+    yield factory
+    for writer in writers:
+        writer.close()
+
+
+class TestIsRetryable:
+    @pytest.mark.parametrize(
+        "error",
+        [
+            errors.NetworkError("connection reset"),
+            errors.SocketTimeoutError("timed out"),
+            ConnectionResetError(),
+            EOFError(),
+            errors.ServerException("too many parts", code=errors.ErrorCodes.TOO_MANY_PARTS),
+        ],
+    )
+    def test_transient(self, error):
+        assert is_retryable(error)
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            TypeError("unsupported operand"),
+            ValueError("invalid literal"),
+            errors.TypeMismatchError("Code: 53"),
+            errors.ServerException(
+                "no such column", code=errors.ErrorCodes.NO_SUCH_COLUMN_IN_TABLE
+            ),
+        ],
+    )
+    def test_permanent(self, error):
+        assert not is_retryable(error)
+
+
+class TestBulkWriter:
+    def test_writes_columnar_block(self, make_writer):
+        client = FakeClient()
+        writer = make_writer(client)
+        writer.write("performance_metrics", [_row("V1"), _row("V2")])
+        writer.flush()
+
+        assert len(client.blocks) == 1
+        query, data = client.blocks[0]
+        assert query.startswith("INSERT INTO idps.performance_metrics (`timestamp`, `vin`")
+        assert data[1] == ["V1", "V2"]
+        assert writer.buffered_rows == 0
+        assert writer.stats["rows_written"] == 2
+
+    def test_requeues_on_network_error(self, make_writer):
+        client = FakeClient([errors.NetworkError("connection reset")])
+        writer = make_writer(client)
+        writer.write("performance_metrics", [_row("V1")])
+        writer.flush()
+
+        assert client.blocks == []
+        assert writer.buffered_rows == 1
+        assert writer.stats["flush_errors"] == 1
+
+        # 重试时失败的数据在新数据之前
+        writer.write("performance_metrics", [_row("V2")])
+        writer.flush()
+        assert client.blocks[0][1][1] == ["V1", "V2"]
+        assert writer.buffered_rows == 0
+        assert writer.stats["rows_dropped"] == 0
+
+    @pytest.mark.parametrize(
+        "error",
+        [TypeError("unsupported operand"), ValueError("invalid literal")],
+    )
+    def test_drops_block_that_cannot_serialize(self, make_writer, error):
+        client = FakeClient([error])
+        writer = make_writer(client)
+        writer.write("performance_metrics", [_row("V1"), _row("V2")])
+        writer.flush()
+
+        assert writer.buffered_rows == 0
+        assert writer.stats["rows_dropped"] == 2
+
+        writer.write("performance_metrics", [_row("V3")])
+        writer.flush()
+        assert client.blocks[0][1][1] == ["V3"]
+
+    def test_drops_on_shutdown_failure(self):
+        client = FakeClient([errors.NetworkError("down")])
+        writer = BulkWriter(lambda: client, flush_interval=3600, database="idps")
+        writer.write("performance_metrics", [_row()])
+        writer.close()
+
+        assert writer.buffered_rows == 0
+        assert writer.stats["rows_dropped"] == 1
+
+    def test_rejects_unknown_table_and_missing_columns(self, make_writer):
+        writer = make_writer(FakeClient())
+        with pytest.raises(ValueError):
+            writer.write("unknown_logs", [_row()])
+        with pytest.raises(ValueError):
+            writer.write("performance_metrics", [{"vin": "V1"}])
@@ -0,0 +1,133 @@
+"""
+加密工具测试
+"""
+
+import hashlib
+import hmac
+import io
+import mmap
+
+import pytest
+
+from common import rule_store
+from common.rule_package import package_rules
+from common.utils.crypto import (
+    StreamDigest,
+    digest_file,
+    hash_sha256_stream,
+    hmac_sha256,
+    hmac_sha256_stream,
+    iter_chunks,
+    verify_hmac_sha256_stream,
+)
+
+DATA = bytes(range(256)) * 1000 + b"tail"
+KEY = "signing-key"
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hmac(key: str, data: bytes) -> str:
+    return hmac.new(key.encode(), data, hashlib.sha256).hexdigest()
+
+
+class TestIterChunks:
+    @pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, io.BytesIO])
+    def test_chunks_cover_source(self, wrap):
+        chunks = [bytes(chunk) for chunk in iter_chunks(wrap(DATA), chunk_size=4096)]
+        assert b"".join(chunks) == DATA
+        assert all(len(chunk) == 4096 for chunk in chunks[:-1])
+
+    def test_reader_without_readinto(self):
+        class Reader:
+            def __init__(self, data):
+                self._buffer = io.BytesIO(data)
+
+            def read(self, size):
+                return self._buffer.read(size)
+
+        assert b"".join(bytes(c) for c in iter_chunks(Reader(DATA), chunk_size=1000)) == DATA
+
+
+class TestStreamDigest:
+    @pytest.mark.parametrize("chunk_size", [1, 4096, len(DATA) + 1])
+    def test_bytesio_matches_hashlib(self, chunk_size):
+        digest = StreamDigest(KEY).consume(io.BytesIO(DATA), chunk_size)
+        assert (digest.size, digest.checksum, digest.signature) == (
+            len(DATA),
+            _sha256(DATA),
+            _hmac(KEY, DATA),
+        )
+
+    def test_mmap_matches_hashlib(self, tmp_path):
+        path = tmp_path / "rules"
+        path.write_bytes(DATA)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            assert hash_sha256_stream(mapped, 4096) == _sha256(DATA)
+            assert hmac_sha256_stream(KEY, mapped, 4096) == _hmac(KEY, DATA)
+
+    def test_digest_file(self, tmp_path):
+        path = tmp_path / "rules"
+        path.write_bytes(DATA)
+        digest = digest_file(path, KEY, chunk_size=4096)
+        assert (digest.size, digest.checksum, digest.signature) == (
+            len(DATA),
+            _sha256(DATA),
+            _hmac(KEY, DATA),
+        )
+        assert digest_file(path).signature is None
+
+    def test_digest_empty_file(self, tmp_path):
+        path = tmp_path / "empty"
+        path.write_bytes(b"")
+        digest = digest_file(path, KEY)
+        assert digest.size == 0
+        assert digest.checksum == _sha256(b"")
+        assert digest.signature == _hmac(KEY, b"")
+
+    @pytest.mark.parametrize("key", ["", b""])
+    def test_empty_key_signs(self, key):
+        assert hmac_sha256_stream(key, DATA) == hmac_sha256("", DATA)
+        assert verify_hmac_sha256_stream(key, DATA, hmac_sha256("", DATA))
+        assert not verify_hmac_sha256_stream(key, b"abc", "x")
+
+    def test_verify_rejects_wrong_signature(self):
+        assert verify_hmac_sha256_stream(KEY, io.BytesIO(DATA), _hmac(KEY, DATA))
+        assert not verify_hmac_sha256_stream(KEY, io.BytesIO(DATA), _hmac("other", DATA))
+
+
+class TestPackageRules:
+    @pytest.fixture
+    def store(self, tmp_path, monkeypatch):
+        store = rule_store.LocalRuleStore(str(tmp_path / "store"))
+        monkeypatch.setattr(rule_store, "_store", store)
+        return store
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_package_file_and_directory(self, tmp_path, store, workers):
+        rules_dir = tmp_path / "suricata"
+        (rules_dir / "sub").mkdir(parents=True)
+        (rules_dir / "a.rules").write_bytes(b"alert a")
+        (rules_dir / "sub" / "b.rules").write_bytes(b"alert b\n")
+        (rules_dir / "ignored.txt").write_bytes(b"not a rule")
+        host_rules = tmp_path / "host.rules"
+        host_rules.write_bytes(DATA)
+
+        packages = package_rules(
+            {"network": rules_dir, "host": host_rules}, signing_key=KEY, max_workers=workers
+        )
+
+        bundle = b"alert a\nalert b\n"
+        assert packages["network"]["checksum"] == _sha256(bundle)
+        assert packages["network"]["signature"] == _hmac(KEY, bundle)
+        assert packages["network"]["file_size"] == len(bundle)
+        assert packages["host"]["checksum"] == _sha256(DATA)
+        with store.open(packages["network"]["checksum"]) as f:
+            assert f.read() == bundle
+
+    def test_directory_without_rules(self, tmp_path, store):
+        (tmp_path / "empty").mkdir()
+        with pytest.raises(FileNotFoundError):
+            package_rules({"network": tmp_path / "empty"}, max_workers=1)
@@ -0,0 +1,68 @@
+"""
+数据库连接管理测试
+"""
+
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from common import database
+from common.database import ReplicaRouter
+
+
+def _router(replicas: int, check_interval: float = 10) -> ReplicaRouter:
+    primary = create_engine("sqlite://")
+    return ReplicaRouter(
+        sessionmaker(bind=primary),
+        [create_engine("sqlite://") for _ in range(replicas)],
+        max_lag=5,
+        check_interval=check_interval,
+    )
+
+
+class TestReplicaRouter:
+    def test_round_robin_over_healthy_replicas(self, monkeypatch):
+        router = _router(2)
+        monkeypatch.setattr(router, "_query_lag", lambda replica: 0.0)
+        binds = [router.session().get_bind() for _ in range(4)]
+        assert binds == router.replica_engines * 2
+
+    def test_lagging_replica_falls_back_to_primary(self, monkeypatch):
+        router = _router(1)
+        monkeypatch.setattr(router, "_query_lag", lambda replica: 30.0)
+        assert router.session().get_bind() is router.primary_factory.kw["bind"]
+
+    def test_lag_probe_does_not_block_other_sessions(self, monkeypatch):
+        router = _router(1)
+        probing = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_probe(replica):
+            calls.append(replica)
+            probing.set()
+            release.wait(5)
+            return 0.0
+
+        monkeypatch.setattr(router, "_query_lag", slow_probe)
+        worker = threading.Thread(target=router.session)
+        worker.start()
+        try:
+            assert probing.wait(5)
+            # 检测进行中：不重复检测，直接使用主库
+            assert router.session().get_bind() is router.primary_factory.kw["bind"]
+            assert len(calls) == 1
+        finally:
+            release.set()
+            worker.join(5)
+        assert router.session().get_bind() is router.replica_engines[0]
+
+
+def test_get_clickhouse_without_backend(monkeypatch):
+    monkeypatch.setattr(database, "clickhouse_pool", None)
+    monkeypatch.setattr(database, "_lazy_backends", set())
+    with pytest.raises(database.BackendUnavailableError):
+        with database.get_clickhouse():
+            pass
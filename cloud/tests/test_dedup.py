@@ -0,0 +1,57 @@
+"""
+日志去重测试
+"""
+
+import pytest
+
+from common import database
+from common.dedup import LogDeduplicator
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(database, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def dedup():
+    return LogDeduplicator(window_seconds=60, windows=2, expected_items=1000, fp_rate=0.001)
+
+
+class TestLogDeduplicator:
+    def test_check_does_not_record(self, redis_client, dedup):
+        assert dedup.check(["a", "b"], vin="V1", now=1000) == []
+        # 写入失败未commit，重传不算重复
+        assert dedup.check(["a", "b"], vin="V1", now=1000) == []
+        assert redis_client.keys("log:dedup:*") == []
+
+    def test_commit_after_write(self, redis_client, dedup):
+        assert dedup.check(["a", "b"], vin="V1", now=1000) == []
+        assert dedup.commit(["a", "b"], vin="V1", now=1000)
+        assert dedup.check(["c", "a", "b"], vin="V1", now=1000) == [1, 2]
+
+    def test_duplicates_within_batch(self, redis_client, dedup):
+        assert dedup.check(["a", "b", "a", "a"], vin="V1", now=1000) == [2, 3]
+
+    def test_scope_by_vin_and_log_type(self, redis_client, dedup):
+        dedup.commit(["a"], vin="V1", log_type="network", now=1000)
+        assert dedup.check(["a"], vin="V2", log_type="network", now=1000) == []
+        assert dedup.check(["a"], vin="V1", log_type="host", now=1000) == []
+        assert dedup.check(["a"], vin="V1", log_type="network", now=1000) == [0]
+
+    def test_windows_rotate(self, redis_client, dedup):
+        dedup.commit(["a"], vin="V1", now=1000)
+        assert dedup.check(["a"], vin="V1", now=1060) == [0]
+        assert dedup.check(["a"], vin="V1", now=1120) == []
+
+    def test_redis_unavailable(self, monkeypatch, dedup):
+        def unavailable():
+            raise database.BackendUnavailableError("redis down")
+
+        monkeypatch.setattr(database, "get_redis_client", unavailable)
+        assert dedup.check(["a", "a"], vin="V1") == [1]
+        assert dedup.commit(["a"], vin="V1") is False
@@ -0,0 +1,126 @@
+"""
+心跳写入合并测试
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from common import database
+from common.heartbeat import DIRTY_KEY, LATEST_KEY, HeartbeatAggregator, merge_heartbeats
+
+fakeredis = pytest.importorskip("fakeredis")
+
+T0 = datetime(2024, 1, 14, 12, 0, 0).timestamp()
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(database, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE vehicles (vin TEXT PRIMARY KEY, last_heartbeat_at TIMESTAMP, "
+            "last_ip TEXT)"
+        )
+        conn.exec_driver_sql("INSERT INTO vehicles (vin) VALUES ('V1'), ('V2'), ('V3')")
+    monkeypatch.setattr(database, "get_engine", lambda: engine)
+    return engine
+
+
+@pytest.fixture
+def aggregator():
+    return HeartbeatAggregator(flush_interval=60, batch_size=2)
+
+
+def _vehicles(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT vin, last_heartbeat_at, last_ip FROM vehicles"))
+        return {vin: (datetime.fromisoformat(at) if at else None, ip) for vin, at, ip in rows}
+
+
+class TestRecord:
+    def test_newer_heartbeat_replaces_older(self, redis_client, aggregator):
+        assert aggregator.record("V1", "10.0.0.1", T0)
+        assert aggregator.record("V1", "10.0.0.2", T0 + 1)
+        assert redis_client.hget(LATEST_KEY, "V1") == f"{T0 + 1:.3f}|10.0.0.2"
+        assert redis_client.smembers(DIRTY_KEY) == {"V1"}
+
+    def test_out_of_order_heartbeat_ignored(self, redis_client, aggregator):
+        assert aggregator.record("V1", "10.0.0.2", T0 + 1)
+        redis_client.delete(DIRTY_KEY)
+        assert not aggregator.record("V1", "10.0.0.1", T0)
+        assert redis_client.hget(LATEST_KEY, "V1") == f"{T0 + 1:.3f}|10.0.0.2"
+        assert redis_client.scard(DIRTY_KEY) == 0
+
+    def test_without_redis_writes_mysql(self, monkeypatch, engine, aggregator):
+        monkeypatch.setattr(database, "redis_client", None)
+        monkeypatch.setattr(database, "_lazy_backends", set())
+        assert aggregator.record("V1", "10.0.0.1", T0)
+        assert _vehicles(engine)["V1"] == (datetime.fromtimestamp(T0), "10.0.0.1")
+
+
+class TestFlush:
+    def test_flush_writes_all_dirty_vins(self, redis_client, engine, aggregator):
+        for i, vin in enumerate(["V1", "V2", "V3"]):
+            aggregator.record(vin, f"10.0.0.{i}", T0 + i)
+
+        assert aggregator.flush() == 3
+        assert aggregator.stats["batches"] == 2
+        assert redis_client.scard(DIRTY_KEY) == 0
+        assert _vehicles(engine) == {
+            vin: (datetime.fromtimestamp(T0 + i), f"10.0.0.{i}")
+            for i, vin in enumerate(["V1", "V2", "V3"])
+        }
+        assert aggregator.flush() == 0
+
+    def test_failed_flush_restores_dirty_set(self, redis_client, monkeypatch, aggregator):
+        def broken_engine():
+            raise database.BackendUnavailableError("mysql unavailable")
+
+        monkeypatch.setattr(database, "get_engine", broken_engine)
+        aggregator.record("V1", "10.0.0.1", T0)
+
+        with pytest.raises(database.BackendUnavailableError):
+            aggregator.flush()
+        assert redis_client.smembers(DIRTY_KEY) == {"V1"}
+        assert aggregator.stats["flush_errors"] == 1
+
+
+class TestMergeHeartbeats:
+    def test_newer_redis_heartbeat_wins(self, redis_client, aggregator):
+        now = datetime.now().replace(microsecond=0)
+        aggregator.record("V1", "10.0.0.9", now.timestamp())
+        aggregator.record("V2", "10.0.0.8", (now - timedelta(hours=2)).timestamp())
+        vehicles = [
+            {"vin": "V1", "last_heartbeat_at": (now - timedelta(hours=1)).isoformat()},
+            {"vin": "V2", "last_heartbeat_at": now - timedelta(hours=1), "last_ip": "10.0.0.1"},
+            {"vin": "V3", "last_heartbeat_at": None},
+        ]
+
+        merge_heartbeats(vehicles)
+
+        assert (vehicles[0]["last_heartbeat_at"], vehicles[0]["last_ip"]) == (now, "10.0.0.9")
+        assert vehicles[0]["online"] is True
+        assert vehicles[1]["last_ip"] == "10.0.0.1"
+        assert vehicles[1]["online"] is False
+        assert vehicles[2]["online"] is False
+
+    def test_redis_unavailable_uses_mysql_values(self, monkeypatch):
+        def unavailable():
+            raise database.BackendUnavailableError("redis unavailable")
+
+        monkeypatch.setattr(database, "get_redis_client", unavailable)
+        now = datetime.now()
+        vehicles = merge_heartbeats([{"vin": "V1", "last_heartbeat_at": now}])
+        assert vehicles == [{"vin": "V1", "last_heartbeat_at": now, "online": True}]
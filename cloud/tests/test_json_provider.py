@@ -0,0 +1,89 @@
+"""
+JSON provider测试
+"""
+
+import decimal
+import ipaddress
+import json
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+from flask import Flask
+from werkzeug import http
+
+from common.utils import json_provider
+from common.utils.json_provider import FastJSONProvider, http_date, init_json_provider
+
+PAYLOAD = {
+    "timestamp": datetime(2024, 1, 14, 12, 0, 0, 123000),
+    "date": date(2024, 1, 14),
+    "score": decimal.Decimal("1.10"),
+    "id": uuid.UUID(int=1),
+    "list": [1, "二", None],
+}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def app(request, monkeypatch):
+    if request.param == "orjson":
+        if json_provider.orjson is None:
+            pytest.skip("orjson not installed")
+    else:
+        monkeypatch.setattr(json_provider, "orjson", None)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def test_matches_flask_default_provider(app):
+    default_app = Flask("default")
+    with default_app.app_context():
+        expected = json.loads(default_app.json.dumps(PAYLOAD))
+    with app.app_context():
+        assert json.loads(app.json.dumps(PAYLOAD)) == expected
+    assert expected["timestamp"] == "Sun, 14 Jan 2024 12:00:00 GMT"
+
+
+def test_ip_address_and_non_ascii(app):
+    payload = {"ip": ipaddress.IPv4Address("10.0.0.1"), "msg": "告警"}
+    with app.app_context():
+        body = app.json.response(payload).get_data()
+    assert json.loads(body) == {"ip": "10.0.0.1", "msg": "告警"}
+    assert "告警".encode() in body
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        datetime(2024, 1, 14, 12, 0, 0, 999999),
+        datetime(2024, 2, 29, 23, 59, 59),
+        datetime(2024, 1, 1, 1, 30, tzinfo=timezone(timedelta(hours=8))),
+        date(1999, 12, 31),
+    ],
+)
+def test_http_date_matches_werkzeug(value):
+    assert http_date(value) == http.http_date(value)
+
+
+def test_iso_format(app):
+    app.json.datetime_format = "iso"
+    payload = {
+        "naive": datetime(2024, 1, 14, 12, 0, 0, 123000),
+        "aware": datetime(2024, 1, 14, 20, 0, tzinfo=timezone(timedelta(hours=8))),
+        "date": date(2024, 1, 14),
+        "time": time(12, 0, 0, 123000),
+    }
+    with app.app_context():
+        assert json.loads(app.json.dumps(payload)) == {
+            "naive": "2024-01-14T12:00:00.123000+00:00",
+            "aware": "2024-01-14T20:00:00+08:00",
+            "date": "2024-01-14",
+            "time": "12:00:00.123000",
+        }
+
+
+def test_init_rejects_unknown_datetime_format():
+    with pytest.raises(ValueError):
+        init_json_provider(Flask(__name__), datetime_format="rfc822")
+    assert init_json_provider(Flask(__name__), datetime_format="ISO").datetime_format == "iso"
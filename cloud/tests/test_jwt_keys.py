@@ -0,0 +1,42 @@
+"""
+JWT密钥集合测试
+"""
+
+import pytest
+
+from common.middleware.jwt_keys import KeyNotFoundError, KeySet, generate_key_pair
+
+
+class TestKeySet:
+    def test_unknown_kid_reload_is_rate_limited(self, tmp_path, monkeypatch):
+        keys = KeySet(str(tmp_path), reload_interval=60, force_reload_cooldown=5)
+        reloads = []
+        reload = keys.reload
+
+        def counting_reload():
+            reloads.append(1)
+            reload()
+
+        monkeypatch.setattr(keys, "reload", counting_reload)
+
+        for _ in range(10):
+            with pytest.raises(KeyNotFoundError):
+                keys.verification_key("forged")
+        assert len(reloads) == 1
+
+    def test_new_kid_found_after_cooldown(self, tmp_path, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("common.middleware.jwt_keys.time.time", lambda: now[0])
+        keys = KeySet(str(tmp_path), reload_interval=60, force_reload_cooldown=5)
+
+        with pytest.raises(KeyNotFoundError):
+            keys.verification_key("k2")
+
+        generate_key_pair(str(tmp_path), "k2", "EdDSA")
+        now[0] += 1
+        with pytest.raises(KeyNotFoundError):
+            keys.verification_key("k2")
+
+        now[0] += 5
+        algorithm, _ = keys.verification_key("k2")
+        assert algorithm == "EdDSA"
@@ -0,0 +1,99 @@
+"""
+日志查询总数测试
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from clickhouse_driver import errors
+
+from common import database, log_count
+from common.cache import QueryCache
+
+
+class FakeClient:
+    def __init__(self, explain_error=None, rows=(("rows", 1200),), count=1000):
+        self.explain_error = explain_error
+        self.rows = rows
+        self.count = count
+        self.queries = []
+
+    def execute(self, query, params=None, with_column_types=False):
+        self.queries.append(query.split()[0] + " " + query.split()[1])
+        if query.startswith("EXPLAIN ESTIMATE"):
+            if self.explain_error is not None:
+                raise self.explain_error
+            return [(self.rows[0][1],)], [(self.rows[0][0], "UInt64")]
+        if "system.parts" in query:
+            return [(5000,)]
+        return [(self.count,)]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(database, "redis_client", None)
+    cache = QueryCache()
+    monkeypatch.setattr(log_count, "query_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def use_client(monkeypatch):
+    def install(client):
+        @contextmanager
+        def get_clickhouse():
+            if isinstance(client, Exception):
+                raise client
+            yield client
+
+        monkeypatch.setattr(database, "get_clickhouse", get_clickhouse)
+        return client
+
+    return install
+
+
+class TestCountLogs:
+    def test_estimate_without_filter_uses_parts(self, cache, use_client):
+        client = use_client(FakeClient())
+        assert log_count.count_logs("firewall_logs") == (5000, True)
+        assert client.queries == ["SELECT sum(rows)"]
+
+    def test_estimate_with_filter_uses_explain(self, cache, use_client):
+        use_client(FakeClient())
+        assert log_count.count_logs("firewall_logs", "vin = %(vin)s", {"vin": "V1"}) == (
+            1200,
+            True,
+        )
+
+    def test_auto_prefers_cached_exact_count(self, cache, use_client):
+        client = use_client(FakeClient())
+        where, params = "vin = %(vin)s", {"vin": "V1"}
+        assert log_count.count_logs("firewall_logs", where, params, mode="exact") == (1000, False)
+        assert log_count.count_logs("firewall_logs", where, params) == (1000, False)
+        assert client.queries == ["SELECT count()"]
+
+    def test_server_error_falls_back_to_exact(self, cache, use_client):
+        error = errors.ServerException("Syntax error", code=errors.ErrorCodes.SYNTAX_ERROR)
+        use_client(FakeClient(explain_error=error))
+        assert log_count.count_logs("firewall_logs", "vin = %(vin)s", {"vin": "V1"}) == (
+            1000,
+            False,
+        )
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            errors.NetworkError("Connection refused"),
+            database.BackendUnavailableError("clickhouse unavailable"),
+        ],
+    )
+    def test_connection_error_does_not_run_exact_count(self, cache, use_client, error):
+        client = FakeClient(explain_error=error)
+        use_client(error if isinstance(error, database.BackendUnavailableError) else client)
+        with pytest.raises(type(error)):
+            log_count.count_logs("firewall_logs", "vin = %(vin)s", {"vin": "V1"})
+        assert "SELECT count()" not in client.queries
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            log_count.count_logs("firewall_logs", mode="sample")
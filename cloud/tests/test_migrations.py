@@ -0,0 +1,222 @@
+"""
+数据库迁移测试
+"""
+
+import pytest
+
+from common.migrations import (
+    STATUS_DONE,
+    ClickHouseBackend,
+    MigrationError,
+    Migrator,
+    load_migrations,
+    split_sql,
+)
+
+
+class FakeBackend:
+    """记录台账和已执行语句的内存后端"""
+
+    hash_comments = True
+
+    def __init__(self):
+        self.ledger = {}
+        self.executed = []
+
+    def ensure_ledger(self):
+        pass
+
+    def applied(self):
+        return dict(self.ledger)
+
+    def record(self, migration, status, statements_done, error=None):
+        self.ledger[migration.version] = {
+            "version": migration.version,
+            "name": migration.name,
+            "checksum": migration.checksum,
+            "status": status,
+            "statements_done": statements_done,
+            "error": error,
+        }
+
+    def execute(self, statement):
+        self.executed.append(statement)
+
+    def close(self):
+        pass
+
+
+class FakeClickHouse:
+    """模拟system.mutations的ClickHouse客户端，ALTER提交一个新mutation"""
+
+    COLUMNS = [
+        ("mutation_id", "String"),
+        ("command", "String"),
+        ("parts_to_do", "Int64"),
+        ("latest_fail_reason", "String"),
+    ]
+
+    def __init__(self, mutations=None):
+        self.mutations = mutations or []
+        self.statements = []
+
+    def execute(self, query, params=None, with_column_types=False, settings=None):
+        if "system.mutations" in query:
+            rows = [
+                (m["mutation_id"], m["command"], m["parts_to_do"], m["latest_fail_reason"])
+                for m in self.mutations
+                if not m["is_done"]
+            ]
+            return rows, self.COLUMNS
+        self.statements.append(query)
+        self.mutations.append(
+            {
+                "mutation_id": f"mutation_{len(self.mutations) + 1}.txt",
+                "command": query.split(" ", 3)[3],
+                "parts_to_do": 1,
+                "latest_fail_reason": "",
+                "is_done": False,
+            }
+        )
+
+
+def _mutation(mutation_id, command, fail_reason=""):
+    return {
+        "mutation_id": mutation_id,
+        "command": command,
+        "parts_to_do": 3,
+        "latest_fail_reason": fail_reason,
+        "is_done": False,
+    }
+
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    (tmp_path / "01-init.sql").write_text("CREATE TABLE a (id INT);\nCREATE TABLE b (id INT);\n")
+    (tmp_path / "02-index.sql").write_text("ALTER TABLE a ADD INDEX idx_id (id);\n")
+    (tmp_path / "03-view.sql").write_text("CREATE VIEW v AS SELECT id FROM a;\n")
+    return tmp_path
+
+
+class TestSplitSql:
+    def test_splits_statements(self):
+        assert split_sql("SELECT 1; SELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+    def test_ignores_semicolons_in_strings_and_identifiers(self):
+        sql = "INSERT INTO t VALUES ('a;b', \"c;d\"); SELECT `x;y` FROM t"
+        assert split_sql(sql) == ["INSERT INTO t VALUES ('a;b', \"c;d\")", "SELECT `x;y` FROM t"]
+
+    def test_escaped_quotes(self):
+        sql = "SELECT 'it''s; fine'; SELECT 'back\\'slash;'"
+        assert split_sql(sql) == ["SELECT 'it''s; fine'", "SELECT 'back\\'slash;'"]
+
+    def test_strips_comments(self):
+        sql = "-- a; comment\nSELECT 1 /* b; */ + 1;\n# c;\nSELECT 2"
+        assert split_sql(sql, hash_comments=True) == ["SELECT 1   + 1", "SELECT 2"]
+
+    def test_hash_is_not_comment_by_default(self):
+        assert split_sql("SELECT 1 # 2") == ["SELECT 1 # 2"]
+
+    def test_unterminated_string(self):
+        with pytest.raises(MigrationError):
+            split_sql("SELECT 'abc")
+
+    def test_unterminated_block_comment(self):
+        with pytest.raises(MigrationError):
+            split_sql("SELECT 1 /* abc")
+
+
+class TestBaseline:
+    def test_marks_only_up_to_target(self, migrations_dir):
+        backend = FakeBackend()
+        migrator = Migrator(backend, migrations_dir)
+
+        assert migrator.baseline("01") == ["01"]
+        assert backend.ledger["01"]["status"] == STATUS_DONE
+        assert backend.ledger["01"]["statements_done"] == 2
+        assert backend.executed == []
+
+        assert migrator.migrate() == ["02", "03"]
+        assert backend.executed == [
+            "ALTER TABLE a ADD INDEX idx_id (id)",
+            "CREATE VIEW v AS SELECT id FROM a",
+        ]
+
+    def test_skips_recorded_migrations(self, migrations_dir):
+        backend = FakeBackend()
+        migrator = Migrator(backend, migrations_dir)
+        migrator.migrate(target="01")
+
+        assert migrator.baseline("02") == ["02"]
+        assert migrator.migrate() == ["03"]
+
+    def test_unknown_target(self, migrations_dir):
+        backend = FakeBackend()
+        with pytest.raises(MigrationError):
+            Migrator(backend, migrations_dir).baseline("09")
+        assert backend.ledger == {}
+
+
+class TestVersionOrder:
+    def test_sorts_numerically(self, tmp_path):
+        for name in ("10-late.sql", "9-early.sql", "01-init.sql"):
+            (tmp_path / name).write_text("SELECT 1;\n")
+        assert [m.version for m in load_migrations(tmp_path)] == ["01", "9", "10"]
+
+    def test_target_is_numeric(self, tmp_path):
+        for name in ("9-early.sql", "10-late.sql"):
+            (tmp_path / name).write_text("SELECT 1;\n")
+        backend = FakeBackend()
+        assert Migrator(backend, tmp_path).migrate(target="9") == ["9"]
+        assert Migrator(backend, tmp_path).baseline("10") == ["10"]
+
+    def test_padded_duplicates(self, tmp_path):
+        (tmp_path / "01-a.sql").write_text("SELECT 1;\n")
+        (tmp_path / "1-b.sql").write_text("SELECT 1;\n")
+        with pytest.raises(MigrationError):
+            load_migrations(tmp_path)
+
+    def test_non_numeric_version(self, tmp_path):
+        (tmp_path / "init.sql").write_text("SELECT 1;\n")
+        with pytest.raises(MigrationError):
+            load_migrations(tmp_path)
+
+
+class TestClickHouseMutations:
+    def _backend(self, client, polls):
+        def sleep(_):
+            polls.append(1)
+            if len(polls) == 2:
+                client.mutations[-1]["is_done"] = True
+
+        return ClickHouseBackend(client, database="db", poll_interval=0, sleep=sleep)
+
+    def test_waits_only_for_submitted_mutation(self):
+        client = FakeClickHouse([_mutation("mutation_0.txt", "UPDATE x = 1 WHERE 1")])
+        polls = []
+        self._backend(client, polls).execute("ALTER TABLE t DELETE WHERE id = 1")
+        assert len(polls) == 2
+        assert client.mutations[0]["is_done"] is False
+
+    def test_ignores_foreign_failed_mutation(self):
+        failed = _mutation("mutation_0.txt", "DELETE WHERE 1", fail_reason="Memory limit")
+        client = FakeClickHouse([failed])
+        self._backend(client, []).execute("ALTER TABLE t DELETE WHERE id = 1")
+
+    def test_own_failed_mutation_raises(self):
+        client = FakeClickHouse()
+        backend = ClickHouseBackend(client, database="db", poll_interval=0, sleep=lambda _: None)
+
+        def fail(_):
+            client.mutations[-1]["latest_fail_reason"] = "Memory limit"
+
+        backend.sleep = fail
+        with pytest.raises(MigrationError):
+            backend.execute("ALTER TABLE t DELETE WHERE id = 1")
+
+    def test_resumes_running_materialize(self):
+        client = FakeClickHouse([_mutation("mutation_5.txt", "MATERIALIZE INDEX idx_vin")])
+        polls = []
+        self._backend(client, polls).execute("ALTER TABLE t MATERIALIZE INDEX idx_vin")
+        assert client.statements == []
+        assert client.mutations[0]["is_done"] is True
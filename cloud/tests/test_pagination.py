@@ -0,0 +1,84 @@
+"""
+游标分页测试
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from common.utils.pagination import (
+    InvalidCursorError,
+    KeysetPagination,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+@pytest.fixture
+def paging():
+    return KeysetPagination(
+        ["vin", "timestamp", ("cityHash64(raw_log)", "_row_key")], descending=True
+    )
+
+
+class TestCursor:
+    def test_round_trip(self):
+        values = ["V1", datetime(2024, 1, 14, 12, 0, 0, 123000), date(2024, 1, 14), 2**63, None]
+        cursor = encode_cursor(values, scope="s")
+        assert "=" not in cursor
+        assert decode_cursor(cursor, scope="s") == values
+
+    def test_scope_mismatch(self):
+        cursor = encode_cursor(["V1"], scope="a")
+        with pytest.raises(InvalidCursorError, match="does not match"):
+            decode_cursor(cursor, scope="b")
+
+    @pytest.mark.parametrize("cursor", ["!!!", "bm90LWpzb24", encode_cursor(["V1"])[:-3]])
+    def test_malformed(self, cursor):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor)
+
+
+class TestKeysetPagination:
+    def test_first_page_has_no_condition(self, paging):
+        assert paging.where(None) == ("1", {})
+
+    def test_where_from_cursor(self, paging):
+        ts = datetime(2024, 1, 14, 12, 0, 0, 123000)
+        cursor = encode_cursor(["V1", ts, 42], paging.scope)
+        where, params = paging.where(cursor)
+        assert where == (
+            "((vin < %(_cursor_0)s) OR (vin = %(_cursor_0)s AND timestamp < %(_cursor_1)s) OR "
+            "(vin = %(_cursor_0)s AND timestamp = %(_cursor_1)s "
+            "AND cityHash64(raw_log) < %(_cursor_2)s))"
+        )
+        assert params == {
+            "_cursor_0": "V1",
+            "_cursor_1": "2024-01-14 12:00:00.123",
+            "_cursor_2": 42,
+        }
+
+    def test_cursor_from_other_sort_rejected(self, paging):
+        other = KeysetPagination(["vin", "timestamp"], descending=True)
+        _, cursor = other.page([{"vin": "V1", "timestamp": 1}, {"vin": "V1", "timestamp": 0}], 1)
+        with pytest.raises(InvalidCursorError):
+            paging.where(cursor)
+
+    def test_page_round_trip(self, paging):
+        rows = [
+            {
+                "vin": "V1",
+                "timestamp": datetime(2024, 1, 14, 12, 0, i),
+                "_row_key": i,
+                "msg": str(i),
+            }
+            for i in range(3, 0, -1)
+        ]
+        items, cursor = paging.page(rows, 2)
+        assert items == [{key: row[key] for key in ("vin", "timestamp", "msg")} for row in rows[:2]]
+        _, params = paging.where(cursor)
+        assert params == {"_cursor_0": "V1", "_cursor_1": "2024-01-14 12:00:02.000", "_cursor_2": 2}
+
+    def test_last_page_has_no_cursor(self, paging):
+        rows = [{"vin": "V1", "timestamp": datetime(2024, 1, 14), "_row_key": 1}]
+        assert paging.page(rows, 2)[1] is None
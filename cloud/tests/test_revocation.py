@@ -0,0 +1,61 @@
+"""
+Token撤销检查测试
+"""
+
+import pytest
+import redis
+
+from common import database
+from common.middleware import revocation
+
+
+def _unavailable():
+    raise database.BackendUnavailableError("redis unavailable: connection refused")
+
+
+class BrokenRedis:
+    def mget(self, keys):
+        raise redis.ConnectionError("connection reset")
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = revocation.RevocationStore()
+    monkeypatch.setattr(revocation, "revocation_store", store)
+    return store
+
+
+class TestAreRevoked:
+    def test_backend_unavailable_uses_local_set(self, monkeypatch, store):
+        monkeypatch.setattr(database, "get_redis_client", _unavailable)
+        store.add(revocation.revocation_id("revoked"), expires_at=2**40)
+        items = [({"jti": "revoked"}, None), ({"jti": "valid"}, None)]
+        assert revocation.are_revoked(items) == [True, False]
+
+    def test_redis_error_uses_local_set(self, monkeypatch, store):
+        monkeypatch.setattr(store, "start", lambda client=None: False)
+        monkeypatch.setattr(database, "get_redis_client", lambda: BrokenRedis())
+        assert revocation.are_revoked([({"jti": "x", "iat": 1}, None)]) == [False]
+
+
+class FakeRedis:
+    def __init__(self, values):
+        self.values = values
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+class TestSubjectRevocation:
+    def test_token_issued_in_revocation_second_is_revoked(self, store):
+        store.add_subject(revocation.subject_key("vin", "V1"), 1000, expires_at=2**40)
+        assert store.is_payload_revoked({"vin": "V1", "iat": 999})
+        assert store.is_payload_revoked({"vin": "V1", "iat": 1000})
+        assert not store.is_payload_revoked({"vin": "V1", "iat": 1001})
+
+    def test_redis_lookup_uses_same_boundary(self, monkeypatch, store):
+        monkeypatch.setattr(store, "start", lambda client=None: False)
+        key = f"{revocation.NOT_BEFORE_KEY_PREFIX}{revocation.subject_key('vin', 'V1')}"
+        monkeypatch.setattr(database, "get_redis_client", lambda: FakeRedis({key: "1000"}))
+        items = [({"vin": "V1", "iat": iat}, None) for iat in (999, 1000, 1001)]
+        assert revocation.are_revoked(items) == [True, True, False]
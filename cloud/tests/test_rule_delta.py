@@ -0,0 +1,95 @@
+"""
+规则增量测试
+"""
+
+import pytest
+
+from common.rule_delta import DeltaError, apply_delta, make_delta
+
+BASE = b"".join(b"alert tcp any any -> any %d (sid:%d;)\n" % (port, port) for port in range(100))
+
+
+@pytest.mark.parametrize(
+    "target",
+    [
+        BASE,
+        BASE.replace(b"sid:42;", b"sid:42; rev:2;"),
+        BASE + b"alert udp any any -> any 53 (sid:9000;)\n",
+        b"".join(BASE.splitlines(keepends=True)[10:]),
+        BASE.rstrip(b"\n"),
+        b"",
+    ],
+    ids=["unchanged", "modified", "appended", "removed", "no-trailing-newline", "empty"],
+)
+def test_round_trip(target):
+    assert apply_delta(BASE, make_delta(BASE, target)) == target
+
+
+def test_small_change_gives_small_delta():
+    target = BASE.replace(b"sid:42;", b"sid:42; rev:2;")
+    assert len(make_delta(BASE, target)) < len(target) // 10
+
+
+def test_round_trip_from_empty_base():
+    assert apply_delta(b"", make_delta(b"", BASE)) == BASE
+
+
+@pytest.mark.parametrize(
+    "delta",
+    [b"", b"IDPSDELTA/1 abc\n", b"IDPSDELTA/2 a b 0\n", b"no header newline"],
+    ids=["empty", "short", "wrong-magic", "no-newline"],
+)
+def test_bad_header(delta):
+    with pytest.raises(DeltaError, match="header"):
+        apply_delta(BASE, delta)
+
+
+def test_wrong_base():
+    delta = make_delta(BASE, BASE + b"extra\n")
+    with pytest.raises(DeltaError, match="base version"):
+        apply_delta(BASE + b"other\n", delta)
+
+
+def test_checksum_mismatch():
+    target = BASE + b"extra\n"
+    delta = make_delta(BASE, target)
+    tampered = delta.replace(b"extra", b"EXTRA")
+    with pytest.raises(DeltaError, match="checksum"):
+        apply_delta(BASE, tampered)
+
+
+def test_unknown_operation():
+    header = make_delta(BASE, BASE).split(b"\n", 1)[0]
+    with pytest.raises(DeltaError, match="Unknown delta operation"):
+        apply_delta(BASE, header + b"\nX 1\n")
+
+
+def _header(target=BASE):
+    return make_delta(BASE, target).split(b"\n", 1)[0] + b"\n"
+
+
+@pytest.mark.parametrize(
+    "ops",
+    [b"C x\n", b"C\n", b"C -1\n", b"A 1.5\nx"],
+    ids=["non-numeric", "missing", "negative", "fraction"],
+)
+def test_malformed_operation(ops):
+    with pytest.raises(DeltaError, match="Invalid delta operation"):
+        apply_delta(BASE, _header() + ops)
+
+
+@pytest.mark.parametrize("op", [b"C", b"S"])
+def test_count_past_end_of_base(op):
+    with pytest.raises(DeltaError, match="past the end of the base"):
+        apply_delta(BASE, _header() + op + b" 101\n")
+
+
+def test_append_past_end_of_delta():
+    with pytest.raises(DeltaError, match="Truncated"):
+        apply_delta(BASE, _header() + b"C 100\nA 10\nshort")
+
+
+def test_invalid_target_size_in_header():
+    header = _header().replace(b" %d\n" % len(BASE), b" big\n")
+    with pytest.raises(DeltaError, match="header"):
+        apply_delta(BASE, header + b"C 100\n")
@@ -0,0 +1,98 @@
+"""
+规则分批下发测试
+"""
+
+import threading
+
+import pytest
+
+from common import database, rule_deployment
+from common.rule_deployment import ADMITTED, CONCURRENCY_LIMITED, NOT_RELEASED
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(database, "redis_client", client)
+    return client
+
+
+def _vin_in_bucket(predicate):
+    for i in range(100000):
+        vin = f"LSGTEST{i:010d}"
+        if predicate(rule_deployment.vin_bucket(vin)):
+            return vin
+    raise AssertionError("no VIN found")
+
+
+class TestReleaseWave:
+    def test_percent_only_increases(self):
+        rule_deployment.start_rollout(1, percent=10, concurrency=0)
+        assert rule_deployment.release_wave(1, percent=5)["percent"] == 10
+        assert rule_deployment.release_wave(1, percent=25.5)["percent"] == 25.5
+
+    def test_cohorts_appended_without_duplicates(self):
+        rule_deployment.start_rollout(1, cohorts=["canary"])
+        rule_deployment.release_wave(1, cohorts=["fleet-a", "canary"])
+        plan = rule_deployment.release_wave(1, cohorts=["fleet-b"], concurrency=20)
+        assert plan["cohorts"] == ["canary", "fleet-a", "fleet-b"]
+        assert plan["concurrency"] == 20
+        assert plan["percent"] == 0
+
+    def test_concurrent_waves_do_not_overwrite_each_other(self):
+        rule_deployment.start_rollout(1, percent=0)
+        threads = [
+            threading.Thread(
+                target=rule_deployment.release_wave, args=(1,), kwargs={"cohorts": [f"c{i}"]}
+            )
+            for i in range(20)
+        ] + [
+            threading.Thread(target=rule_deployment.release_wave, args=(1,), kwargs={"percent": 50})
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        plan = rule_deployment.get_rollout(1)
+        assert sorted(plan["cohorts"]) == sorted(f"c{i}" for i in range(20))
+        assert plan["percent"] == 50
+
+    def test_missing_plan(self):
+        with pytest.raises(ValueError):
+            rule_deployment.release_wave(99, percent=10)
+
+    def test_invalid_percent(self):
+        rule_deployment.start_rollout(1)
+        with pytest.raises(ValueError):
+            rule_deployment.release_wave(1, percent=101)
+
+
+class TestAdmitDownload:
+    def test_percent_and_cohorts(self):
+        inside = _vin_in_bucket(lambda bucket: bucket < 1000)
+        outside = _vin_in_bucket(lambda bucket: bucket >= 1000)
+        rule_deployment.start_rollout(1, percent=10, concurrency=0)
+
+        assert rule_deployment.admit_download(1, inside) == ADMITTED
+        assert rule_deployment.admit_download(1, outside) == NOT_RELEASED
+
+        rule_deployment.define_cohort("canary", [outside])
+        rule_deployment.release_wave(1, cohorts=["canary"])
+        assert rule_deployment.admit_download(1, outside) == ADMITTED
+
+    def test_concurrency_limit(self):
+        rule_deployment.start_rollout(1, percent=100, concurrency=2)
+        assert rule_deployment.admit_download(1, "VIN1") == ADMITTED
+        assert rule_deployment.admit_download(1, "VIN2") == ADMITTED
+        assert rule_deployment.admit_download(1, "VIN3") == CONCURRENCY_LIMITED
+        # 已占用名额的VIN只续租
+        assert rule_deployment.admit_download(1, "VIN1") == ADMITTED
+
+        rule_deployment.release_download_slot(1, "VIN1")
+        assert rule_deployment.admit_download(1, "VIN3") == ADMITTED
+
+    def test_without_plan_fully_released(self):
+        assert rule_deployment.admit_download(2, "VIN1") == ADMITTED
@@ -0,0 +1,165 @@
+"""
+规则文件存储测试
+"""
+
+import hashlib
+import io
+
+import pytest
+from flask import Flask
+
+from common import rule_store
+from common.rule_store import (
+    ChecksumMismatchError,
+    LocalRuleStore,
+    MinioRuleStore,
+    object_key,
+    send_rule_file,
+)
+
+DATA = b"".join(b"alert tcp any any -> any any (sid:%d;)\n" % sid for sid in range(1000))
+CHECKSUM = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def local_store(tmp_path, monkeypatch):
+    store = LocalRuleStore(str(tmp_path))
+    monkeypatch.setattr(rule_store, "_store", store)
+    return store
+
+
+class FakeObject:
+    def __init__(self, data: bytes):
+        self._data = data
+        self.closed = False
+
+    def stream(self, chunk_size):
+        for start in range(0, len(self._data), chunk_size):
+            yield self._data[start : start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    """只实现send用到的get_object"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.requests = []
+
+    def get_object(self, bucket, name, offset=0, length=0):
+        self.requests.append((name, offset, length))
+        data = self.objects[name]
+        return FakeObject(data[offset : offset + length] if length else data[offset:])
+
+
+@pytest.fixture
+def minio_store(monkeypatch):
+    store = MinioRuleStore.__new__(MinioRuleStore)
+    store.bucket = "rules"
+    store.prefix = "rules/"
+    store.client = FakeMinio({"rules/" + object_key(CHECKSUM): DATA})
+    monkeypatch.setattr(store, "size", lambda checksum: len(DATA))
+    monkeypatch.setattr(rule_store, "_store", store)
+    return store
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/rules/<checksum>")
+    def download(checksum):
+        return send_rule_file(checksum, "network.rules", signature="sig")
+
+    return app.test_client()
+
+
+class TestLocalRuleStore:
+    def test_put_deduplicates(self, local_store):
+        first = local_store.put(io.BytesIO(DATA))
+        second = local_store.put(DATA, expected_checksum=f"sha256:{CHECKSUM}")
+
+        assert (first.checksum, first.size, first.created) == (CHECKSUM, len(DATA), True)
+        assert (second.checksum, second.created) == (CHECKSUM, False)
+        assert first.key == f"{CHECKSUM[:2]}/{CHECKSUM[2:4]}/{CHECKSUM}"
+        with local_store.open(CHECKSUM) as f:
+            assert f.read() == DATA
+        assert list((local_store.root / ".tmp").iterdir()) == []
+
+    def test_put_checksum_mismatch(self, local_store):
+        with pytest.raises(ChecksumMismatchError):
+            local_store.put(DATA, expected_checksum="0" * 64)
+        assert not local_store.exists(CHECKSUM)
+        assert list((local_store.root / ".tmp").iterdir()) == []
+
+    def test_open_missing(self, local_store):
+        with pytest.raises(rule_store.RuleFileNotFoundError):
+            local_store.open(CHECKSUM)
+
+    def test_invalid_checksum(self):
+        with pytest.raises(ValueError):
+            object_key("../../etc/passwd")
+
+
+@pytest.fixture(params=["local", "minio"])
+def store(request):
+    if request.param == "local":
+        local = request.getfixturevalue("local_store")
+        local.put(DATA)
+        return local
+    return request.getfixturevalue("minio_store")
+
+
+class TestSendRuleFile:
+    def test_full_download(self, store, client):
+        response = client.get(f"/rules/{CHECKSUM}")
+        assert response.status_code == 200
+        assert response.data == DATA
+        assert response.headers["ETag"] == f'"{CHECKSUM}"'
+        assert response.headers["X-Checksum"] == f"sha256:{CHECKSUM}"
+        assert response.headers["X-Signature"] == "sig"
+        assert "network.rules" in response.headers["Content-Disposition"]
+
+    def test_if_none_match(self, store, client):
+        response = client.get(f"/rules/{CHECKSUM}", headers={"If-None-Match": f'"{CHECKSUM}"'})
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def test_range(self, store, client):
+        response = client.get(f"/rules/{CHECKSUM}", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.data == DATA[100:200]
+        assert response.headers["Content-Range"] == f"bytes 100-199/{len(DATA)}"
+
+    def test_range_out_of_bounds(self, store, client):
+        response = client.get(f"/rules/{CHECKSUM}", headers={"Range": f"bytes={len(DATA)}-"})
+        assert response.status_code == 416
+
+    def test_if_range_matching_etag(self, store, client):
+        response = client.get(
+            f"/rules/{CHECKSUM}", headers={"Range": "bytes=-10", "If-Range": f'"{CHECKSUM}"'}
+        )
+        assert response.status_code == 206
+        assert response.data == DATA[-10:]
+
+    def test_if_range_stale_etag_returns_full_content(self, store, client):
+        response = client.get(
+            f"/rules/{CHECKSUM}", headers={"Range": "bytes=0-9", "If-Range": '"stale"'}
+        )
+        assert response.status_code == 200
+        assert response.data == DATA
+
+
+class TestMinioSend:
+    def test_range_fetches_only_requested_bytes(self, minio_store, client):
+        client.get(f"/rules/{CHECKSUM}", headers={"Range": "bytes=10-19"})
+        assert minio_store.client.requests == [("rules/" + object_key(CHECKSUM), 10, 10)]
+
+    def test_not_modified_skips_object_store(self, minio_store, client):
+        client.get(f"/rules/{CHECKSUM}", headers={"If-None-Match": f'"{CHECKSUM}"'})
+        assert minio_store.client.requests == []
@@ -0,0 +1,80 @@
+"""
+统计查询路由测试
+"""
+
+from datetime import datetime
+
+import pytest
+
+from common.stats import StatsQuery
+
+
+def _sources(query):
+    return [(rollup.name if rollup else None, start, end) for rollup, start, end in query.plan()]
+
+
+class TestStatsQueryPlan:
+    def test_aligned_range_reads_rollup(self):
+        query = StatsQuery(
+            "firewall_logs",
+            "bytes",
+            datetime(2024, 1, 1, 0),
+            datetime(2024, 1, 1, 6),
+            filters={"vin": "V1"},
+        )
+        assert _sources(query) == [
+            ("firewall_logs_hourly", datetime(2024, 1, 1, 0), datetime(2024, 1, 1, 6))
+        ]
+
+    def test_unaligned_edges_read_raw_table(self):
+        query = StatsQuery(
+            "host_ids_logs", "events", datetime(2024, 1, 1, 0, 30), datetime(2024, 1, 1, 3, 15)
+        )
+        assert _sources(query) == [
+            (None, datetime(2024, 1, 1, 0, 30), datetime(2024, 1, 1, 1)),
+            ("host_ids_logs_hourly", datetime(2024, 1, 1, 1), datetime(2024, 1, 1, 3)),
+            (None, datetime(2024, 1, 1, 3), datetime(2024, 1, 1, 3, 15)),
+        ]
+
+    def test_dimension_not_in_rollup_reads_raw_table(self):
+        query = StatsQuery(
+            "firewall_logs",
+            "events",
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 2),
+            filters={"protocol": "TCP"},
+        )
+        assert [name for name, _, _ in _sources(query)] == [None]
+
+    def test_alert_metric_uses_alert_rollup(self):
+        query = StatsQuery(
+            "network_ids_logs", "alerts", datetime(2024, 1, 1), datetime(2024, 1, 1, 2)
+        )
+        assert [name for name, _, _ in _sources(query)] == ["network_alerts_hourly"]
+
+    @pytest.mark.parametrize("metric", ["alerts", "events"])
+    def test_conflicting_source_filter_reads_raw_table(self, metric):
+        query = StatsQuery(
+            "network_ids_logs",
+            metric,
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 1, 2),
+            filters={"event_type": "http"},
+        )
+        assert [name for name, _, _ in _sources(query)] == [None]
+        sql, params = query.build()
+        assert "network_ids_logs WHERE" in sql
+        assert "event_type = %(f_0_0)s" in sql
+        assert params["f_0_0"] == "http"
+
+    def test_matching_source_filter_uses_rollup(self):
+        query = StatsQuery(
+            "network_ids_logs",
+            "events",
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 1, 2),
+            filters={"event_type": "alert"},
+        )
+        assert [name for name, _, _ in _sources(query)] == ["network_alerts_hourly"]
+        sql, _ = query.build()
+        assert "event_type" not in sql
@@ -0,0 +1,64 @@
+-- =============================================
+-- IDPS ClickHouse 跳数索引与投影
+-- =============================================
+-- 日志表按 (vin, timestamp, ...) 排序，按IP、签名ID、进程名的全车队检索无法利用主键，
+-- 这里为这些列增加跳数索引和投影。
+--
+-- ADD INDEX / ADD PROJECTION 只对之后写入的数据生效，已有数据由
+-- 03-materialize-skip-indexes.sql 构建。
+
+-- =============================================
+-- 1. 网络入侵检测日志表
+-- =============================================
+ALTER TABLE idps.network_ids_logs
+    ADD INDEX IF NOT EXISTS idx_src_ip src_ip TYPE bloom_filter(0.01) GRANULARITY 4;
+
+ALTER TABLE idps.network_ids_logs
+    ADD INDEX IF NOT EXISTS idx_dest_ip dest_ip TYPE bloom_filter(0.01) GRANULARITY 4;
+
+ALTER TABLE idps.network_ids_logs
+    ADD INDEX IF NOT EXISTS idx_signature_id signature_id TYPE bloom_filter(0.01) GRANULARITY 4;
+
+ALTER TABLE idps.network_ids_logs
+    ADD INDEX IF NOT EXISTS idx_severity severity TYPE minmax GRANULARITY 4;
+
+-- 按签名统计告警数（聚合投影，体积很小）
+ALTER TABLE idps.network_ids_logs
+    ADD PROJECTION IF NOT EXISTS p_signature_hourly
+    (
+        SELECT
+            signature_id,
+            toStartOfHour(timestamp),
+            count()
+        GROUP BY signature_id, toStartOfHour(timestamp)
+    );
+
+-- =============================================
+-- 2. 防火墙日志表
+-- =============================================
+ALTER TABLE idps.firewall_logs
+    ADD INDEX IF NOT EXISTS idx_src_ip src_ip TYPE bloom_filter(0.01) GRANULARITY 4;
+
+ALTER TABLE idps.firewall_logs
+    ADD INDEX IF NOT EXISTS idx_dest_ip dest_ip TYPE bloom_filter(0.01) GRANULARITY 4;
+
+ALTER TABLE idps.firewall_logs
+    ADD INDEX IF NOT EXISTS idx_rule_id rule_id TYPE bloom_filter(0.01) GRANULARITY 4;
+
+-- =============================================
+-- 3. 主机入侵检测日志表
+-- =============================================
+ALTER TABLE idps.host_ids_logs
+    ADD INDEX IF NOT EXISTS idx_process_name process_name TYPE bloom_filter(0.01) GRANULARITY 4;
+
+-- 按进程名检索（按process_name排序的完整副本，主机日志量较小，存储约增加一倍）
+ALTER TABLE idps.host_ids_logs
+    ADD PROJECTION IF NOT EXISTS p_process_name
+    (
+        SELECT *
+        ORDER BY (process_name, timestamp)
+    );
+
+-- =============================================
+-- End of Skip Index Script
+-- =============================================
@@ -0,0 +1,19 @@
+-- =============================================
+-- 为已有数据构建 02-skip-indexes.sql 中的跳数索引和投影
+-- =============================================
+-- MATERIALIZE是按分区重写的后台mutation，大表耗时较长。
+-- 通过 scripts/init_db.py 执行时逐条等待完成并记录进度，中断后重新执行会继续等待
+-- 未完成的mutation，不会重复提交。
+
+ALTER TABLE idps.network_ids_logs MATERIALIZE INDEX idx_src_ip;
+ALTER TABLE idps.network_ids_logs MATERIALIZE INDEX idx_dest_ip;
+ALTER TABLE idps.network_ids_logs MATERIALIZE INDEX idx_signature_id;
+ALTER TABLE idps.network_ids_logs MATERIALIZE INDEX idx_severity;
+ALTER TABLE idps.network_ids_logs MATERIALIZE PROJECTION p_signature_hourly;
+
+ALTER TABLE idps.firewall_logs MATERIALIZE INDEX idx_src_ip;
+ALTER TABLE idps.firewall_logs MATERIALIZE INDEX idx_dest_ip;
+ALTER TABLE idps.firewall_logs MATERIALIZE INDEX idx_rule_id;
+
+ALTER TABLE idps.host_ids_logs MATERIALIZE INDEX idx_process_name;
+ALTER TABLE idps.host_ids_logs MATERIALIZE PROJECTION p_process_name;
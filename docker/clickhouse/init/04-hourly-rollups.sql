@@ -0,0 +1,65 @@
+-- =============================================
+-- IDPS ClickHouse 防火墙/主机日志每小时汇总
+-- =============================================
+-- 统计查询（common.stats.StatsQuery）读取的汇总表。
+--
+-- 物化视图只汇总创建之后写入的数据，创建后立即从原始表回填已有数据。
+-- 已有环境执行本迁移前需暂停日志写入，直到回填完成：两条语句之间写入的日志
+-- 会被物化视图和回填各计一次。回填只在汇总表为空时执行，重复执行本迁移
+-- （如容器首次启动已执行过）不会重复计数。
+
+-- =============================================
+-- 1. 每小时防火墙日志统计
+-- =============================================
+CREATE MATERIALIZED VIEW IF NOT EXISTS idps.firewall_logs_hourly
+ENGINE = SummingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (vin, hour, action)
+AS SELECT
+    toStartOfHour(timestamp) AS hour,
+    vin,
+    action,
+    count() AS event_count,
+    sum(bytes) AS total_bytes,
+    sum(packets) AS total_packets
+FROM idps.firewall_logs
+GROUP BY hour, vin, action;
+
+INSERT INTO idps.firewall_logs_hourly
+SELECT
+    toStartOfHour(timestamp) AS hour,
+    vin,
+    action,
+    count() AS event_count,
+    sum(bytes) AS total_bytes,
+    sum(packets) AS total_packets
+FROM idps.firewall_logs
+WHERE (SELECT count() FROM idps.firewall_logs_hourly) = 0
+GROUP BY hour, vin, action;
+
+-- =============================================
+-- 2. 每小时主机入侵检测日志统计
+-- =============================================
+CREATE MATERIALIZED VIEW IF NOT EXISTS idps.host_ids_logs_hourly
+ENGINE = SummingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (vin, hour, log_type, severity)
+AS SELECT
+    toStartOfHour(timestamp) AS hour,
+    vin,
+    log_type,
+    severity,
+    count() AS event_count
+FROM idps.host_ids_logs
+GROUP BY hour, vin, log_type, severity;
+
+INSERT INTO idps.host_ids_logs_hourly
+SELECT
+    toStartOfHour(timestamp) AS hour,
+    vin,
+    log_type,
+    severity,
+    count() AS event_count
+FROM idps.host_ids_logs
+WHERE (SELECT count() FROM idps.host_ids_logs_hourly) = 0
+GROUP BY hour, vin, log_type, severity;
@@ -0,0 +1,24 @@
+-- =============================================
+-- IDPS 规则增量更新
+-- =============================================
+-- 规则版本发布后预先计算与之前N个版本之间的增量文件（存放在规则文件存储中，
+-- 按内容寻址），车辆当前版本命中时下载增量而不是完整规则文件。
+
+SET NAMES utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `rule_deltas` (
+    `id` BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY COMMENT '主键ID',
+    `base_version_id` BIGINT UNSIGNED NOT NULL COMMENT '基础版本ID（车辆当前版本）',
+    `target_version_id` BIGINT UNSIGNED NOT NULL COMMENT '目标版本ID',
+    `delta_checksum` VARCHAR(64) NOT NULL COMMENT '增量文件校验和(SHA256)',
+    `delta_size` BIGINT UNSIGNED NOT NULL COMMENT '增量文件大小(字节)',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    UNIQUE KEY `uk_target_base` (`target_version_id`, `base_version_id`),
+    INDEX `idx_base_version` (`base_version_id`),
+    FOREIGN KEY (`base_version_id`) REFERENCES `rule_versions`(`id`) ON DELETE CASCADE,
+    FOREIGN KEY (`target_version_id`) REFERENCES `rule_versions`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='规则增量文件表';
+
+-- =============================================
+-- End of Rule Delta Script
+-- =============================================
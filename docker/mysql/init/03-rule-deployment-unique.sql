@@ -0,0 +1,38 @@
+-- =============================================
+-- IDPS 规则下发记录唯一约束
+-- =============================================
+-- 每个规则版本每辆车只有一条下发记录。create_deployments 以 INSERT IGNORE
+-- 依赖该唯一键跳过已存在的记录，并发或重复执行不会产生重复记录。
+--
+-- 加唯一键前删除已有的重复记录（保留id最大的一条）。
+-- MySQL不支持 ADD INDEX IF NOT EXISTS，唯一键已存在时跳过（容器首次启动已执行过本脚本）。
+
+SET NAMES utf8mb4;
+
+DELETE d1 FROM `rule_deployments` d1
+JOIN `rule_deployments` d2
+    ON d1.`rule_version_id` = d2.`rule_version_id`
+    AND d1.`vin` = d2.`vin`
+    AND d1.`id` < d2.`id`;
+
+SET @uk_exists = (
+    SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE()
+        AND table_name = 'rule_deployments'
+        AND index_name = 'uk_version_vin'
+);
+
+-- 唯一键以rule_version_id开头，可替代外键使用的 idx_rule_version
+SET @ddl = IF(
+    @uk_exists = 0,
+    'ALTER TABLE `rule_deployments` ADD UNIQUE KEY `uk_version_vin` (`rule_version_id`, `vin`), DROP INDEX `idx_rule_version`',
+    'DO 0'
+);
+
+PREPARE add_unique_key FROM @ddl;
+EXECUTE add_unique_key;
+DEALLOCATE PREPARE add_unique_key;
+
+-- =============================================
+-- End of Rule Deployment Unique Key Script
+-- =============================================
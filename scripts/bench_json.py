@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+JSON响应序列化基准
+
+用模拟的日志查询分页（网络入侵检测日志的ClickHouse行：DateTime64、IPv4、UUID、Decimal等）
+对比Flask默认JSON provider与 common.utils.json_provider.FastJSONProvider
+（HTTP日期与RFC 3339两种日期时间格式）构造响应的耗时和响应大小，
+并校验同一格式下orjson与标准库回退的输出一致。
+
+使用方法:
+    python bench_json.py [--rows 500] [--iterations 200]
+"""
+
+import sys
+import argparse
+import ipaddress
+import json
+import random
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from flask import Flask
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "cloud"))
+
+from common.utils import json_provider
+from common.utils.json_provider import FastJSONProvider
+from common.utils.response import paginate_response
+
+
+def make_rows(count: int):
+    """生成network_ids_logs查询结果行"""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 14, 12, 0, 0)
+    rows = []
+    for i in range(count):
+        rows.append(
+            {
+                "id": uuid.UUID(int=rng.getrandbits(128)),
+                "timestamp": start + timedelta(milliseconds=rng.randrange(86_400_000)),
+                "vin": f"LSGBF53T1EW{rng.randrange(1_000_000):06d}",
+                "event_type": rng.choice(["alert", "http", "dns", "tls"]),
+                "severity": rng.randint(1, 4),
+                "src_ip": ipaddress.IPv4Address(rng.getrandbits(32)),
+                "src_port": rng.randrange(65536),
+                "dest_ip": ipaddress.IPv4Address(rng.getrandbits(32)),
+                "dest_port": rng.choice([80, 443, 53, 22]),
+                "protocol": rng.choice(["TCP", "UDP"]),
+                "signature_id": 2_000_000 + rng.randrange(50_000),
+                "signature": "ET POLICY 可疑的出站连接 " + str(i),
+                "category": "Potential Corporate Privacy Violation",
+                "score": Decimal(rng.randrange(10_000)) / 100,
+                "payload": "R0VUIC8gSFRUUC8xLjENCkhvc3Q6IGV4YW1wbGUuY29t" * 2,
+            }
+        )
+    return rows
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="JSON响应序列化基准")
+    parser.add_argument("--rows", type=int, default=500, help="每页行数")
+    parser.add_argument("--iterations", type=int, default=200, help="迭代次数")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    page = paginate_response(rows, 1_234_567, 1, args.rows)
+    # Flask默认实现不支持IP地址，基线预先转为字符串（不计入耗时）
+    default_page = paginate_response(
+        [
+            {
+                key: str(value) if isinstance(value, ipaddress.IPv4Address) else value
+                for key, value in row.items()
+            }
+            for row in rows
+        ],
+        1_234_567,
+        1,
+        args.rows,
+    )
+
+    default_app = Flask("bench_default")
+    fast_app = Flask("bench_fast")
+    fast_app.json = FastJSONProvider(fast_app)
+
+    iso_app = Flask("bench_iso")
+    iso_app.json = FastJSONProvider(iso_app)
+    iso_app.json.datetime_format = "iso"
+
+    def build(app, data=page):
+        with app.app_context():
+            return app.json.response(data).get_data()
+
+    # 标准库回退：临时屏蔽orjson
+    def build_stdlib(app):
+        saved, json_provider.orjson = json_provider.orjson, None
+        try:
+            return build(app)
+        finally:
+            json_provider.orjson = saved
+
+    # (名称, 日期时间格式, 构造函数)
+    cases = [
+        ("Flask默认", None, lambda: build(default_app, default_page)),
+        ("FastJSONProvider(标准库回退)", "http", lambda: build_stdlib(fast_app)),
+        ("FastJSONProvider(标准库回退, iso)", "iso", lambda: build_stdlib(iso_app)),
+    ]
+    if json_provider.orjson is not None:
+        cases.append(("FastJSONProvider(orjson)", "http", lambda: build(fast_app)))
+        cases.append(("FastJSONProvider(orjson, iso)", "iso", lambda: build(iso_app)))
+    else:
+        print("未安装orjson，只测试标准库回退")
+
+    outputs = {name: func() for name, _, func in cases}
+    for datetime_format in ("http", "iso"):
+        same_format = [
+            json.loads(outputs[name]) for name, fmt, _ in cases if fmt == datetime_format
+        ]
+        assert all(
+            item == same_format[0] for item in same_format
+        ), f"{datetime_format}格式下orjson与标准库回退输出不一致"
+
+    print(f"{args.rows} 行/页, {args.iterations} 次")
+    print(f"{'实现':<36}{'ms/页':>10}{'KB':>10}{'加速':>8}")
+    baseline = None
+    for name, _, func in cases:
+        elapsed = timeit.timeit(func, number=args.iterations) / args.iterations * 1000
+        baseline = baseline or elapsed
+        size = len(outputs[name]) / 1024
+        print(f"{name:<36}{elapsed:>10.2f}{size:>10.1f}{baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
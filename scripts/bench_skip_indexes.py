@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+ClickHouse跳数索引与投影基准
+
+在独立的基准库中生成日志数据，对比添加 docker/clickhouse/init/02-skip-indexes.sql
+中的索引和投影前后，按IP、签名ID、进程名检索时读取的粒度数和行数。
+
+使用方法:
+    python bench_skip_indexes.py [--rows N] [--database idps_bench] [--keep]
+"""
+
+import sys
+import argparse
+import re
+import time
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "cloud"))
+
+from common.database import create_clickhouse_client
+from common.migrations import split_sql
+
+SKIP_INDEX_SQL = (
+    Path(__file__).parent.parent / "docker" / "clickhouse" / "init" / "02-skip-indexes.sql"
+)
+
+NETWORK_TABLE = """
+CREATE TABLE {db}.network_ids_logs
+(
+    `timestamp` DateTime64(3),
+    `vin` String,
+    `event_type` LowCardinality(String),
+    `severity` UInt8,
+    `src_ip` IPv4,
+    `src_port` UInt16,
+    `dest_ip` IPv4,
+    `dest_port` UInt16,
+    `protocol` LowCardinality(String),
+    `signature_id` UInt32,
+    `signature` String,
+    `category` LowCardinality(String),
+    `payload` String,
+    `raw_log` String,
+    `created_date` Date DEFAULT toDate(timestamp)
+)
+ENGINE = MergeTree()
+PARTITION BY toYYYYMM(created_date)
+ORDER BY (vin, timestamp, event_type)
+"""
+
+HOST_TABLE = """
+CREATE TABLE {db}.host_ids_logs
+(
+    `timestamp` DateTime64(3),
+    `vin` String,
+    `log_type` LowCardinality(String),
+    `severity` UInt8,
+    `event` String,
+    `file_path` String,
+    `process_name` String,
+    `process_id` UInt32,
+    `user` String,
+    `command` String,
+    `details` String,
+    `created_date` Date DEFAULT toDate(timestamp)
+)
+ENGINE = MergeTree()
+PARTITION BY toYYYYMM(created_date)
+ORDER BY (vin, timestamp, log_type)
+"""
+
+# 1万辆车、30天内的随机日志；IP/签名/进程名在车队内随机分布，与排序键无关
+NETWORK_INSERT = """
+INSERT INTO {db}.network_ids_logs
+    (timestamp, vin, event_type, severity, src_ip, src_port, dest_ip, dest_port,
+     protocol, signature_id, signature, category, payload, raw_log)
+SELECT
+    now64(3) - toIntervalSecond(rand(1) % 2592000),
+    concat('LSGBF53T1EW', leftPad(toString(rand(2) % 10000), 6, '0')),
+    ['alert', 'http', 'dns', 'tls'][rand(3) % 4 + 1],
+    rand(4) % 4 + 1,
+    toIPv4(rand(5) % 65536 + 167772160),
+    rand(6) % 65536,
+    toIPv4(rand(7) % 65536 + 3232235520),
+    [80, 443, 53, 22][rand(8) % 4 + 1],
+    ['TCP', 'UDP'][rand(9) % 2 + 1],
+    2000000 + rand(10) % 50000,
+    'ET POLICY test signature',
+    'policy',
+    '',
+    ''
+FROM numbers({rows})
+"""
+
+HOST_INSERT = """
+INSERT INTO {db}.host_ids_logs
+    (timestamp, vin, log_type, severity, event, file_path, process_name, process_id,
+     user, command, details)
+SELECT
+    now64(3) - toIntervalSecond(rand(1) % 2592000),
+    concat('LSGBF53T1EW', leftPad(toString(rand(2) % 10000), 6, '0')),
+    ['audit', 'file', 'process', 'root'][rand(3) % 4 + 1],
+    rand(4) % 4 + 1,
+    'process started',
+    '/usr/bin/app',
+    concat('proc_', toString(rand(5) % 20000)),
+    rand(6) % 65536,
+    'root',
+    '',
+    ''
+FROM numbers({rows})
+"""
+
+QUERIES = [
+    ("src_ip", "SELECT count() FROM {db}.network_ids_logs WHERE src_ip = toIPv4('10.0.1.1')"),
+    ("dest_ip", "SELECT count() FROM {db}.network_ids_logs WHERE dest_ip = toIPv4('192.168.1.1')"),
+    ("signature_id", "SELECT count() FROM {db}.network_ids_logs WHERE signature_id = 2012345"),
+    (
+        "signature hourly",
+        "SELECT signature_id, toStartOfHour(timestamp) AS hour, count() "
+        "FROM {db}.network_ids_logs GROUP BY signature_id, hour ORDER BY count() DESC LIMIT 10",
+    ),
+    ("process_name", "SELECT count() FROM {db}.host_ids_logs WHERE process_name = 'proc_1234'"),
+]
+
+
+def granules(client, query: str) -> str:
+    """EXPLAIN indexes = 1 中最后一个过滤步骤之后的粒度数"""
+    plan = "\n".join(row[0] for row in client.execute(f"EXPLAIN indexes = 1 {query}"))
+    matches = re.findall(r"Granules:\s*(\d+/\d+)", plan)
+    return matches[-1] if matches else "-"
+
+
+def measure(client, db: str):
+    """执行所有查询，返回 {名称: (粒度, 读取行数, 耗时毫秒)}"""
+    results = {}
+    for name, template in QUERIES:
+        query = template.format(db=db)
+        start = time.perf_counter()
+        client.execute(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        results[name] = (granules(client, query), client.last_query.progress.rows, elapsed)
+    return results
+
+
+def skip_index_statements(db: str):
+    """读取跳数索引SQL并替换为基准库（只保留基准库中存在的表）"""
+    statements = split_sql(SKIP_INDEX_SQL.read_text(encoding="utf-8"))
+    tables = ("idps.network_ids_logs ", "idps.host_ids_logs ")
+    return [
+        stmt.replace("idps.", f"{db}.")
+        for stmt in statements
+        if any(table in stmt.replace("\n", " ") for table in tables)
+    ]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="ClickHouse跳数索引与投影基准")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="每张表生成的行数")
+    parser.add_argument("--database", default="idps_bench", help="基准库名（会被删除重建）")
+    parser.add_argument("--keep", action="store_true", help="结束后保留基准库")
+    args = parser.parse_args()
+
+    db = args.database
+    client = create_clickhouse_client()
+
+    print(f"生成数据: {args.rows} 行/表 -> {db}")
+    client.execute(f"DROP DATABASE IF EXISTS {db}")
+    client.execute(f"CREATE DATABASE {db}")
+    client.execute(NETWORK_TABLE.format(db=db))
+    client.execute(HOST_TABLE.format(db=db))
+    client.execute(NETWORK_INSERT.format(db=db, rows=args.rows))
+    client.execute(HOST_INSERT.format(db=db, rows=args.rows))
+    client.execute(f"OPTIMIZE TABLE {db}.network_ids_logs FINAL")
+    client.execute(f"OPTIMIZE TABLE {db}.host_ids_logs FINAL")
+
+    try:
+        before = measure(client, db)
+
+        print("添加并构建索引与投影...")
+        for stmt in skip_index_statements(db):
+            client.execute(stmt)
+            match = re.search(r"ADD\s+(INDEX|PROJECTION)\s+IF\s+NOT\s+EXISTS\s+(\w+)", stmt)
+            table = stmt.split()[2]
+            client.execute(
+                f"ALTER TABLE {table} MATERIALIZE {match.group(1)} {match.group(2)}",
+                settings={"mutations_sync": 2},
+            )
+
+        after = measure(client, db)
+    finally:
+        if not args.keep:
+            client.execute(f"DROP DATABASE IF EXISTS {db}")
+        client.disconnect()
+
+    print()
+    print(
+        f"{'查询':<18}{'粒度(前)':>16}{'粒度(后)':>16}"
+        f"{'读取行(前)':>14}{'读取行(后)':>14}{'ms(前)':>10}{'ms(后)':>10}"
+    )
+    for name, _ in QUERIES:
+        g0, r0, t0 = before[name]
+        g1, r1, t1 = after[name]
+        print(f"{name:<18}{g0:>16}{g1:>16}{r0:>14}{r1:>14}{t0:>10.1f}{t1:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
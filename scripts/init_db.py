@@ -8,11 +8,18 @@ IDPS数据库初始化脚本
 - 创建默认管理员用户
 - 验证数据库连接
 
+表结构通过迁移管理（docker/mysql/init、docker/clickhouse/init 下的SQL文件，
+文件名前缀为版本号），已执行的迁移记录在各库的schema_migrations表中，
+重复运行只执行新增或上次中断的迁移。
+
 使用方法:
-    python init_db.py [--reset]
+    python init_db.py [--reset] [--dry-run] [--baseline VERSION]
 
 选项:
-    --reset    删除现有数据库并重新创建（谨慎使用！）
+    --reset     删除现有数据库并重新创建（谨慎使用！）
+    --dry-run   只列出待执行的迁移语句
+    --baseline  把VERSION及之前的迁移记为已执行，再执行之后的迁移
+                （结构已存在的旧环境首次接入迁移台账时使用，如 --baseline 01）
 """
 
 import sys
@@ -32,10 +39,21 @@ from common.database import (
     drop_tables,
 )
 from common.config import config
+from common.migrations import (
+    LEDGER_TABLE,
+    ClickHouseBackend,
+    MigrationError,
+    Migrator,
+    MySQLBackend,
+)
 from common.utils.logger import setup_logger
 
 logger = setup_logger("init_db")
 
+# 迁移文件目录（同时作为容器首次启动时的初始化脚本）
+MYSQL_MIGRATIONS_DIR = Path(__file__).parent.parent / "docker" / "mysql" / "init"
+CLICKHOUSE_MIGRATIONS_DIR = Path(__file__).parent.parent / "docker" / "clickhouse" / "init"
+
 # Global database connections
 engine = None
 clickhouse_client = None
@@ -82,90 +100,59 @@ def check_redis_connection():
         return False
 
 
-def execute_sql_file(file_path: Path, is_clickhouse: bool = False):
-    """执行SQL文件"""
+def run_migrations(migrator: Migrator, dry_run: bool = False) -> bool:
+    """执行迁移"""
     try:
-        logger.info(f"执行SQL文件: {file_path}")
-
-        with open(file_path, "r", encoding="utf-8") as f:
-            sql_content = f.read()
-
-        if is_clickhouse:
-            # ClickHouse: 按语句分割执行
-            statements = [
-                stmt.strip()
-                for stmt in sql_content.split(";")
-                if stmt.strip() and not stmt.strip().startswith("--")
-            ]
-
-            for stmt in statements:
-                if stmt:
-                    try:
-                        clickhouse_client.execute(stmt)
-                    except Exception as e:
-                        logger.warning(f"执行语句失败（可能已存在）: {e}")
-
+        for item in migrator.status():
+            logger.info(
+                f"  {item['version']}-{item['name']}: {item['status']} "
+                f"({item['statements_done']}/{item['statements']})"
+            )
+        versions = migrator.migrate(dry_run=dry_run)
+        if not versions:
+            logger.info("✓ 没有待执行的迁移")
+        elif dry_run:
+            logger.info(f"[dry-run] 待执行的迁移: {', '.join(versions)}")
         else:
-            # MySQL: 直接执行
-            with engine.connect() as conn:
-                # 分割多个语句
-                statements = [
-                    stmt.strip()
-                    for stmt in sql_content.split(";")
-                    if stmt.strip()
-                ]
-
-                for stmt in statements:
-                    if stmt and not stmt.startswith("--"):
-                        try:
-                            conn.execute(text(stmt))
-                            conn.commit()
-                        except Exception as e:
-                            logger.warning(f"执行语句失败（可能已存在）: {e}")
-
-        logger.info(f"✓ SQL文件执行完成: {file_path}")
+            logger.info(f"✓ 已执行迁移: {', '.join(versions)}")
         return True
-
-    except Exception as e:
-        logger.error(f"✗ SQL文件执行失败: {e}")
+    except MigrationError as e:
+        logger.error(f"✗ 迁移失败: {e}")
         return False
 
 
-def init_mysql_schema(reset: bool = False):
+def mysql_migrator() -> Migrator:
+    """MySQL迁移器"""
+    return Migrator(MySQLBackend(engine), MYSQL_MIGRATIONS_DIR)
+
+
+def clickhouse_migrator() -> Migrator:
+    """ClickHouse迁移器"""
+    return Migrator(ClickHouseBackend(clickhouse_client), CLICKHOUSE_MIGRATIONS_DIR)
+
+
+def init_mysql_schema(reset: bool = False, dry_run: bool = False):
     """初始化MySQL数据库"""
     logger.info("=" * 60)
     logger.info("初始化MySQL数据库...")
     logger.info("=" * 60)
 
-    if reset:
+    if reset and not dry_run:
         logger.warning("⚠ 正在删除现有表...")
         drop_tables()
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS `{LEDGER_TABLE}`")
 
-    # 执行初始化SQL
-    sql_file = Path(__file__).parent.parent / "docker" / "mysql" / "init" / "01-init.sql"
-
-    if sql_file.exists():
-        return execute_sql_file(sql_file, is_clickhouse=False)
-    else:
-        logger.error(f"找不到SQL文件: {sql_file}")
-        return False
+    return run_migrations(mysql_migrator(), dry_run=dry_run)
 
 
-def init_clickhouse_schema():
+def init_clickhouse_schema(dry_run: bool = False):
     """初始化ClickHouse数据库"""
     logger.info("=" * 60)
     logger.info("初始化ClickHouse数据库...")
     logger.info("=" * 60)
 
-    sql_file = (
-        Path(__file__).parent.parent / "docker" / "clickhouse" / "init" / "01-init.sql"
-    )
-
-    if sql_file.exists():
-        return execute_sql_file(sql_file, is_clickhouse=True)
-    else:
-        logger.error(f"找不到SQL文件: {sql_file}")
-        return False
+    return run_migrations(clickhouse_migrator(), dry_run=dry_run)
 
 
 def main():
@@ -174,6 +161,12 @@ def main():
     parser.add_argument(
         "--reset", action="store_true", help="删除现有数据库并重新创建（谨慎使用！）"
     )
+    parser.add_argument("--dry-run", action="store_true", help="只列出待执行的迁移语句")
+    parser.add_argument(
+        "--baseline",
+        metavar="VERSION",
+        help="把VERSION及之前的迁移记为已执行，不执行语句（如 01）",
+    )
     args = parser.parse_args()
 
     if args.reset:
@@ -210,21 +203,36 @@ def main():
         logger.warning("提示: ClickHouse配置可能需要调整，请查看文档")
         logger.warning("      数据库服务基本功能仍可正常使用")
 
+    if args.baseline and not args.dry_run:
+        migrators = [("MySQL", mysql_migrator)]
+        if clickhouse_ok:
+            migrators.append(("ClickHouse", clickhouse_migrator))
+        for name, factory in migrators:
+            try:
+                versions = factory().baseline(args.baseline)
+            except MigrationError as e:
+                logger.error(f"✗ {name}基线记录失败: {e}")
+                sys.exit(1)
+            logger.info(f"✓ {name}迁移已记为执行: {', '.join(versions) or '无'}")
+
     # 2. 初始化MySQL
     logger.info("\n步骤 2/4: 初始化MySQL数据库...")
-    if not init_mysql_schema(reset=args.reset):
+    if not init_mysql_schema(reset=args.reset, dry_run=args.dry_run):
         logger.error("✗ MySQL初始化失败")
         sys.exit(1)
 
     # 3. 初始化ClickHouse
     if clickhouse_ok:
         logger.info("\n步骤 3/4: 初始化ClickHouse数据库...")
-        if not init_clickhouse_schema():
+        if not init_clickhouse_schema(dry_run=args.dry_run):
             logger.error("✗ ClickHouse初始化失败")
             sys.exit(1)
     else:
         logger.info("\n步骤 3/4: 跳过ClickHouse初始化...")
 
+    if args.dry_run:
+        return
+
     # 4. 验证
     logger.info("\n步骤 4/4: 验证数据库...")
     try: